@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import os
+from datetime import date, datetime, time
+from typing import Dict, List, Set, Tuple
+from sqlalchemy import bindparam, func, or_, select, update
+from database import AsyncSessionLocal, User
+
+logger = logging.getLogger(__name__)
+
+# Сброс накопленной активности: по таймеру или при заполнении буфера
+ACTIVITY_FLUSH_INTERVAL: int = int(os.getenv("ACTIVITY_FLUSH_INTERVAL", "10"))
+ACTIVITY_FLUSH_MAX_ENTRIES: int = int(os.getenv("ACTIVITY_FLUSH_MAX_ENTRIES", "500"))
+
+
+class ActivityBuffer:
+    """
+    Буфер активности пользователей с отложенной записью
+    Сообщения только увеличивают счетчик в памяти, в базу изменения
+    уходят одним пакетным UPDATE
+    """
+
+    def __init__(self, max_entries: int = ACTIVITY_FLUSH_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._pending: Dict[int, Tuple[int, datetime]] = {}
+        self._lock = asyncio.Lock()
+        self._flush_tasks: Set[asyncio.Task] = set()
+
+    def record(self, telegram_id: int) -> None:
+        """Учитывает сообщение пользователя"""
+        count, _ = self._pending.get(telegram_id, (0, None))
+        self._pending[telegram_id] = (count + 1, datetime.utcnow())
+
+        if len(self._pending) >= self.max_entries and not self._flush_tasks:
+            task = asyncio.create_task(self.flush())
+            self._flush_tasks.add(task)
+            task.add_done_callback(self._flush_tasks.discard)
+
+    async def flush(self) -> int:
+        """Записывает накопленную активность и возвращает число обновленных пользователей"""
+        async with self._lock:
+            if not self._pending:
+                return 0
+
+            pending, self._pending = self._pending, {}
+            users = User.__table__
+            statement = (
+                update(users)
+                .where(users.c.telegram_id == bindparam("tid"))
+                .values(
+                    total_messages_count=func.coalesce(users.c.total_messages_count, 0) + bindparam("messages"),
+                    last_active_date=bindparam("last_active"),
+                )
+            )
+            params = [
+                {"tid": telegram_id, "messages": count, "last_active": last_active}
+                for telegram_id, (count, last_active) in pending.items()
+            ]
+
+            try:
+                async with AsyncSessionLocal() as db:
+                    await self._count_active_users(db, pending)
+                    await db.execute(statement, params)
+                    await db.commit()
+            except Exception as e:
+                # Возвращаем данные в буфер, чтобы не потерять их до следующей попытки
+                for telegram_id, (count, last_active) in pending.items():
+                    newer_count, newer_active = self._pending.get(telegram_id, (0, last_active))
+                    self._pending[telegram_id] = (count + newer_count, max(last_active, newer_active))
+                logger.error(f"❌ Ошибка записи активности пользователей: {e}")
+                return 0
+
+            return len(params)
+
+    @staticmethod
+    async def _count_active_users(db, pending: Dict[int, Tuple[int, datetime]]) -> None:
+        """Добавляет в дневные агрегаты пользователей, впервые активных в этот день"""
+        from utils import bump_daily_stats
+
+        by_day: Dict[date, List[int]] = {}
+        for telegram_id, (_, last_active) in pending.items():
+            by_day.setdefault(last_active.date(), []).append(telegram_id)
+
+        users = User.__table__
+        for day, telegram_ids in by_day.items():
+            # Вызывается до UPDATE: в базе еще прежняя дата активности
+            first_today = await db.scalar(select(func.count()).select_from(users).where(
+                users.c.telegram_id.in_(telegram_ids),
+                or_(users.c.last_active_date.is_(None), users.c.last_active_date < datetime.combine(day, time.min))
+            ))
+            await bump_daily_stats(db, day, active_users=first_today)
+
+
+# Глобальный буфер для использования во всем приложении
+activity_buffer = ActivityBuffer()
@@ -0,0 +1,111 @@
+"""
+Бенчмарк горячих запросов до и после создания индексов
+
+Запуск из каталога бота:
+    python benchmarks/bench_indexes.py [количество_задач]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+TMP_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{TMP_DIR}/bench.db"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, func
+from database import engine, SessionLocal, Base, User, Task, Invite
+
+TASKS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+PAIRS = 5_000
+REPEAT = 200
+
+
+def fill() -> None:
+    """Заполняет базу парами пользователей и задачами без индексов"""
+    Base.metadata.create_all(bind=engine)
+    for table in (User.__table__, Task.__table__):
+        for index in table.indexes:
+            index.drop(bind=engine, checkfirst=True)
+
+    now = datetime.utcnow()
+    users = []
+    invites = []
+    for i in range(PAIRS * 2):
+        partner = i + 2 if i % 2 == 0 else i
+        users.append((i + 1, 10_000 + i, f"User {i}", partner,
+                      now - timedelta(days=random.randint(0, 60)),
+                      now - timedelta(days=random.randint(0, 365))))
+        invites.append((f"C{i:05d}", i + 1, now, now + timedelta(hours=1)))
+
+    tasks = []
+    for i in range(TASKS):
+        by = random.randint(1, PAIRS * 2)
+        to = by + 1 if by % 2 else by - 1
+        tasks.append((f"Task {i}", by, to, now - timedelta(minutes=i), random.random() < 0.8))
+
+    raw = engine.raw_connection()
+    try:
+        raw.executemany(
+            "INSERT INTO users (id, telegram_id, full_name, partner_id, "
+            "last_active_date, joined_date) VALUES (?, ?, ?, ?, ?, ?)", users)
+        raw.executemany(
+            "INSERT INTO invites (code, owner_id, created_at, expires_at) VALUES (?, ?, ?, ?)", invites)
+        raw.executemany(
+            "INSERT INTO tasks (title, assigned_by_id, assigned_to_id, created_at, completed) "
+            "VALUES (?, ?, ?, ?, ?)", tasks)
+        raw.commit()
+    finally:
+        raw.close()
+
+
+def measure() -> dict:
+    """Замеряет среднее время запросов из обработчиков, мс"""
+    week_ago = datetime.utcnow() - timedelta(days=7)
+    queries = {
+        "view_tasks (мои активные)": lambda db, uid: db.scalars(
+            select(Task).where(Task.assigned_by_id == uid, Task.completed == False)).all(),
+        "complete_task_menu": lambda db, uid: db.scalars(
+            select(Task).where(Task.assigned_to_id == uid, Task.completed == False)).all(),
+        "pending_tasks (count)": lambda db, uid: db.scalar(
+            select(func.count()).select_from(Task).where(Task.assigned_to_id == uid, Task.completed == False)),
+        "active_users (count)": lambda db, uid: db.scalar(
+            select(func.count()).select_from(User).where(User.last_active_date >= week_ago)),
+        "accept_invite": lambda db, uid: db.scalar(
+            select(Invite.owner_id).where(Invite.code == f"C{uid:05d}", Invite.expires_at > datetime.utcnow())),
+    }
+
+    results = {}
+    with SessionLocal() as db:
+        for name, query in queries.items():
+            started = time.perf_counter()
+            for _ in range(REPEAT):
+                query(db, random.randint(1, PAIRS * 2))
+                db.expunge_all()
+            results[name] = (time.perf_counter() - started) / REPEAT * 1000
+    return results
+
+
+def main() -> None:
+    print(f"Заполнение: {PAIRS * 2} пользователей, {TASKS} задач...")
+    fill()
+
+    before = measure()
+
+    started = time.perf_counter()
+    for table in (User.__table__, Task.__table__):
+        for index in table.indexes:
+            index.create(bind=engine)
+    print(f"Создание индексов: {time.perf_counter() - started:.1f} с\n")
+
+    after = measure()
+
+    print(f"{'Запрос':<28}{'без индексов, мс':>18}{'с индексами, мс':>18}{'ускорение':>12}")
+    for name in before:
+        print(f"{name:<28}{before[name]:>18.3f}{after[name]:>18.3f}{before[name] / after[name]:>11.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Бенчмарк уведомлений собеседнику: новый Bot с новой HTTP-сессией на каждое
+уведомление против общего бота notifications.get_bot()
+
+Вместо api.telegram.org запросы принимает локальный HTTP-сервер, поэтому
+разница показывает только накладные расходы сессии и соединения; с TLS до
+серверов Telegram каждое новое соединение обходится еще дороже.
+
+Запуск из каталога бота:
+    python benchmarks/bench_notifications.py [уведомлений]
+"""
+import asyncio
+import os
+import sys
+import time
+
+os.environ.setdefault("BOT_TOKEN", "123456:BENCHMARK")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import web
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+import notifications
+
+NOTIFICATIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000
+CONCURRENCY = 20
+TOKEN = os.environ["BOT_TOKEN"]
+
+
+async def send_message(request: web.Request) -> web.Response:
+    """Ответ Bot API на sendMessage"""
+    data = await request.post()
+    chat_id = int(data["chat_id"])
+    return web.json_response({"ok": True, "result": {
+        "message_id": 1, "date": int(time.time()), "text": data["text"],
+        "chat": {"id": chat_id, "type": "private"},
+    }})
+
+
+def make_bot(api: TelegramAPIServer) -> Bot:
+    return Bot(token=TOKEN, session=AiohttpSession(api=api))
+
+
+async def send_with_new_bot(api: TelegramAPIServer, user_id: int) -> None:
+    """Прежний send_notification: бот и сессия на одно сообщение"""
+    bot = make_bot(api)
+    await bot.send_message(user_id, "📬 Новая задача", parse_mode="HTML")
+    await bot.session.close()
+
+
+async def send_with_shared_bot(api: TelegramAPIServer, user_id: int) -> None:
+    await notifications.send_notification(user_id, "📬 Новая задача")
+
+
+async def measure(send, api: TelegramAPIServer) -> float:
+    """Уведомлений в секунду при CONCURRENCY одновременных отправках"""
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def limited(user_id: int) -> None:
+        async with semaphore:
+            await send(api, user_id)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(limited(1000 + i) for i in range(NOTIFICATIONS)))
+    return NOTIFICATIONS / (time.perf_counter() - started)
+
+
+async def main() -> None:
+    app = web.Application()
+    app.router.add_post(f"/bot{TOKEN}/sendMessage", send_message)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    api = TelegramAPIServer.from_base(f"http://127.0.0.1:{port}")
+
+    notifications.set_bot(make_bot(api))
+
+    print(f"{NOTIFICATIONS} уведомлений, {CONCURRENCY} одновременно\n")
+    print(f"{'Способ':<22}{'уведомлений/с':>16}")
+    for name, send in (("новый Bot на каждое", send_with_new_bot), ("общий get_bot()", send_with_shared_bot)):
+        print(f"{name:<22}{await measure(send, api):>16.0f}")
+
+    await notifications.close_bot()
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,102 @@
+"""
+Бенчмарк OneSignal из обработчиков: блокирующий OneSignalAPI (requests, новое
+соединение на запрос) против AsyncOneSignalAPI (aiohttp, пул keep-alive)
+
+Запросы принимает локальный HTTP-сервер с задержкой ответа LATENCY. Кроме
+времени отправки измеряется наибольшая задержка цикла событий: пока
+requests ждет ответ, бот не обрабатывает ни одного апдейта.
+
+Запуск из каталога бота:
+    python benchmarks/bench_onesignal.py [уведомлений]
+"""
+import asyncio
+import os
+import sys
+import time
+
+os.environ.setdefault("ONESIGNAL_APP_ID", "00000000-bench")
+os.environ.setdefault("ONESIGNAL_API_KEY", "benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import web
+import onesignal_api
+
+NOTIFICATIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+CONCURRENCY = 20
+LATENCY = 0.02
+
+
+async def create_notification(request: web.Request) -> web.Response:
+    """Ответ OneSignal на создание уведомления"""
+    await request.json()
+    await asyncio.sleep(LATENCY)
+    return web.json_response({"id": "bench", "recipients": 1})
+
+
+async def send_blocking(client: onesignal_api.OneSignalAPI) -> None:
+    """Прежний вызов из обработчика: requests прямо в цикле событий"""
+    # Между апдейтами диспетчер отдает управление циклу
+    await asyncio.sleep(0)
+    client.send_task_notification(task_title="Задача", from_user="Бенчмарк", external_id="bench")
+
+
+async def send_async(client: onesignal_api.AsyncOneSignalAPI) -> None:
+    await client.send_task_notification(task_title="Задача", from_user="Бенчмарк", external_id="bench")
+
+
+async def measure(send, client) -> tuple:
+    """Уведомлений в секунду и наибольшая задержка цикла событий, мс"""
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    max_lag = 0.0
+    done = False
+
+    async def monitor() -> None:
+        nonlocal max_lag
+        while not done:
+            started = time.perf_counter()
+            await asyncio.sleep(0.001)
+            max_lag = max(max_lag, time.perf_counter() - started - 0.001)
+
+    async def limited() -> None:
+        async with semaphore:
+            await send(client)
+
+    watcher = asyncio.create_task(monitor())
+    started = time.perf_counter()
+    await asyncio.gather(*(limited() for _ in range(NOTIFICATIONS)))
+    elapsed = time.perf_counter() - started
+    done = True
+    await watcher
+    return NOTIFICATIONS / elapsed, max_lag * 1000
+
+
+async def main() -> None:
+    app = web.Application()
+    app.router.add_post("/api/v1/notifications", create_notification)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    base_url = f"http://127.0.0.1:{port}/api/v1"
+
+    # Блокирующий клиент работает с сервером из другого потока
+    blocking = onesignal_api.OneSignalAPI()
+    pooled = onesignal_api.AsyncOneSignalAPI()
+    blocking.base_url = pooled.base_url = base_url
+
+    print(f"{NOTIFICATIONS} уведомлений, {CONCURRENCY} одновременно, ответ через {LATENCY * 1000:.0f} мс\n")
+    print(f"{'Клиент':<24}{'уведомлений/с':>16}{'задержка цикла, мс':>22}")
+
+    rate, lag = await asyncio.to_thread(lambda: asyncio.run(measure(send_blocking, blocking)))
+    print(f"{'requests (блокирующий)':<24}{rate:>16.0f}{lag:>22.1f}")
+
+    rate, lag = await measure(send_async, pooled)
+    print(f"{'aiohttp (пул)':<24}{rate:>16.0f}{lag:>22.1f}")
+
+    await pooled.close()
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,84 @@
+"""
+Бенчмарк списков задач: ORM-объекты Task против column-only запроса
+с моделями строк TaskModel (utils.get_active_task_models)
+
+Запуск из каталога бота:
+    python benchmarks/bench_row_dtos.py [задач_в_списке]
+"""
+import asyncio
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+TMP_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{TMP_DIR}/bench.db"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select
+from database import engine, AsyncSessionLocal, init_db, dispose_engines, User, Task
+import utils
+
+TASKS = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+REPEAT = 20
+
+
+def fill() -> None:
+    """Создает пару собеседников с активными задачами"""
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [
+            {"id": 1, "telegram_id": 1001, "full_name": "Alice", "partner_id": 2},
+            {"id": 2, "telegram_id": 1002, "full_name": "Bob", "partner_id": 1},
+        ])
+        now = datetime.utcnow()
+        conn.execute(Task.__table__.insert(), [
+            {"title": f"Task {i}", "description": f"Description {i}", "assigned_by_id": 1,
+             "assigned_to_id": 2, "created_at": now, "completed": False}
+            for i in range(TASKS)
+        ])
+
+
+async def load_orm(db) -> list:
+    """Прежний путь обработчиков: полные ORM-объекты"""
+    return (await db.scalars(select(Task).where(Task.assigned_by_id == 1, Task.completed == False))).all()
+
+
+async def load_models(db) -> list:
+    """Column-only запрос с моделями строк"""
+    return await utils.get_active_task_models(db, assigned_by_id=1)
+
+
+async def measure(load) -> tuple:
+    """Возвращает строк в секунду и пиковую память одной загрузки списка"""
+    started = time.perf_counter()
+    for _ in range(REPEAT):
+        async with AsyncSessionLocal() as db:
+            await load(db)
+    rows_per_second = TASKS * REPEAT / (time.perf_counter() - started)
+
+    gc.collect()
+    async with AsyncSessionLocal() as db:
+        tracemalloc.start()
+        rows = await load(db)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    assert len(rows) == TASKS
+    return rows_per_second, peak / 1024 / 1024
+
+
+async def main() -> None:
+    init_db()
+    fill()
+    print(f"Список из {TASKS} активных задач, {REPEAT} загрузок\n")
+    print(f"{'Путь':<16}{'строк/с':>14}{'пик памяти, МиБ':>18}")
+    for name, load in (("ORM Task", load_orm), ("TaskModel", load_models)):
+        rows_per_second, peak = await measure(load)
+        print(f"{name:<16}{rows_per_second:>14.0f}{peak:>18.1f}")
+    await dispose_engines()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,97 @@
+"""
+Бенчмарк записи задач при параллельном чтении статистики:
+настройки SQLite по умолчанию против профиля SQLITE_PRAGMAS
+
+Запуск из каталога бота:
+    python benchmarks/bench_sqlite_pragmas.py [секунд_на_профиль]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event, select, func
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from database import Base, User, Task, SQLITE_PRAGMAS, sqlite_pragma_listener
+
+DURATION = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+READERS = 4
+SEED_TASKS = 50_000
+
+# Поведение SQLite без профиля: журнал отката и полная синхронизация
+DEFAULT_PRAGMAS = {"journal_mode": "DELETE", "synchronous": "FULL"}
+
+
+def run(pragmas: dict, readers: int) -> dict:
+    """Пишет задачи по одной (как process_task_description) под нагрузкой читателей"""
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    event.listen(engine, "connect", sqlite_pragma_listener(pragmas))
+    Session = sessionmaker(bind=engine)
+
+    Base.metadata.create_all(bind=engine)
+    with Session() as db:
+        db.add_all([User(id=1, telegram_id=1), User(id=2, telegram_id=2)])
+        db.flush()
+        db.execute(Task.__table__.insert(), [
+            {"title": f"Seed {i}", "assigned_by_id": 1, "assigned_to_id": 2, "completed": i % 2 == 0}
+            for i in range(SEED_TASKS)
+        ])
+        db.commit()
+
+    stop = threading.Event()
+    counters = {"writes": 0, "reads": 0, "busy": 0}
+    lock = threading.Lock()
+
+    def writer() -> None:
+        while not stop.is_set():
+            try:
+                with Session() as db:
+                    db.add(Task(title="Bench", assigned_by_id=1, assigned_to_id=2, created_at=datetime.utcnow()))
+                    db.commit()
+                with lock:
+                    counters["writes"] += 1
+            except OperationalError:
+                with lock:
+                    counters["busy"] += 1
+
+    def reader() -> None:
+        while not stop.is_set():
+            try:
+                with Session() as db:
+                    db.scalar(select(func.count()).select_from(Task).where(Task.completed == True))
+                with lock:
+                    counters["reads"] += 1
+            except OperationalError:
+                with lock:
+                    counters["busy"] += 1
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(DURATION)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+
+    return {name: value / DURATION for name, value in counters.items()}
+
+
+def main() -> None:
+    profiles = {"по умолчанию": DEFAULT_PRAGMAS, "SQLITE_PRAGMAS": SQLITE_PRAGMAS}
+    print(f"1 писатель, 0 или {READERS} читателя, {DURATION:.0f} с на замер\n")
+    print(f"{'Профиль':<18}{'читателей':>10}{'записей/с':>12}{'чтений/с':>12}{'ошибок busy/с':>16}")
+    for readers in (0, READERS):
+        for name, pragmas in profiles.items():
+            result = run(pragmas, readers)
+            print(f"{name:<18}{readers:>10}{result['writes']:>12.0f}{result['reads']:>12.1f}{result['busy']:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Бенчмарк частых чтений: select(), построенный на каждый вызов, против
+заранее построенных запросов repository с параметрами при выполнении
+
+Отдельно измеряется только Python-часть (построение запроса и ключ кеша
+компиляции) и полный вызов через AsyncSession.
+
+Запуск из каталога бота:
+    python benchmarks/bench_statements.py [вызовов]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+TMP_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{TMP_DIR}/bench.db"
+os.environ["DB_STATS_ENABLED"] = "0"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+from database import engine, AsyncSessionLocal, init_db, dispose_engines, User, Task
+from models import TaskModel, UserModel
+from repository import model_columns
+import repository
+
+CALLS = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+
+
+def fill() -> None:
+    """Создает пару собеседников с несколькими задачами"""
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [
+            {"id": 1, "telegram_id": 1001, "full_name": "Alice", "partner_id": 2},
+            {"id": 2, "telegram_id": 1002, "full_name": "Bob", "partner_id": 1},
+        ])
+        now = datetime.utcnow()
+        conn.execute(Task.__table__.insert(), [
+            {"title": f"Task {i}", "assigned_by_id": 1, "assigned_to_id": 2, "created_at": now, "completed": False}
+            for i in range(10)
+        ])
+
+
+def user_with_partner_inline():
+    """Прежнее построение запроса пользователя с собеседником"""
+    partner = aliased(User)
+    return (
+        select(*model_columns(User, UserModel), *model_columns(partner, UserModel))
+        .outerjoin(partner, partner.id == User.partner_id)
+        .where(User.telegram_id == 1001)
+    )
+
+
+def active_tasks_inline():
+    """Прежнее построение запроса невыполненных задач создателя"""
+    return select(*model_columns(Task, TaskModel)).where(Task.completed == False, Task.assigned_by_id == 1)
+
+
+CASES = (
+    ("пользователь и собеседник", user_with_partner_inline,
+     lambda: repository.user_with_partner(), {"telegram_id": 1001}),
+    ("невыполненные задачи", active_tasks_inline,
+     lambda: repository.active_tasks(("assigned_by_id",)), {"assigned_by_id": 1}),
+)
+
+
+def python_overhead(build) -> float:
+    """Микросекунды на построение запроса и вычисление ключа кеша"""
+    started = time.perf_counter()
+    for _ in range(CALLS):
+        build()._generate_cache_key()
+    return (time.perf_counter() - started) / CALLS * 1e6
+
+
+async def full_call(build, params) -> float:
+    """Микросекунды на выполнение запроса через AsyncSession"""
+    async with AsyncSessionLocal() as db:
+        started = time.perf_counter()
+        for _ in range(CALLS):
+            (await db.execute(build(), params)).all()
+        return (time.perf_counter() - started) / CALLS * 1e6
+
+
+async def main() -> None:
+    init_db()
+    fill()
+    print(f"{CALLS} вызовов, мкс на вызов\n")
+    print(f"{'Запрос':<28}{'Python, на лету':>17}{'Python, готовый':>17}"
+          f"{'вызов, на лету':>16}{'вызов, готовый':>16}")
+    for name, inline, prebuilt, params in CASES:
+        await full_call(inline, params)  # Прогрев кеша компиляции
+        print(f"{name:<28}{python_overhead(inline):>17.1f}{python_overhead(prebuilt):>17.1f}"
+              f"{await full_call(inline, params):>16.1f}{await full_call(prebuilt, params):>16.1f}")
+    await dispose_engines()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
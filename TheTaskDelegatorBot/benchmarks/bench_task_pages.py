@@ -0,0 +1,101 @@
+"""
+Бенчмарк постраничного вывода задач по курсору (created_at, id)
+
+Часть задач создается без created_at, как в базах до миграции 5: миграция
+заполняет его одним значением, и такие задачи различаются только по id.
+Перед замером проверяется, что листание вперед и назад проходит все задачи.
+
+Запуск из каталога бота:
+    python benchmarks/bench_task_pages.py [задач]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+TMP_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{TMP_DIR}/bench.db"
+os.environ["DB_STATS_ENABLED"] = "0"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from database import engine, AsyncSessionLocal, dispose_engines
+import migrations
+import utils
+
+TASKS = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+# Доля задач без created_at (заполняется миграцией)
+BACKFILLED = 0.5
+
+
+def fill() -> None:
+    """Создает базу версии 4, заполняет задачи и применяет остальные миграции"""
+    steps = list(migrations.MIGRATIONS)
+    migrations.MIGRATIONS[:] = [step for step in steps if step[0] <= 4]
+    migrations.run_migrations(engine)
+    migrations.MIGRATIONS[:] = steps
+
+    now = datetime.utcnow()
+    backfilled = int(TASKS * BACKFILLED)
+    raw = engine.raw_connection()
+    try:
+        raw.executemany(
+            "INSERT INTO users (id, telegram_id, full_name, partner_id) VALUES (?, ?, ?, ?)",
+            [(1, 1001, "Alice", 2), (2, 1002, "Bob", 1)])
+        raw.executemany(
+            "INSERT INTO tasks (title, assigned_by_id, assigned_to_id, created_at, completed) "
+            "VALUES (?, 1, 2, ?, 0)",
+            [(f"Task {i}", None if i < backfilled else
+              (now - timedelta(minutes=i)).strftime("%Y-%m-%d %H:%M:%S.%f"))
+             for i in range(TASKS)])
+        raw.commit()
+    finally:
+        raw.close()
+
+    migrations.run_migrations(engine)
+
+
+async def walk(backward: bool = False) -> list:
+    """Проходит все страницы задач Bob и возвращает id в порядке листания"""
+    async with AsyncSessionLocal() as db:
+        pages = [await utils.get_active_task_page(db, assigned_to_id=2)]
+        # Число страниц ограничено на случай зацикленного курсора: лишние id провалят проверку
+        while pages[-1][2] and len(pages) <= TASKS:
+            pages.append(await utils.get_active_task_page(db, assigned_to_id=2, cursor=pages[-1][2]))
+        if not backward:
+            return [task.id for tasks, _, _ in pages for task in tasks]
+
+        # С последней страницы обратно к первой
+        pages = [pages[-1]]
+        while pages[-1][1] and len(pages) <= TASKS:
+            pages.append(await utils.get_active_task_page(
+                db, assigned_to_id=2, cursor=pages[-1][1], backward=True))
+        return [task.id for tasks, _, _ in pages for task in reversed(tasks)]
+
+
+async def main() -> None:
+    fill()
+    with engine.connect() as conn:
+        expected = conn.execute(text("SELECT id FROM tasks ORDER BY created_at, id")).scalars().all()
+
+    try:
+        forward = await walk()
+        assert forward == expected, f"вперед пройдено {len(forward)} задач из {len(expected)}"
+        backward = await walk(backward=True)
+        assert backward == expected[::-1], f"назад пройдено {len(backward)} задач из {len(expected)}"
+
+        started = time.perf_counter()
+        await walk()
+        elapsed = time.perf_counter() - started
+    finally:
+        await dispose_engines()
+
+    pages = -(-len(expected) // utils.TASKS_PAGE_SIZE)
+    print(f"{len(expected)} задач ({int(TASKS * BACKFILLED)} с заполненным created_at), {pages} страниц")
+    print(f"Все страницы: {elapsed * 1000:.1f} мс, страница: {elapsed / pages * 1000:.3f} мс")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
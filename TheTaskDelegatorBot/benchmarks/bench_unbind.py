@@ -0,0 +1,100 @@
+"""
+Бенчмарк отвязки собеседников с большим количеством общих задач:
+прежнее удаление по одной задаче через ORM против utils.unbind_partners
+
+Запуск из каталога бота:
+    python benchmarks/bench_unbind.py [количество_задач]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+TMP_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{TMP_DIR}/bench.db"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, select
+from database import engine, async_engine, AsyncSessionLocal, init_db, dispose_engines, User, Task
+import utils
+
+TASKS = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+
+
+def fill() -> None:
+    """Создает пару собеседников и их задачи"""
+    with engine.begin() as conn:
+        conn.execute(Task.__table__.delete())
+        conn.execute(User.__table__.delete())
+        conn.execute(User.__table__.insert(), [
+            {"id": 1, "telegram_id": 1001, "full_name": "Alice", "partner_id": 2, "tasks_created_count": TASKS, "tasks_received_count": 0},
+            {"id": 2, "telegram_id": 1002, "full_name": "Bob", "partner_id": 1, "tasks_created_count": 0, "tasks_received_count": TASKS},
+        ])
+        now = datetime.utcnow()
+        conn.execute(Task.__table__.insert(), [
+            {"title": f"Task {i}", "assigned_by_id": 1 + i % 2, "assigned_to_id": 2 - i % 2,
+             "created_at": now, "completed": i % 3 == 0}
+            for i in range(TASKS)
+        ])
+
+
+async def unbind_orm(db, user: User, partner: User) -> None:
+    """Прежняя реализация confirm_unbind_partner"""
+    tasks_assigned = (await db.scalars(select(Task).where(Task.assigned_by_id == user.id))).all()
+    tasks_received = (await db.scalars(select(Task).where(Task.assigned_to_id == user.id))).all()
+
+    for task in tasks_assigned:
+        await db.delete(task)
+    for task in tasks_received:
+        await db.delete(task)
+
+    deleted_tasks = tasks_assigned + tasks_received
+    await utils.record_tasks_deleted(db, len(deleted_tasks), sum(1 for task in deleted_tasks if task.completed))
+
+    for member in (user, partner):
+        member.tasks_created_count = 0
+        member.tasks_completed_count = 0
+        member.tasks_received_count = 0
+        member.tasks_deleted_count = 0
+        member.partner_id = None
+    await db.flush()
+
+
+async def measure(unbind) -> tuple:
+    """Выполняет отвязку в одной транзакции, возвращает время в секундах и число выполнений запросов"""
+    fill()
+    statements = [0]
+
+    def count(conn, cursor, statement, parameters, context, executemany) -> None:
+        # executemany выполняет запрос для каждого набора параметров
+        statements[0] += len(parameters) if executemany else 1
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", count)
+    started = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        user = await db.get(User, 1)
+        partner = await db.get(User, 2)
+        await unbind(db, user, partner)
+        await db.commit()
+    elapsed = time.perf_counter() - started
+    event.remove(async_engine.sync_engine, "before_cursor_execute", count)
+
+    with engine.connect() as conn:
+        assert conn.execute(select(Task.id).limit(1)).first() is None
+    return elapsed, statements[0]
+
+
+async def main() -> None:
+    init_db()
+    print(f"Пара собеседников, {TASKS} общих задач\n")
+    print(f"{'Реализация':<24}{'время, с':>12}{'выполнений SQL':>16}")
+    for name, unbind in (("ORM по одной задаче", unbind_orm), ("utils.unbind_partners", utils.unbind_partners)):
+        elapsed, statements = await measure(unbind)
+        print(f"{name:<24}{elapsed:>12.2f}{statements:>16}")
+    await dispose_engines()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -4,8 +4,14 @@ from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.enums import ParseMode
 import config
-from database import init_db
+from database import init_db, dispose_engines
 from handlers import main_router
+from middlewares import CommitBeforeRequestMiddleware
+from jobs import start_background_jobs, stop_background_jobs
+from invites import invite_registry
+from notifications import set_bot, close_bot, notification_queue
+from outbox import outbox_dispatcher
+from onesignal_api import onesignal_client, wait_pending_sends
 
 # Настройка логирования
 logging.basicConfig(
@@ -21,8 +27,18 @@ async def main():
         # Инициализация базы данных
         init_db()
 
+        # Действующие коды приглашения для проверки без запросов к базе
+        invites_loaded = await invite_registry.load()
+
         # Инициализация бота
         bot = Bot(token=config.config.BOT_TOKEN, parse_mode=ParseMode.HTML)
+        # Транзакция апдейта фиксируется до ответа, блокировка базы не ждет сеть
+        bot.session.middleware(CommitBeforeRequestMiddleware())
+
+        # Уведомления собеседникам отправляются через этого же бота
+        set_bot(bot)
+        notification_queue.start()
+        outbox_dispatcher.start()
 
         # Инициализация диспетчера
         storage = MemoryStorage()
@@ -32,11 +48,25 @@ async def main():
 
         logger.info("✅ Бот запущен и готов к работе!")
         logger.info("✅ База данных инициализирована")
+        logger.info(f"✅ Загружено кодов приглашения: {invites_loaded}")
         logger.info("✅ Графики статистики активированы")
         logger.info("✅ Доступные модули: статистика, задачи, уведомления, графики")
 
+        # Фоновые задачи: сверка статистики, запись активности
+        jobs = start_background_jobs()
+
         # Запуск бота
-        await dp.start_polling(bot)
+        try:
+            await dp.start_polling(bot)
+        finally:
+            await stop_background_jobs(jobs)
+            await outbox_dispatcher.stop()
+            await notification_queue.stop()
+            # Сессию закрывает и start_polling, но остановка очереди может открыть ее снова
+            await close_bot()
+            await wait_pending_sends()
+            await onesignal_client.close()
+            await dispose_engines()
 
     except Exception as e:
         logger.error(f"❌ Ошибка запуска бота: {e}")
@@ -1,29 +1,167 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey, Boolean, text
+from sqlalchemy import create_engine, event, make_url, Column, Integer, String, Date, DateTime, ForeignKey, Boolean, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from datetime import datetime
+from typing import Callable, Dict, Optional
+import logging
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./tasks.db")
 
+# Профиль SQLite, применяется к каждому новому соединению.
+# WAL позволяет читать статистику параллельно с записью задач,
+# пустое значение в .env отключает соответствующую настройку.
+# auto_vacuum действует для новой базы, существующую переводит миграция 7
+SQLITE_PRAGMAS: Dict[str, str] = {
+    "auto_vacuum": os.getenv("SQLITE_AUTO_VACUUM", "INCREMENTAL"),
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"),
+    "cache_size": os.getenv("SQLITE_CACHE_SIZE", "-20000"),  # отрицательное значение - в КиБ
+    "mmap_size": os.getenv("SQLITE_MMAP_SIZE", "268435456"),
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+}
+
+
+def sqlite_pragma_listener(pragmas: Dict[str, str]) -> Callable:
+    """Создает обработчик события connect, выставляющий PRAGMA соединения"""
+    def on_connect(dbapi_connection, connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            if value:
+                cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+    return on_connect
+
+
+# Статистика пулов и запросов (db_stats), отключается DB_STATS_ENABLED=0
+DB_STATS_ENABLED: bool = os.getenv("DB_STATS_ENABLED", "1") == "1"
+# Подсчет строк результата SELECT буферизует каждый результат ORM-запроса,
+# поэтому включается отдельно (DB_STATS_ROWS=1) на время разбора
+DB_STATS_ROWS: bool = os.getenv("DB_STATS_ROWS", "0") == "1"
+
+
+def _poolclass(name: str, url: str, poolclass: Optional[type] = None) -> Optional[type]:
+    """Класс пула движка, при включенной статистике - подкласс с замером ожидания соединения"""
+    if not DB_STATS_ENABLED:
+        return poolclass
+
+    from db_stats import timed_pool_class
+
+    if poolclass is None:
+        parsed = make_url(url)
+        poolclass = parsed.get_dialect().get_pool_class(parsed)
+    return timed_pool_class(poolclass, name)
+
+
 engine = create_engine(DATABASE_URL,
+                       poolclass=_poolclass("sync", DATABASE_URL),
                        connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+if DATABASE_URL.startswith("sqlite"):
+    event.listen(engine, "connect", sqlite_pragma_listener(SQLITE_PRAGMAS))
+
+
+def _to_async_url(url: str) -> str:
+    """Подбирает асинхронный драйвер для URL базы данных"""
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    return url
+
+
+def _async_poolclass(url: str) -> Optional[type]:
+    """aiosqlite по умолчанию открывает новое соединение на каждую сессию, для файла SQLite держим пул"""
+    if url.startswith("sqlite") and ":memory:" not in url:
+        return AsyncAdaptedQueuePool
+    return None
+
+
+# Асинхронный движок для обработчиков: запросы не блокируют event loop бота
+ASYNC_DATABASE_URL: str = os.getenv("ASYNC_DATABASE_URL", _to_async_url(DATABASE_URL))
+
+async_engine = create_async_engine(ASYNC_DATABASE_URL,
+                                   poolclass=_poolclass("async", ASYNC_DATABASE_URL, _async_poolclass(ASYNC_DATABASE_URL)))
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False,
+                                       class_=AsyncSession)
+
+if ASYNC_DATABASE_URL.startswith("sqlite"):
+    event.listen(async_engine.sync_engine, "connect", sqlite_pragma_listener(SQLITE_PRAGMAS))
+
+
+def _to_readonly_url(url: str) -> str:
+    """Открывает файл SQLite только на чтение через URI mode=ro"""
+    prefix, _, path = url.partition(":///")
+    if not prefix.startswith("sqlite") or not path or path.startswith("file:") or path == ":memory:":
+        return url
+    return f"{prefix}:///file:{path}?mode=ro&uri=true"
+
+
+# Движок только для чтения: статистика и графики не конкурируют с записью задач.
+# READONLY_DATABASE_URL может указывать на реплику, по умолчанию это та же база
+READONLY_DATABASE_URL: str = os.getenv("READONLY_DATABASE_URL", _to_readonly_url(DATABASE_URL))
+ASYNC_READONLY_DATABASE_URL: str = os.getenv("ASYNC_READONLY_DATABASE_URL", _to_async_url(READONLY_DATABASE_URL))
+
+# Режим журнала, синхронизация и auto_vacuum задаются пишущим соединением
+READONLY_SQLITE_PRAGMAS: Dict[str, str] = {
+    name: value for name, value in SQLITE_PRAGMAS.items() if name not in ("auto_vacuum", "journal_mode", "synchronous")
+}
+
+readonly_engine = create_engine(READONLY_DATABASE_URL,
+                                poolclass=_poolclass("readonly", READONLY_DATABASE_URL),
+                                connect_args={"check_same_thread": False} if READONLY_DATABASE_URL.startswith("sqlite") else {})
+ReadOnlySessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=readonly_engine)
+
+async_readonly_engine = create_async_engine(ASYNC_READONLY_DATABASE_URL,
+                                            poolclass=_poolclass("async readonly", ASYNC_READONLY_DATABASE_URL,
+                                                                 _async_poolclass(ASYNC_READONLY_DATABASE_URL)))
+AsyncReadOnlySessionLocal = async_sessionmaker(bind=async_readonly_engine, autoflush=False, expire_on_commit=False,
+                                               class_=AsyncSession)
+
+if READONLY_DATABASE_URL.startswith("sqlite"):
+    event.listen(readonly_engine, "connect", sqlite_pragma_listener(READONLY_SQLITE_PRAGMAS))
+if ASYNC_READONLY_DATABASE_URL.startswith("sqlite"):
+    event.listen(async_readonly_engine.sync_engine, "connect", sqlite_pragma_listener(READONLY_SQLITE_PRAGMAS))
+
+if DB_STATS_ENABLED:
+    from db_stats import instrument_engine, instrument_sessions
+
+    if DB_STATS_ROWS:
+        instrument_sessions()
+    instrument_engine(engine, "sync")
+    instrument_engine(async_engine.sync_engine, "async")
+    instrument_engine(readonly_engine, "readonly")
+    instrument_engine(async_readonly_engine.sync_engine, "async readonly")
+
 Base = declarative_base()
 
 
 class User(Base):
     __tablename__ = 'users'
+    __table_args__ = (
+        # Активные пользователи в update_app_stats и графики активности
+        Index('ix_users_last_active_date', 'last_active_date'),
+        # График роста пользователей
+        Index('ix_users_joined_date', 'joined_date'),
+        # Привязка к OneSignal: один external ID - один пользователь
+        Index('ix_users_onesignal_external_id', 'onesignal_external_id', unique=True),
+    )
 
     id = Column(Integer, primary_key=True)
     telegram_id = Column(Integer, unique=True, nullable=False)
     username = Column(String)
     full_name = Column(String)
     partner_id = Column(Integer, ForeignKey('users.id'), nullable=True)
+    # Устарели: коды приглашений хранятся в таблице invites
     invite_code = Column(String, unique=True, nullable=True)
     invite_expires = Column(DateTime, nullable=True)
 
@@ -41,6 +179,7 @@ class User(Base):
     # Внешние API статистика
     onesignal_notifications_sent = Column(Integer, default=0)  # Отправлено через OneSignal
     onesignal_notifications_received = Column(Integer, default=0)  # Получено через OneSignal
+    onesignal_external_id = Column(String, nullable=True)  # External ID для адресных уведомлений
 
     tasks_assigned = relationship("Task", foreign_keys="Task.assigned_by_id", back_populates="assigned_by")
     tasks_received = relationship("Task", foreign_keys="Task.assigned_to_id", back_populates="assigned_to")
@@ -48,6 +187,14 @@ class User(Base):
 
 class Task(Base):
     __tablename__ = 'tasks'
+    __table_args__ = (
+        # Активные задачи для меня / от меня: view_tasks, меню выполнения и удаления, статистика
+        # и постраничный вывод по (created_at, id)
+        Index('ix_tasks_assigned_to_completed_created', 'assigned_to_id', 'completed', 'created_at', 'id'),
+        Index('ix_tasks_assigned_by_completed_created', 'assigned_by_id', 'completed', 'created_at', 'id'),
+        # id перенесенных в tasks_archive задач не должны выдаваться повторно
+        {'sqlite_autoincrement': True},
+    )
 
     id = Column(Integer, primary_key=True)
     title = Column(String, nullable=False)
@@ -62,6 +209,57 @@ class Task(Base):
     assigned_to = relationship("User", foreign_keys=[assigned_to_id], back_populates="tasks_received")
 
 
+class TaskArchive(Base):
+    """Выполненные задачи, перенесенные из tasks фоновой задачей архивации"""
+    __tablename__ = 'tasks_archive'
+    __table_args__ = (
+        # Удаление архива при отвязке собеседников
+        Index('ix_tasks_archive_assigned_by_id', 'assigned_by_id'),
+        Index('ix_tasks_archive_assigned_to_id', 'assigned_to_id'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=False)  # id исходной задачи
+    title = Column(String, nullable=False)
+    description = Column(String)
+    assigned_by_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    assigned_to_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    created_at = Column(DateTime)
+    completed_at = Column(DateTime)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+
+class Invite(Base):
+    """Действующие коды приглашения, у пользователя не больше одного кода"""
+    __tablename__ = 'invites'
+    __table_args__ = (
+        # Очистка истекших кодов фоновой задачей
+        Index('ix_invites_expires_at', 'expires_at'),
+    )
+
+    code = Column(String, primary_key=True)
+    owner_id = Column(Integer, ForeignKey('users.id'), nullable=False, unique=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)
+
+
+class OutboxMessage(Base):
+    """Уведомления, записанные в транзакции изменения задачи и ожидающие отправки"""
+    __tablename__ = 'outbox'
+    __table_args__ = (
+        # Выборка готовых к отправке сообщений диспетчером
+        Index('ix_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    chat_id = Column(Integer, nullable=False)  # telegram_id получателя
+    text = Column(String, nullable=False)
+    status = Column(String, nullable=False, default='pending')  # pending / dead
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_error = Column(String, nullable=True)
+
+
 class AppStats(Base):
     __tablename__ = 'app_stats'
 
@@ -74,55 +272,40 @@ class AppStats(Base):
     updated_at = Column(DateTime, default=datetime.utcnow)
 
 
-def init_db() -> None:
-    """Инициализирует базу данных и добавляет недостающие столбцы"""
-    Base.metadata.create_all(bind=engine)
+class DailyStats(Base):
+    """Дневные агрегаты для графиков, обновляются приращениями при записи"""
+    __tablename__ = 'daily_stats'
 
-    try:
-        with engine.connect() as conn:
-            result = conn.execute(text("PRAGMA table_info(users)"))
-            columns: list[str] = [row[1] for row in result]
-
-            # Добавляем недостающие столбцы для статистики пользователей
-            if 'tasks_created_count' not in columns:
-                conn.execute(text("ALTER TABLE users ADD COLUMN tasks_created_count INTEGER DEFAULT 0"))
-
-            if 'tasks_completed_count' not in columns:
-                conn.execute(text("ALTER TABLE users ADD COLUMN tasks_completed_count INTEGER DEFAULT 0"))
+    day = Column(Date, primary_key=True)  # День по UTC
+    tasks_created = Column(Integer, default=0, nullable=False)
+    tasks_completed = Column(Integer, default=0, nullable=False)
+    users_joined = Column(Integer, default=0, nullable=False)
+    active_users = Column(Integer, default=0, nullable=False)  # Уникальные пользователи за день
 
-            if 'tasks_received_count' not in columns:
-                conn.execute(text("ALTER TABLE users ADD COLUMN tasks_received_count INTEGER DEFAULT 0"))
 
-            if 'tasks_deleted_count' not in columns:
-                conn.execute(text("ALTER TABLE users ADD COLUMN tasks_deleted_count INTEGER DEFAULT 0"))
-
-            # Добавляем новые столбцы для расширенной статистики
-            if 'total_messages_count' not in columns:
-                conn.execute(text("ALTER TABLE users ADD COLUMN total_messages_count INTEGER DEFAULT 0"))
-
-            if 'last_active_date' not in columns:
-                conn.execute(text("ALTER TABLE users ADD COLUMN last_active_date DATETIME DEFAULT CURRENT_TIMESTAMP"))
+def init_db() -> None:
+    """Инициализирует базу данных и применяет недостающие миграции"""
+    from migrations import run_migrations
 
-            if 'joined_date' not in columns:
-                conn.execute(text("ALTER TABLE users ADD COLUMN joined_date DATETIME DEFAULT CURRENT_TIMESTAMP"))
+    run_migrations(engine)
 
-            if 'onesignal_notifications_sent' not in columns:
-                conn.execute(text("ALTER TABLE users ADD COLUMN onesignal_notifications_sent INTEGER DEFAULT 0"))
+    if DATABASE_URL.startswith("sqlite"):
+        log_sqlite_settings()
 
-            if 'onesignal_notifications_received' not in columns:
-                conn.execute(text("ALTER TABLE users ADD COLUMN onesignal_notifications_received INTEGER DEFAULT 0"))
 
-            conn.commit()
+def log_sqlite_settings() -> None:
+    """Пишет в лог фактические значения PRAGMA после подключения"""
+    with engine.connect() as conn:
+        effective = {name: conn.exec_driver_sql(f"PRAGMA {name}").scalar() for name in SQLITE_PRAGMAS}
+    logger.info("⚙️ SQLite: " + ", ".join(f"{name}={value}" for name, value in effective.items()))
 
-            # Создаем начальную запись в AppStats если таблица пуста
-            app_stats_count = conn.execute(text("SELECT COUNT(*) FROM app_stats")).scalar()
-            if app_stats_count == 0:
-                conn.execute(text(
-                    "INSERT INTO app_stats (total_users, active_users, total_tasks, completed_tasks, onesignal_notifications_total) VALUES (0, 0, 0, 0, 0)"))
-                conn.commit()
 
-    except Exception as e:
-        print(f"Ошибка миграции: {e}")
+async def dispose_engines() -> None:
+    """Закрывает соединения всех пулов при завершении бота"""
+    await async_engine.dispose()
+    await async_readonly_engine.dispose()
+    engine.dispose()
+    readonly_engine.dispose()
 
 
 def get_db():
@@ -0,0 +1,227 @@
+"""
+Статистика соединений и запросов к базе данных
+
+Собирается обработчиками событий SQLAlchemy: время и количество выполнений
+каждого запроса, затронутые строки (и возвращенные при DB_STATS_ROWS=1),
+ожидание соединения из пула и число выданных соединений. Снимок доступен через db_stats.snapshot(),
+jobs.log_db_stats периодически пишет сводку в лог.
+"""
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import ORMExecuteState, Session
+
+logger = logging.getLogger(__name__)
+
+# Ограничение числа различных запросов, остальные учитываются вместе
+MAX_STATEMENTS = 500
+OTHER_STATEMENTS = "<прочие запросы>"
+
+_WHITESPACE = re.compile(r"\s+")
+_EXPANDED_PARAMS = re.compile(r"\(\?(?:, \?)+\)|\(%\(\w+\)s(?:, %\(\w+\)s)+\)|\(\$\d+(?:, \$\d+)+\)")
+
+
+@dataclass
+class QueryStats:
+    """Статистика одного запроса"""
+    count: int = 0
+    total_time: float = 0.0
+    max_time: float = 0.0
+    rows: int = 0  # Затронутые изменением строки и, при DB_STATS_ROWS=1, строки результата запросов
+
+    @property
+    def avg_time(self) -> float:
+        return self.total_time / self.count if self.count else 0.0
+
+
+@dataclass
+class PoolStats:
+    """Статистика пула соединений одного движка"""
+    connects: int = 0
+    checkouts: int = 0
+    checkins: int = 0
+    checked_out: int = 0
+    max_checked_out: int = 0
+    wait_total: float = 0.0
+    wait_max: float = 0.0
+
+    @property
+    def wait_avg(self) -> float:
+        return self.wait_total / self.checkouts if self.checkouts else 0.0
+
+
+@dataclass
+class DatabaseStats:
+    """Статистика всех инструментированных движков"""
+    queries: Dict[str, QueryStats] = field(default_factory=dict)
+    pools: Dict[str, PoolStats] = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record_query(self, statement: str, elapsed: float, rows: int) -> None:
+        key = _statement_key(statement)
+        with self.lock:
+            stats = self.queries.get(key)
+            if stats is None:
+                if len(self.queries) >= MAX_STATEMENTS:
+                    key = OTHER_STATEMENTS
+                stats = self.queries.setdefault(key, QueryStats())
+            stats.count += 1
+            stats.total_time += elapsed
+            stats.max_time = max(stats.max_time, elapsed)
+            if rows > 0:
+                stats.rows += rows
+
+    def record_rows(self, statement: str, rows: int) -> None:
+        """Добавляет строки, полученные из результата уже учтенного запроса"""
+        key = _statement_key(statement)
+        with self.lock:
+            stats = self.queries.get(key) or self.queries.get(OTHER_STATEMENTS)
+            if stats is not None:
+                stats.rows += rows
+
+    def slowest(self, limit: int = 5) -> List[tuple]:
+        """Запросы с наибольшим суммарным временем"""
+        with self.lock:
+            items = list(self.queries.items())
+        return sorted(items, key=lambda item: item[1].total_time, reverse=True)[:limit]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Копия текущих значений для вывода или экспорта"""
+        with self.lock:
+            return {
+                "pools": {name: vars(stats).copy() for name, stats in self.pools.items()},
+                "queries": {statement: vars(stats).copy() for statement, stats in self.queries.items()},
+            }
+
+    def reset(self) -> None:
+        """Обнуляет накопленную статистику запросов и ожидания"""
+        with self.lock:
+            self.queries.clear()
+            for stats in self.pools.values():
+                checked_out = stats.checked_out
+                stats.__init__()
+                stats.checked_out = stats.max_checked_out = checked_out
+
+
+def _statement_key(statement: str) -> str:
+    """Текст запроса без лишних пробелов и с одним маркером для развернутых IN (...)"""
+    return _EXPANDED_PARAMS.sub("(?...)", _WHITESPACE.sub(" ", statement).strip())
+
+
+# Глобальная статистика для использования во всем приложении
+db_stats = DatabaseStats()
+
+
+def timed_pool_class(pool_class: type, name: str) -> type:
+    """
+    Подкласс пула, замеряющий ожидание соединения в connect()
+    Передается движку через poolclass= при создании (database.py)
+    """
+    stats = db_stats.pools.setdefault(name, PoolStats())
+
+    def connect(self):
+        started = time.perf_counter()
+        connection = pool_class.connect(self)
+        waited = time.perf_counter() - started
+        with db_stats.lock:
+            stats.wait_total += waited
+            stats.wait_max = max(stats.wait_max, waited)
+        return connection
+
+    # Модуль исходного пула: логгер пула остается под "sqlalchemy" с уровнем WARN
+    return type(f"Timed{pool_class.__name__}", (pool_class,),
+                {"connect": connect, "__module__": pool_class.__module__})
+
+
+def instrument_engine(engine: Engine, name: str) -> None:
+    """Подключает сбор статистики к синхронному движку (для async - engine.sync_engine)"""
+    stats = db_stats.pools.setdefault(name, PoolStats())
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        # rowcount означает затронутые строки; строки результата считает count_result_rows
+        db_stats.record_query(statement, elapsed, cursor.rowcount if cursor.description is None else 0)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context) -> None:
+        started = context.connection.info.get("query_started") if context.connection else None
+        if started:
+            started.pop()
+
+    @event.listens_for(engine.pool, "connect")
+    def on_connect(dbapi_connection, connection_record) -> None:
+        with db_stats.lock:
+            stats.connects += 1
+
+    @event.listens_for(engine.pool, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy) -> None:
+        with db_stats.lock:
+            stats.checkouts += 1
+            stats.checked_out += 1
+            stats.max_checked_out = max(stats.max_checked_out, stats.checked_out)
+
+    @event.listens_for(engine.pool, "checkin")
+    def on_checkin(dbapi_connection, connection_record) -> None:
+        with db_stats.lock:
+            stats.checkins += 1
+            stats.checked_out = max(stats.checked_out - 1, 0)
+
+
+def count_result_rows(state: ORMExecuteState):
+    """
+    Считает строки, возвращенные запросом через сессию (SELECT, RETURNING)
+    Драйвер не сообщает их число (rowcount для SELECT равен -1), поэтому
+    результат буферизуется и возвращается вызывающему из буфера.
+    Потоковые результаты (yield_per, stream) не считаются.
+    Подключается instrument_sessions только при DB_STATS_ROWS=1
+    """
+    options = state.execution_options
+    if options.get("yield_per") or options.get("stream_results"):
+        return None
+
+    result = state.invoke_statement()
+    cursor_result = getattr(result, "raw", result)
+    if not getattr(cursor_result, "returns_rows", False):
+        return result
+    if not state.is_select:
+        # RETURNING в UPDATE/DELETE добавляет и сам ORM (synchronize_session="fetch"),
+        # а вызывающий читает rowcount, которого нет у буферизованного результата
+        if cursor_result.rowcount > 0:
+            db_stats.record_rows(cursor_result.context.statement, cursor_result.rowcount)
+        return result
+
+    frozen = result.freeze()
+    db_stats.record_rows(cursor_result.context.statement, len(frozen.data))
+    return frozen()
+
+
+def instrument_sessions() -> None:
+    """Подключает подсчет строк результата ко всем сессиям"""
+    if not event.contains(Session, "do_orm_execute", count_result_rows):
+        event.listen(Session, "do_orm_execute", count_result_rows)
+
+
+def log_db_stats(limit: int = 5) -> None:
+    """Пишет в лог сводку по пулам и самым затратным запросам"""
+    for name, stats in db_stats.pools.items():
+        logger.info(
+            f"📊 БД {name}: соединений выдано {stats.checkouts}, сейчас {stats.checked_out} "
+            f"(макс. {stats.max_checked_out}), новых {stats.connects}, ожидание "
+            f"ср. {stats.wait_avg * 1000:.2f} мс / макс. {stats.wait_max * 1000:.2f} мс"
+        )
+    for statement, stats in db_stats.slowest(limit):
+        logger.info(
+            f"🐢 {stats.total_time * 1000:.0f} мс всего, {stats.count} раз, "
+            f"ср. {stats.avg_time * 1000:.2f} мс, макс. {stats.max_time * 1000:.2f} мс, "
+            f"строк {stats.rows}: {statement[:200]}"
+        )
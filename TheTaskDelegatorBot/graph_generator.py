@@ -4,9 +4,10 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 import os
-from database import User, Task, AppStats
+from database import User, Task, TaskArchive, AppStats, DailyStats
 
 # Настройки стиля графиков
 plt.style.use('seaborn-v0_8-darkgrid')
@@ -31,26 +32,16 @@ class GraphGenerator:
 
     def generate_user_growth_graph(self) -> str:
         """График роста пользователей"""
-        # Получаем данные о пользователях по дате регистрации
-        users = self.db.query(User).order_by(User.joined_date).all()
+        # Регистрации по дням из дневных агрегатов
+        rows = self.db.query(DailyStats.day, DailyStats.users_joined).filter(
+            DailyStats.users_joined > 0
+        ).order_by(DailyStats.day).all()
 
-        if len(users) < 2:
+        if sum(joined for _, joined in rows) < 2:
             return self._generate_empty_graph("Недостаточно данных о пользователях")
 
-        # Группируем по дням
-        data = []
-        for user in users:
-            if user.joined_date:
-                data.append({
-                    'date': user.joined_date.date(),
-                    'count': 1
-                })
-
-        df = pd.DataFrame(data)
-        if df.empty:
-            return self._generate_empty_graph("Недостаточно данных о пользователях")
-
-        daily_counts = df.groupby('date').sum().cumsum()
+        df = pd.DataFrame(rows, columns=['date', 'count']).set_index('date')
+        daily_counts = df.cumsum()
 
         plt.figure(figsize=(12, 6))
         plt.plot(daily_counts.index, daily_counts['count'], marker='o', linewidth=3, markersize=8)
@@ -63,7 +54,7 @@ class GraphGenerator:
         plt.xticks(rotation=45)
 
         # Добавляем аннотацию с текущим количеством
-        current_count = len(users)
+        current_count = int(daily_counts['count'].iloc[-1])
         plt.annotate(f'Всего: {current_count}',
                      xy=(1, 1), xycoords='axes fraction',
                      xytext=(-10, -10), textcoords='offset points',
@@ -75,14 +66,19 @@ class GraphGenerator:
 
     def generate_task_completion_graph(self) -> str:
         """График выполнения задач"""
-        tasks = self.db.query(Task).all()
+        # Данные для графика одним агрегатным запросом
+        total_tasks, completed = self.db.query(
+            func.count(Task.id), func.count(Task.id).filter(Task.completed == True)
+        ).one()
+
+        # Выполненные задачи из архива
+        archived = self.db.query(func.count(TaskArchive.id)).scalar()
+        total_tasks += archived
+        completed += archived
 
-        if not tasks:
+        if not total_tasks:
             return self._generate_empty_graph("Нет данных о задачах")
 
-        # Данные для графика
-        total_tasks = len(tasks)
-        completed = sum(1 for t in tasks if t.completed)
         pending = total_tasks - completed
 
         labels = ['Выполнено', 'В ожидании']
@@ -110,21 +106,22 @@ class GraphGenerator:
 
     def generate_user_activity_graph(self) -> str:
         """График активности пользователей"""
-        users = self.db.query(User).filter(User.last_active_date.isnot(None)).all()
+        now = datetime.utcnow()
+        days = 30  # Последние 30 дней
 
-        if len(users) < 2:
+        # Уникальные активные пользователи по дням из дневных агрегатов
+        rows = self.db.query(DailyStats.day, DailyStats.active_users).filter(
+            DailyStats.day > (now - timedelta(days=days)).date()
+        ).all()
+
+        if sum(active for _, active in rows) < 2:
             return self._generate_empty_graph("Недостаточно данных об активности")
 
-        # Группируем активность по дням
-        now = datetime.utcnow()
-        days = 30  # Последние 30 дней
         activity_counts = {i: 0 for i in range(days)}
-
-        for user in users:
-            if user.last_active_date:
-                days_ago = (now - user.last_active_date).days
-                if 0 <= days_ago < days:
-                    activity_counts[days_ago] += 1
+        for day, active in rows:
+            days_ago = (now.date() - day).days
+            if 0 <= days_ago < days:
+                activity_counts[days_ago] = active
 
         # Готовим данные
         dates = [(now - timedelta(days=i)).strftime('%d.%m') for i in range(days)]
@@ -158,13 +155,13 @@ class GraphGenerator:
 
     def generate_partnership_graph(self) -> str:
         """График партнерских связей"""
-        users = self.db.query(User).all()
+        total_users, with_partner = self.db.query(
+            func.count(User.id), func.count(User.partner_id)
+        ).one()
 
-        if not users:
+        if not total_users:
             return self._generate_empty_graph("Нет данных о пользователях")
 
-        total_users = len(users)
-        with_partner = sum(1 for u in users if u.partner_id)
         without_partner = total_users - with_partner
 
         # Создаем два графика рядом
@@ -206,24 +203,17 @@ class GraphGenerator:
 
     def generate_task_timeline_graph(self) -> str:
         """График создания задач по времени"""
-        tasks = self.db.query(Task).order_by(Task.created_at).all()
+        # Созданные и выполненные за день задачи из дневных агрегатов
+        rows = self.db.query(DailyStats.day, DailyStats.tasks_created, DailyStats.tasks_completed).filter(
+            (DailyStats.tasks_created > 0) | (DailyStats.tasks_completed > 0)
+        ).order_by(DailyStats.day).all()
 
-        if len(tasks) < 3:
+        if sum(created for _, created, _ in rows) < 3:
             return self._generate_empty_graph("Недостаточно данных о задачах")
 
-        # Группируем задачи по дням
-        task_dates = {}
-        for task in tasks:
-            date = task.created_at.date() if task.created_at else datetime.utcnow().date()
-            if date not in task_dates:
-                task_dates[date] = {'total': 0, 'completed': 0}
-            task_dates[date]['total'] += 1
-            if task.completed:
-                task_dates[date]['completed'] += 1
-
-        dates = sorted(task_dates.keys())
-        total_tasks = [task_dates[d]['total'] for d in dates]
-        completed_tasks = [task_dates[d]['completed'] for d in dates]
+        dates = [day for day, _, _ in rows]
+        total_tasks = [created for _, created, _ in rows]
+        completed_tasks = [completed for _, _, completed in rows]
 
         # Преобразуем даты в строки для отображения
         date_labels = [d.strftime('%d.%m') for d in dates]
@@ -257,7 +247,10 @@ class GraphGenerator:
         """График продуктивности пользователя (или всех пользователей)"""
         if telegram_id:
             # Личная статистика пользователя
-            user = self.db.query(User).filter(User.telegram_id == telegram_id).first()
+            user = self.db.query(
+                User.full_name, User.tasks_created_count, User.tasks_completed_count,
+                User.tasks_received_count, User.tasks_deleted_count
+            ).filter(User.telegram_id == telegram_id).first()
             if not user:
                 return None
 
@@ -286,7 +279,9 @@ class GraphGenerator:
             return self._save_graph(f'user_productivity_{telegram_id}.png')
         else:
             # Топ-10 самых продуктивных пользователей
-            users = self.db.query(User).all()
+            users = self.db.query(
+                User.id, User.full_name, User.tasks_created_count, User.tasks_completed_count
+            ).all()
 
             if len(users) < 2:
                 return self._generate_empty_graph("Недостаточно данных о пользователях")
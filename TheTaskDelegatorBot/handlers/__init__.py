@@ -1,8 +1,18 @@
 from aiogram import Router
+from database import AsyncSessionLocal, AsyncReadOnlySessionLocal
+from middlewares import DbSessionMiddleware, ReadOnlySessionMiddleware
 
 # Создаем главный роутер
 main_router = Router()
 
+# Одна сессия БД и один коммит на каждый апдейт
+main_router.message.outer_middleware(DbSessionMiddleware(AsyncSessionLocal))
+main_router.callback_query.outer_middleware(DbSessionMiddleware(AsyncSessionLocal))
+
+# Сессия только для чтения для статистики и графиков
+main_router.message.outer_middleware(ReadOnlySessionMiddleware(AsyncReadOnlySessionLocal))
+main_router.callback_query.outer_middleware(ReadOnlySessionMiddleware(AsyncReadOnlySessionLocal))
+
 # Импортируем все обработчики
 from .main_menu import router as main_menu_router
 from .tasks import router as tasks_router
@@ -21,10 +21,11 @@ async def help_command(message: Message) -> None:
         "📝 <b>Работа с задачами:</b>\n"
         "• Создать задание - назначить задачу собеседнику\n"
         "• Удалить задачу - удалить назначенную задачу\n"
-        "• Выполнил задачу - отметить задачу как выполненную (задача автоматически удаляется)\n"
+        "• Выполнил задачу - отметить задачу как выполненную (со временем она переносится в архив статистики)\n"
         "• Мои задачи - просмотр всех активных задач\n\n"
         "🌐 <b>Web-уведомления:</b>\n"
-        "• Web Notifications - отправка уведомлений через OneSignal API\n\n"
+        "• Web Notifications - отправка уведомлений через OneSignal API\n"
+        "• /onesignal_link - привязать свои устройства, чтобы получать Web-уведомления о задачах\n\n"
         "🔗 <b>Управление связью:</b>\n"
         "• Отвязать собеседника - разорвать связь (все задачи удаляются)"
     )
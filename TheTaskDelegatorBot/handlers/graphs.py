@@ -1,22 +1,33 @@
 from aiogram import Router, F
-from sqlalchemy.orm import Session
 import keyboards as kb
-from database import get_db
+from database import ReadOnlySessionLocal
 from graph_generator import GraphGenerator
+import asyncio
 import os
+import threading
 from datetime import datetime
+from typing import Callable, Optional
 from aiogram.types import Message, CallbackQuery, FSInputFile, InputMediaPhoto
 router = Router()
 
+# pyplot хранит глобальное состояние, поэтому графики строятся по одному
+_graph_lock = threading.Lock()
+
+
+async def generate_graph(graph_func: Callable[..., Optional[str]], *args) -> Optional[str]:
+    """Строит график в отдельном потоке, не блокируя event loop бота"""
+    def worker() -> Optional[str]:
+        with _graph_lock, ReadOnlySessionLocal() as db:
+            return graph_func(GraphGenerator(db), *args)
+
+    return await asyncio.to_thread(worker)
+
 
 @router.message(F.text == "📈 Графики")
 async def show_graphs_menu(message: Message) -> None:
     """Показывает меню графиков"""
-    db = next(get_db())
-
     # Очищаем старые графики
-    generator = GraphGenerator(db)
-    generator.cleanup_old_graphs()
+    await generate_graph(GraphGenerator.cleanup_old_graphs)
 
     menu_text = (
         "📈 <b>МЕНЮ ГРАФИКОВ СТАТИСТИКИ</b>\n\n"
@@ -38,8 +49,6 @@ async def show_graphs_menu(message: Message) -> None:
 async def handle_graph_callback(callback: CallbackQuery) -> None:
     """Обработчик нажатий на кнопки графиков"""
     graph_type = callback.data.split(":")[1]
-    db = next(get_db())
-    generator = GraphGenerator(db)
 
     # Показываем пользователю, что идет генерация
     await callback.answer(f"🔄 Генерирую {get_graph_name(graph_type)}...")
@@ -49,7 +58,7 @@ async def handle_graph_callback(callback: CallbackQuery) -> None:
 
         # Генерируем соответствующий график
         if graph_type == "users_growth":
-            graph_path = generator.generate_user_growth_graph()
+            graph_path = await generate_graph(GraphGenerator.generate_user_growth_graph)
             caption = (
                 "📈 <b>ГРАФИК РОСТА ПОЛЬЗОВАТЕЛЕЙ</b>\n\n"
                 "Показывает динамику регистрации новых пользователей с течением времени.\n"
@@ -57,7 +66,7 @@ async def handle_graph_callback(callback: CallbackQuery) -> None:
             )
 
         elif graph_type == "tasks_completion":
-            graph_path = generator.generate_task_completion_graph()
+            graph_path = await generate_graph(GraphGenerator.generate_task_completion_graph)
             caption = (
                 "✅ <b>ГРАФИК ВЫПОЛНЕНИЯ ЗАДАЧ</b>\n\n"
                 "Отображает процент выполненных и ожидающих задач.\n"
@@ -65,7 +74,7 @@ async def handle_graph_callback(callback: CallbackQuery) -> None:
             )
 
         elif graph_type == "user_activity":
-            graph_path = generator.generate_user_activity_graph()
+            graph_path = await generate_graph(GraphGenerator.generate_user_activity_graph)
             caption = (
                 "📅 <b>ГРАФИК АКТИВНОСТИ ПОЛЬЗОВАТЕЛЕЙ</b>\n\n"
                 "Показывает активность пользователей за последние 30 дней.\n"
@@ -73,7 +82,7 @@ async def handle_graph_callback(callback: CallbackQuery) -> None:
             )
 
         elif graph_type == "partnership":
-            graph_path = generator.generate_partnership_graph()
+            graph_path = await generate_graph(GraphGenerator.generate_partnership_graph)
             caption = (
                 "🤝 <b>ГРАФИК ПАРТНЕРСКИХ СВЯЗЕЙ</b>\n\n"
                 "Показывает распределение пользователей с партнерами и без.\n"
@@ -81,7 +90,7 @@ async def handle_graph_callback(callback: CallbackQuery) -> None:
             )
 
         elif graph_type == "task_timeline":
-            graph_path = generator.generate_task_timeline_graph()
+            graph_path = await generate_graph(GraphGenerator.generate_task_timeline_graph)
             caption = (
                 "📋 <b>ДИНАМИКА СОЗДАНИЯ ЗАДАЧ</b>\n\n"
                 "Показывает создание и выполнение задач по дням.\n"
@@ -89,7 +98,7 @@ async def handle_graph_callback(callback: CallbackQuery) -> None:
             )
 
         elif graph_type == "top_productivity":
-            graph_path = generator.generate_user_productivity_graph()
+            graph_path = await generate_graph(GraphGenerator.generate_user_productivity_graph)
             caption = (
                 "🏆 <b>ТОП-10 ПРОДУКТИВНЫХ ПОЛЬЗОВАТЕЛЕЙ</b>\n\n"
                 "Рейтинг самых активных пользователей по количеству задач.\n"
@@ -97,7 +106,8 @@ async def handle_graph_callback(callback: CallbackQuery) -> None:
             )
 
         elif graph_type == "my_stats":
-            graph_path = generator.generate_user_productivity_graph(callback.from_user.id)
+            graph_path = await generate_graph(GraphGenerator.generate_user_productivity_graph,
+                                              callback.from_user.id)
             if not graph_path:
                 await callback.message.answer("❌ Не удалось сгенерировать ваш график статистики")
                 return
@@ -112,23 +122,23 @@ async def handle_graph_callback(callback: CallbackQuery) -> None:
 
         elif graph_type == "all_metrics":
             # Создаем и отправляем несколько графиков сразу
-            await send_all_graphs(callback.message, db, generator)
+            await send_all_graphs(callback.message)
             await callback.answer()
             return
 
         elif graph_type == "refresh_all":
             await callback.answer("🔄 Обновляю все графики...")
-            await send_all_graphs(callback.message, db, generator)
+            await send_all_graphs(callback.message)
             return
 
         elif graph_type == "previous":
             await callback.answer("◀️ Показываю предыдущий график")
-            await show_navigation_graph(callback.message, db, -1)
+            await show_navigation_graph(callback.message, -1)
             return
 
         elif graph_type == "next":
             await callback.answer("▶️ Показываю следующий график")
-            await show_navigation_graph(callback.message, db, 1)
+            await show_navigation_graph(callback.message, 1)
             return
 
         else:
@@ -158,26 +168,27 @@ async def handle_graph_callback(callback: CallbackQuery) -> None:
     await callback.answer()
 
 
-async def send_all_graphs(message: Message, db: Session, generator: GraphGenerator):
+async def send_all_graphs(message: Message):
     """Отправляет все графики разом (галереей)"""
     try:
         # Генерируем все основные графики
         graphs_info = [
-            ("📈 Рост пользователей", generator.generate_user_growth_graph),
-            ("✅ Выполнение задач", generator.generate_task_completion_graph),
-            ("📅 Активность", generator.generate_user_activity_graph),
-            ("🤝 Партнеры", generator.generate_partnership_graph),
-            ("📋 Динамика задач", generator.generate_task_timeline_graph),
-            ("🏆 Топ продуктивность", lambda: generator.generate_user_productivity_graph()),
+            ("📈 Рост пользователей", GraphGenerator.generate_user_growth_graph),
+            ("✅ Выполнение задач", GraphGenerator.generate_task_completion_graph),
+            ("📅 Активность", GraphGenerator.generate_user_activity_graph),
+            ("🤝 Партнеры", GraphGenerator.generate_partnership_graph),
+            ("📋 Динамика задач", GraphGenerator.generate_task_timeline_graph),
+            ("🏆 Топ продуктивность", GraphGenerator.generate_user_productivity_graph),
         ]
 
         # Генерируем личный график отдельно
-        personal_graph = generator.generate_user_productivity_graph(message.from_user.id)
+        personal_graph = await generate_graph(GraphGenerator.generate_user_productivity_graph,
+                                              message.from_user.id)
 
         media = []
         for name, graph_func in graphs_info:
             try:
-                graph_path = graph_func()
+                graph_path = await generate_graph(graph_func)
                 if graph_path and os.path.exists(graph_path):
                     photo = FSInputFile(graph_path)
                     media.append(InputMediaPhoto(
@@ -214,7 +225,7 @@ async def send_all_graphs(message: Message, db: Session, generator: GraphGenerat
         await message.answer(f"❌ Ошибка при создании графиков: {str(e)}")
 
 
-async def show_navigation_graph(message: Message, db: Session, direction: int):
+async def show_navigation_graph(message: Message, direction: int):
     """Показывает следующий/предыдущий график"""
     # Это упрощенная реализация - можно расширить для реальной навигации
     await message.answer(
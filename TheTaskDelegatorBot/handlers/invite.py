@@ -2,48 +2,21 @@ from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 import keyboards as kb
 import utils
-from database import get_db
+from invites import invite_registry
+import outbox
 from handlers.main_menu import InviteStates, show_main_menu
 
 router = Router()
 
 
-async def send_notification(user_id: int, text: str) -> bool:
-    """Отправляет уведомление пользователю"""
-    try:
-        # 🔧 Получаем бота через функцию
-        from bot import get_bot
-        bot = get_bot()
-
-        if bot is None:
-            print(f"⚠️ Bot is None for user {user_id}. Creating temporary bot...")
-            # Создаем временный экземпляр бота
-            from aiogram import Bot
-            import config
-            temp_bot = Bot(token=config.config.BOT_TOKEN)
-            await temp_bot.send_message(user_id, text, parse_mode="HTML")
-            await temp_bot.session.close()
-            print(f"✅ Уведомление отправлено пользователю {user_id}")
-            return True
-
-        await bot.send_message(user_id, text, parse_mode="HTML")
-        print(f"✅ Уведомление отправлено пользователю {user_id}")
-        return True
-    except Exception as e:
-        print(f"❌ Ошибка отправки уведомления пользователю {user_id}: {e}")
-        return False
-
-
 @router.message(F.text == "🎫 Создать свой код")
-async def create_invite_code(message: Message) -> None:
+async def create_invite_code(message: Message, db: AsyncSession) -> None:
     """Создать инвайт-код"""
-    db: Session = next(get_db())
-    from database import User
-
-    user = db.query(User).filter(User.telegram_id == message.from_user.id).first()
+    user, _ = await utils.get_user_with_partner(db, message.from_user.id)
 
     if not user:
         await message.answer("❌ Ошибка: пользователь не найден")
@@ -53,7 +26,7 @@ async def create_invite_code(message: Message) -> None:
         await message.answer("✅ У вас уже есть собеседник!")
         return
 
-    invite_code, expires_at = utils.create_invite(db, message.from_user.id)
+    invite_code, expires_at = await utils.create_invite(db, message.from_user.id)
 
     if not invite_code:
         await message.answer("❌ Не удалось создать приглашение")
@@ -77,12 +50,9 @@ async def create_invite_code(message: Message) -> None:
 
 
 @router.message(F.text == "⌨️ Ввести код друга")
-async def enter_invite_code(message: Message, state: FSMContext) -> None:
+async def enter_invite_code(message: Message, state: FSMContext, db: AsyncSession) -> None:
     """Начать ввод инвайт-кода"""
-    db: Session = next(get_db())
-    from database import User
-
-    user = db.query(User).filter(User.telegram_id == message.from_user.id).first()
+    user, _ = await utils.get_user_with_partner(db, message.from_user.id)
 
     if not user:
         await message.answer("❌ Ошибка: пользователь не найден")
@@ -104,11 +74,11 @@ async def enter_invite_code(message: Message, state: FSMContext) -> None:
 
 
 @router.message(InviteStates.waiting_for_code)
-async def process_invite_code_input(message: Message, state: FSMContext) -> None:
+async def process_invite_code_input(message: Message, state: FSMContext, db: AsyncSession) -> None:
     """Обработать введенный код"""
     if message.text == "❌ Отмена":
         await state.clear()
-        await show_main_menu(message)
+        await show_main_menu(message, db)
         return
 
     invite_code: str = message.text.strip().upper()
@@ -117,36 +87,40 @@ async def process_invite_code_input(message: Message, state: FSMContext) -> None
         await message.answer("❌ Неверный формат кода! Код должен состоять из 6 букв/цифр.\nПопробуйте еще раз:")
         return
 
-    success: bool = await process_invite_code(message, invite_code, state)
+    # Проверка по реестру в памяти, без запроса к базе
+    if not invite_registry.is_valid(invite_code):
+        await message.answer("❌ Неверный или просроченный код приглашения\nПопробуйте еще раз:")
+        return
+
+    success: bool = await process_invite_code(message, invite_code, db, state)
 
     if success:
         await state.clear()
 
 
-async def process_invite_code(message: Message, invite_code: str, state: FSMContext = None) -> bool:
+async def process_invite_code(message: Message, invite_code: str, db: AsyncSession,
+                              state: FSMContext = None) -> bool:
     """Обработать код приглашения"""
-    db: Session = next(get_db())
-
     success: bool
     partner_id: int
     response: str
-    success, partner_id, response = utils.accept_invite(db, invite_code, message.from_user.id)
+    success, partner_id, response = await utils.accept_invite(db, invite_code, message.from_user.id)
 
     if success:
         from database import User
-        partner = db.query(User).filter(User.id == partner_id).first()
+        partner = await db.get(User, partner_id)
         partner_name: str = partner.full_name or "Собеседник"
         user_name: str = message.from_user.full_name or "Пользователь"
 
+        notification_text: str = f"✅ {user_name} подключился к вам!\n\nТеперь вы можете обмениваться задачами!"
+        await outbox.add_notification(db, partner.telegram_id, notification_text)
+
         await message.answer(
             f"✅ Вы успешно подключились к {partner_name}!\n\n"
             f"Теперь вы можете обмениваться задачами!"
         )
 
-        notification_text: str = f"✅ {user_name} подключился к вам!\n\nТеперь вы можете обмениваться задачами!"
-        await send_notification(partner.telegram_id, notification_text)
-
-        await show_main_menu(message)
+        await show_main_menu(message, db)
         return True
     else:
         await message.answer(response)
@@ -154,12 +128,9 @@ async def process_invite_code(message: Message, invite_code: str, state: FSMCont
 
 
 @router.message(F.text == "🔗 Отвязать собеседника")
-async def unbind_partner(message: Message) -> None:
+async def unbind_partner(message: Message, db: AsyncSession) -> None:
     """Отвязать собеседника"""
-    db: Session = next(get_db())
-    from database import User
-
-    user = db.query(User).filter(User.telegram_id == message.from_user.id).first()
+    user, partner = await utils.get_user_with_partner(db, message.from_user.id)
 
     if not user or not user.partner_id:
         await message.answer(
@@ -168,8 +139,7 @@ async def unbind_partner(message: Message) -> None:
         )
         return
 
-    partner = db.query(User).filter(User.id == user.partner_id).first()
-    partner_name: str = partner.full_name or "Собеседник"
+    partner_name: str = partner.full_name if partner and partner.full_name else "Собеседник"
 
     await message.answer(
         f"⚠️ <b>Отвязать собеседника?</b>\n\n"
@@ -186,49 +156,23 @@ async def unbind_partner(message: Message) -> None:
 
 
 @router.callback_query(F.data == "confirm_unbind")
-async def confirm_unbind_partner(callback: CallbackQuery) -> None:
+async def confirm_unbind_partner(callback: CallbackQuery, db: AsyncSession) -> None:
     """Подтверждение отвязки собеседника"""
-    db: Session = next(get_db())
-    from database import User, Task
+    from database import User
 
-    user = db.query(User).filter(User.telegram_id == callback.from_user.id).first()
+    user = await db.scalar(select(User).where(User.telegram_id == callback.from_user.id))
 
     if not user or not user.partner_id:
         await callback.message.answer("❌ У вас нет привязанного собеседника!")
         await callback.answer()
         return
 
-    partner = db.query(User).filter(User.id == user.partner_id).first()
+    partner = await db.get(User, user.partner_id)
     partner_name: str = partner.full_name or "Собеседник"
     user_name: str = callback.from_user.full_name or "Пользователь"
 
-    tasks_assigned: list[Task] = db.query(Task).filter(Task.assigned_by_id == user.id).all()
-    tasks_received: list[Task] = db.query(Task).filter(Task.assigned_to_id == user.id).all()
-
-    for task in tasks_assigned:
-        db.delete(task)
-    for task in tasks_received:
-        db.delete(task)
-
-    try:
-        user.tasks_created_count = 0
-        user.tasks_completed_count = 0
-        user.tasks_received_count = 0
-        user.tasks_deleted_count = 0
-
-        if partner:
-            partner.tasks_created_count = 0
-            partner.tasks_completed_count = 0
-            partner.tasks_received_count = 0
-            partner.tasks_deleted_count = 0
-    except:
-        pass
-
-    user.partner_id = None
-    if partner:
-        partner.partner_id = None
-
-    db.commit()
+    # Удаляем общие задачи и сбрасываем статистику обоих пользователей
+    await utils.unbind_partners(db, user, partner)
 
     if partner:
         notification_text: str = (
@@ -236,7 +180,7 @@ async def confirm_unbind_partner(callback: CallbackQuery) -> None:
             f"Все общие задачи удалены.\n"
             f"Статистика сброшена."
         )
-        await send_notification(partner.telegram_id, notification_text)
+        await outbox.add_notification(db, partner.telegram_id, notification_text)
 
     await callback.message.answer(
         f"🔗 Собеседник <b>{partner_name}</b> отвязан!\n"
@@ -252,7 +196,7 @@ async def confirm_unbind_partner(callback: CallbackQuery) -> None:
 
 
 @router.message(Command("invite"))
-async def invite_command(message: Message) -> None:
+async def invite_command(message: Message, db: AsyncSession) -> None:
     """Команда /invite для принятия кода"""
     args: list[str] = message.text.split()
     if len(args) < 2:
@@ -260,4 +204,4 @@ async def invite_command(message: Message) -> None:
         return
 
     invite_code: str = args[1].upper()
-    await process_invite_code(message, invite_code)
\ No newline at end of file
+    await process_invite_code(message, invite_code, db)
\ No newline at end of file
@@ -3,10 +3,12 @@ from aiogram.types import Message, CallbackQuery, ReplyKeyboardMarkup, KeyboardB
 from aiogram.filters import Command, CommandStart
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 import keyboards as kb
-from database import get_db
 import utils
+from models import UserStatsModel
+from user_cache import invalidate_users
 
 router = Router()
 
@@ -16,23 +18,22 @@ class InviteStates(StatesGroup):
 
 
 @router.message(CommandStart())
-async def start_command(message: Message, state: FSMContext) -> None:
+async def start_command(message: Message, state: FSMContext, db: AsyncSession) -> None:
     """Обработчик команды /start"""
-    db: Session = next(get_db())
     from database import User
 
     # Обновляем статистику активности
-    utils.update_user_activity(db, message.from_user.id)
+    utils.update_user_activity(message.from_user.id)
 
     args: list[str] = message.text.split()
     if len(args) > 1:
         invite_code: str = args[1]
         from handlers.invite import process_invite_code
-        success: bool = await process_invite_code(message, invite_code, state)
+        success: bool = await process_invite_code(message, invite_code, db, state)
         if success:
             return
 
-    user = db.query(User).filter(User.telegram_id == message.from_user.id).first()
+    user = await db.scalar(select(User).where(User.telegram_id == message.from_user.id))
 
     if not user:
         user = User(
@@ -43,23 +44,21 @@ async def start_command(message: Message, state: FSMContext) -> None:
             last_active_date=utils.datetime.utcnow()
         )
         db.add(user)
-        db.commit()
+        await db.flush()
+        invalidate_users(db, user.telegram_id)
         # Обновляем общую статистику
-        utils.update_app_stats(db)
+        await utils.record_user_joined(db)
 
-    await show_main_menu(message, user, db)
+    await show_main_menu(message, db, user)
 
 
-async def show_main_menu(message: Message, user=None, db_session=None) -> None:
+async def show_main_menu(message: Message, db_session: AsyncSession, user=None) -> None:
     """Показывает главное меню"""
     if not user:
-        if not db_session:
-            db_session = next(get_db())
-        from database import User
-        user = db_session.query(User).filter(User.telegram_id == message.from_user.id).first()
+        user = await utils.get_user_model(db_session, message.from_user.id, UserStatsModel)
 
     # Обновляем активность
-    utils.update_user_activity(db_session, message.from_user.id)
+    utils.update_user_activity(message.from_user.id)
 
     welcome_text: str = (
         "👋 Добро пожаловать в TaskBuddy!\n\n"
@@ -67,10 +66,7 @@ async def show_main_menu(message: Message, user=None, db_session=None) -> None:
     )
 
     if user and user.partner_id:
-        if not db_session:
-            db_session = next(get_db())
-        from database import User
-        partner = db_session.query(User).filter(User.id == user.partner_id).first()
+        _, partner = await utils.get_user_with_partner(db_session, user.telegram_id)
         if partner:
             partner_name: str = partner.full_name or "Собеседник"
             partner_username: str = f"@{partner.username}" if partner.username else ""
@@ -95,22 +91,20 @@ async def show_main_menu(message: Message, user=None, db_session=None) -> None:
 
 
 @router.message(F.text == "⬅️ Назад в меню")
-async def back_to_menu(message: Message) -> None:
+async def back_to_menu(message: Message, db: AsyncSession) -> None:
     """Возврат в главное меню"""
-    db = next(get_db())
-    utils.update_user_activity(db, message.from_user.id)
-    await show_main_menu(message)
+    utils.update_user_activity(message.from_user.id)
+    await show_main_menu(message, db)
 
 
 @router.message(F.text == "🔍 Найти собеседника")
-async def find_partner_menu(message: Message) -> None:
+async def find_partner_menu(message: Message, db: AsyncSession) -> None:
     """Меню поиска собеседника"""
-    db: Session = next(get_db())
     from database import User
 
-    utils.update_user_activity(db, message.from_user.id)
+    utils.update_user_activity(message.from_user.id)
 
-    user = db.query(User).filter(User.telegram_id == message.from_user.id).first()
+    user = await db.scalar(select(User).where(User.telegram_id == message.from_user.id))
 
     if not user:
         user = User(
@@ -121,8 +115,9 @@ async def find_partner_menu(message: Message) -> None:
             last_active_date=utils.datetime.utcnow()
         )
         db.add(user)
-        db.commit()
-        utils.update_app_stats(db)
+        await db.flush()
+        invalidate_users(db, user.telegram_id)
+        await utils.record_user_joined(db)
 
         await message.answer(
             "🔍 <b>Найти собеседника:</b>\n\n"
@@ -142,7 +137,7 @@ async def find_partner_menu(message: Message) -> None:
         return
 
     if user.partner_id:
-        partner = db.query(User).filter(User.id == user.partner_id).first()
+        partner = await db.get(User, user.partner_id)
         if partner:
             partner_name: str = partner.full_name or "Собеседник"
             partner_username: str = f"@{partner.username}" if partner.username else ""
@@ -150,7 +145,7 @@ async def find_partner_menu(message: Message) -> None:
         else:
             await message.answer("✅ У вас уже есть собеседник!")
 
-        await show_main_menu(message)
+        await show_main_menu(message, db)
         return
 
     await message.answer(
@@ -171,9 +166,8 @@ async def find_partner_menu(message: Message) -> None:
 
 
 @router.callback_query(F.data == "back_to_menu")
-async def back_to_menu_callback(callback: CallbackQuery) -> None:
+async def back_to_menu_callback(callback: CallbackQuery, db: AsyncSession) -> None:
     """Возврат в главное меню из inline-кнопки"""
-    db = next(get_db())
-    utils.update_user_activity(db, callback.from_user.id)
-    await show_main_menu(callback.message)
+    utils.update_user_activity(callback.from_user.id)
+    await show_main_menu(callback.message, db)
     await callback.answer()
\ No newline at end of file
@@ -3,27 +3,23 @@ from aiogram.types import Message, CallbackQuery, InlineKeyboardButton, \
     InlineKeyboardMarkup
 from aiogram.filters import Command
 from aiogram.fsm.state import State, StatesGroup
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 import keyboards as kb
-from database import get_db
 import onesignal_api
 import logging
+import utils
 
 router = Router()
 logger = logging.getLogger(__name__)
 
-
 class OneSignalStates(StatesGroup):
     waiting_for_task_selection = State()
 
 
 @router.message(F.text == "🌐 Web Notifications")
-async def onesignal_main_menu(message: Message) -> None:
+async def onesignal_main_menu(message: Message, db: AsyncSession) -> None:
     """Главное меню OneSignal уведомлений"""
-    db: Session = next(get_db())
-    from database import User
-
-    user = db.query(User).filter(User.telegram_id == message.from_user.id).first()
+    user, _ = await utils.get_user_with_partner(db, message.from_user.id)
 
     if not user or not user.partner_id:
         await message.answer(
@@ -33,7 +29,7 @@ async def onesignal_main_menu(message: Message) -> None:
         return
 
     # Проверяем конфигурацию OneSignal
-    if not onesignal_api.onesignal_api.is_configured:
+    if not onesignal_api.onesignal_client.is_configured:
         await message.answer(
             "🌐 <b>Web Notifications (Отключено)</b>\n\n"
             "Настройте OneSignal для отправки уведомлений!\n\n"
@@ -46,7 +42,7 @@ async def onesignal_main_menu(message: Message) -> None:
         return
 
     # Тестируем подключение
-    connection_test = onesignal_api.onesignal_api.test_connection()
+    connection_test = await onesignal_api.onesignal_client.test_connection()
 
     if not connection_test['success']:
         await message.answer(
@@ -61,7 +57,7 @@ async def onesignal_main_menu(message: Message) -> None:
         return
 
     # Получаем статистику
-    stats = onesignal_api.onesignal_api.get_app_stats()
+    stats = await onesignal_api.onesignal_client.get_app_stats()
 
     stats_text = ""
     if stats['success']:
@@ -79,8 +75,9 @@ async def onesignal_main_menu(message: Message) -> None:
         f"• 🔔 Тестовое уведомление\n"
         f"• 📝 Напомнить о задаче (Web)\n"
         f"• ⚙️ Настройки и статус\n"
-        f"• 📊 Статистика\n\n"
-        f"Уведомления отправляются на все устройства с подпиской.",
+        f"• 📊 Статистика\n"
+        f"• 🔗 Привязка устройства\n\n"
+        f"Уведомления о задачах получает только исполнитель на привязанных устройствах.",
         parse_mode="HTML",
         reply_markup=kb.get_onesignal_menu_keyboard()
     )
@@ -91,7 +88,7 @@ async def send_test_onesignal(message: Message) -> None:
     """Отправить тестовое уведомление через OneSignal"""
     await message.answer("🌐 Отправляю тестовое уведомление через OneSignal...")
 
-    result = onesignal_api.onesignal_api.send_notification(
+    result = await onesignal_api.onesignal_client.send_notification(
         contents={"ru": "✅ OneSignal API работает! Тест от TaskBuddy Bot."},
         headings={"ru": "🎉 OneSignal подключен"},
         included_segments=["All"],
@@ -116,22 +113,17 @@ async def send_test_onesignal(message: Message) -> None:
 
 
 @router.message(F.text == "📝 Web напоминание")
-async def send_web_reminder_menu(message: Message) -> None:
+async def send_web_reminder_menu(message: Message, db: AsyncSession) -> None:
     """Меню для отправки web-напоминаний о задачах"""
-    db: Session = next(get_db())
-    from database import User, Task
-
-    user = db.query(User).filter(User.telegram_id == message.from_user.id).first()
+    user, _ = await utils.get_user_with_partner(db, message.from_user.id)
 
     if not user or not user.partner_id:
         await message.answer("❌ Сначала пригласите собеседника!")
         return
 
     # Получаем активные задачи пользователя
-    tasks = db.query(Task).filter(
-        Task.assigned_by_id == user.id,
-        Task.completed == False
-    ).all()
+    tasks, _, _ = await utils.get_active_task_page(db, assigned_by_id=user.id, limit=5)
+    tasks_count = await utils.count_active_tasks(db, assigned_by_id=user.id)
 
     if not tasks:
         await message.answer("📭 У вас нет активных задач для напоминания")
@@ -140,7 +132,7 @@ async def send_web_reminder_menu(message: Message) -> None:
     # Создаем клавиатуру с задачами
     keyboard = InlineKeyboardMarkup(inline_keyboard=[])
 
-    for task in tasks[:5]:  # Ограничиваем 5 задачами
+    for task in tasks:  # Ограничиваем 5 задачами
         keyboard.inline_keyboard.append([
             InlineKeyboardButton(
                 text=f"📌 {task.title[:20]}...",
@@ -154,35 +146,42 @@ async def send_web_reminder_menu(message: Message) -> None:
 
     await message.answer(
         f"🌐 <b>Выберите задачу для Web-напоминания</b>\n\n"
-        f"📋 Найдено задач: {len(tasks)}\n\n"
+        f"📋 Найдено задач: {tasks_count}\n\n"
         f"⚠️ <b>Внимание:</b>\n"
-        f"Web-напоминания отправятся всем подписчикам OneSignal.",
+        f"Web-напоминание получит только исполнитель, привязавший устройство (/onesignal_link).",
         parse_mode="HTML",
         reply_markup=keyboard
     )
 
 
 @router.callback_query(F.data.startswith("onesignal_task:"))
-async def send_onesignal_task_reminder(callback: CallbackQuery) -> None:
+async def send_onesignal_task_reminder(callback: CallbackQuery, db: AsyncSession) -> None:
     """Отправить OneSignal напоминание о задаче"""
     task_id = int(callback.data.split(":")[1])
 
-    db: Session = next(get_db())
-    from database import Task, User
-
-    task = db.query(Task).filter(Task.id == task_id).first()
+    task = await utils.get_task_model(db, task_id)
 
     if not task:
         await callback.message.answer("❌ Задача не найдена")
         await callback.answer()
         return
 
-    user = db.query(User).filter(User.id == task.assigned_by_id).first()
+    user = await utils.get_user_model_by_id(db, task.assigned_by_id)
+    assignee = await utils.get_user_model_by_id(db, task.assigned_to_id)
+
+    if not assignee or not assignee.onesignal_external_id:
+        await callback.message.answer(
+            "❌ Исполнитель не привязал устройство к Web-уведомлениям.\n"
+            "Попросите его выполнить /onesignal_link"
+        )
+        await callback.answer()
+        return
 
     await callback.message.answer(f"🌐 Отправляю Web-напоминание о задаче: {task.title}")
 
-    # Отправляем через OneSignal
-    result = onesignal_api.onesignal_api.send_task_notification(
+    # Отправляем через OneSignal только исполнителю
+    result = await onesignal_api.onesignal_client.send_task_notification(
+        external_id=assignee.onesignal_external_id,
         task_title=task.title,
         from_user=user.full_name if user else "Неизвестный",
         task_description=task.description,
@@ -195,7 +194,7 @@ async def send_onesignal_task_reminder(callback: CallbackQuery) -> None:
             f"📌 Задача: {task.title}\n"
             f"🌐 Сервис: OneSignal\n"
             f"📨 Статус: Успешно отправлено\n\n"
-            f"<i>Уведомление отправлено всем подписчикам</i>",
+            f"<i>Уведомление отправлено исполнителю</i>",
             parse_mode="HTML"
         )
     else:
@@ -218,14 +217,14 @@ async def cancel_onesignal(callback: CallbackQuery) -> None:
 @router.message(F.text == "📊 Статистика API")
 async def show_api_stats(message: Message) -> None:
     """Показать статистику OneSignal API"""
-    if not onesignal_api.onesignal_api.is_configured:
+    if not onesignal_api.onesignal_client.is_configured:
         await message.answer("❌ OneSignal не настроен")
         return
 
     await message.answer("📊 Запрашиваю статистику OneSignal...")
 
     # Получаем статистику приложения
-    stats = onesignal_api.onesignal_api.get_app_stats()
+    stats = await onesignal_api.onesignal_client.get_app_stats()
 
     if stats['success']:
         stats_text = (
@@ -248,24 +247,31 @@ async def show_api_stats(message: Message) -> None:
 
 
 @router.message(F.text == "⚙️ Настройки")
-async def onesignal_settings(message: Message) -> None:
+async def onesignal_settings(message: Message, db: AsyncSession) -> None:
     """Настройки OneSignal"""
-    if not onesignal_api.onesignal_api.is_configured:
+    if not onesignal_api.onesignal_client.is_configured:
         config_status = "❌ Не настроено"
         config_details = "Добавьте ключи в .env файл"
     else:
         config_status = "✅ Настроено"
-        config_details = f"App ID: {onesignal_api.onesignal_api.app_id[:8]}..."
+        config_details = f"App ID: {onesignal_api.onesignal_client.app_id[:8]}..."
+
+    user, _ = await utils.get_user_with_partner(db, message.from_user.id)
+    if user and user.onesignal_external_id:
+        link_status = f"✅ <code>{user.onesignal_external_id}</code>"
+    else:
+        link_status = "❌ Не привязано (/onesignal_link)"
 
     await message.answer(
         f"⚙️ <b>Настройки OneSignal</b>\n\n"
         f"🔧 <b>Статус:</b> {config_status}\n"
-        f"📝 <b>Детали:</b> {config_details}\n\n"
+        f"📝 <b>Детали:</b> {config_details}\n"
+        f"🔗 <b>Ваше устройство:</b> {link_status}\n\n"
         f"📌 <b>Ключи API:</b>\n"
         f"• ONESIGNAL_APP_ID\n"
         f"• ONESIGNAL_API_KEY\n\n"
         f"🌐 <b>Dashboard:</b>\n"
-        f"https://onesignal.com/apps/{onesignal_api.onesignal_api.app_id}\n\n"
+        f"https://onesignal.com/apps/{onesignal_api.onesignal_client.app_id}\n\n"
         f"📚 <b>Документация:</b>\n"
         f"https://documentation.onesignal.com/",
         parse_mode="HTML",
@@ -273,6 +279,50 @@ async def onesignal_settings(message: Message) -> None:
     )
 
 
+@router.message(Command("onesignal_link"))
+@router.message(F.text == "🔗 Привязать устройство")
+async def onesignal_link(message: Message, db: AsyncSession) -> None:
+    """
+    Привязка устройств пользователя к OneSignal
+    Показывает текущий external ID или создает новый. Принимаются только ID,
+    выданные ботом: произвольный ID позволил бы получать чужие уведомления
+    """
+    user, partner = await utils.get_user_with_partner(db, message.from_user.id)
+    if not user:
+        await message.answer("❌ Сначала выполните /start")
+        return
+
+    external_id = user.onesignal_external_id or utils.generate_onesignal_external_id()
+
+    if external_id != user.onesignal_external_id:
+        if not await utils.set_onesignal_external_id(db, user, partner, external_id):
+            await message.answer("❌ Не удалось создать external ID, повторите /onesignal_link")
+            return
+        logger.info(f"🔗 Пользователь {user.telegram_id} привязан к OneSignal")
+
+    await message.answer(
+        f"🔗 <b>Привязка Web-уведомлений</b>\n\n"
+        f"Ваш external ID: <code>{external_id}</code>\n\n"
+        f"На сайте с подпиской OneSignal войдите с этим ID "
+        f"(<code>OneSignal.login(\"{external_id}\")</code>). "
+        f"После этого уведомления о ваших задачах приходят только на ваши устройства.\n\n"
+        f"/onesignal_unlink - отвязать устройства",
+        parse_mode="HTML"
+    )
+
+
+@router.message(Command("onesignal_unlink"))
+async def onesignal_unlink(message: Message, db: AsyncSession) -> None:
+    """Отвязка устройств пользователя от OneSignal"""
+    user, partner = await utils.get_user_with_partner(db, message.from_user.id)
+    if not user or not user.onesignal_external_id:
+        await message.answer("ℹ️ Устройства не привязаны к Web-уведомлениям")
+        return
+
+    await utils.set_onesignal_external_id(db, user, partner, None)
+    await message.answer("✅ Web-уведомления о задачах больше не будут приходить на ваши устройства")
+
+
 @router.message(Command("onesignal_test"))
 async def onesignal_test_command(message: Message) -> None:
     """Команда для быстрого теста OneSignal"""
@@ -296,7 +346,7 @@ async def send_notification_command(message: Message) -> None:
 
     await message.answer(f"🌐 Отправляю OneSignal уведомление: {title}")
 
-    result = onesignal_api.onesignal_api.send_notification(
+    result = await onesignal_api.onesignal_client.send_notification(
         contents={"ru": notification_message},
         headings={"ru": title},
         included_segments=["All"]
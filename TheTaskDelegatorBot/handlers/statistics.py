@@ -1,23 +1,25 @@
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
-from database import get_db
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
 import keyboards as kb
 import utils
 from datetime import datetime, timedelta
+from typing import Optional
+from models import UserStatsModel
 
 router = Router()
 
 
 @router.message(F.text == "📊 Статистика")
-async def get_user_statistics(message: Message) -> None:
+async def get_user_statistics(message: Message, read_db: AsyncSession) -> None:
     """Отображает статистику пользователя"""
-    db = next(get_db())
-    from database import User, Task
+    from database import Task
 
     # Обновляем активность пользователя
-    utils.update_user_activity(db, message.from_user.id)
+    utils.update_user_activity(message.from_user.id)
 
-    user = db.query(User).filter(User.telegram_id == message.from_user.id).first()
+    user = await utils.get_user_model(read_db, message.from_user.id, UserStatsModel)
 
     if not user:
         await message.answer("❌ Пользователь не найден")
@@ -25,10 +27,10 @@ async def get_user_statistics(message: Message) -> None:
 
     if not user.partner_id:
         # Показываем общую статистику если нет партнера
-        await show_general_stats(message, db, user)
+        await show_general_stats(message, read_db, user)
         return
 
-    partner = db.query(User).filter(User.id == user.partner_id).first()
+    partner = await utils.get_user_model_by_id(read_db, user.partner_id, UserStatsModel)
     if not partner:
         await message.answer("❌ Ошибка: собеседник не найден")
         return
@@ -51,10 +53,10 @@ async def get_user_statistics(message: Message) -> None:
     partner_received: int = getattr(partner, 'tasks_received_count', 0)
     partner_deleted: int = getattr(partner, 'tasks_deleted_count', 0)
 
-    pending_tasks: int = db.query(Task).filter(
+    pending_tasks: int = await read_db.scalar(select(func.count()).select_from(Task).where(
         Task.assigned_to_id == user.id,
         Task.completed == False
-    ).count()
+    ))
 
     completion_rate: float = 0
     if user_received > 0:
@@ -108,10 +110,11 @@ async def get_user_statistics(message: Message) -> None:
     await message.answer(stats_text, parse_mode="HTML", reply_markup=keyboard)
 
 
-async def show_general_stats(message: Message, db, user=None) -> None:
+async def show_general_stats(message: Message, read_db: AsyncSession,
+                             user: Optional[UserStatsModel] = None) -> None:
     """Показать общую статистику приложения"""
     # Получаем сводную статистику
-    app_stats = utils.get_app_stats_summary(db)
+    app_stats = await utils.get_app_stats_summary(read_db)
 
     stats_text = f"📊 <b>ОБЩАЯ СТАТИСТИКА ПРИЛОЖЕНИЯ</b>\n\n"
 
@@ -129,6 +132,12 @@ async def show_general_stats(message: Message, db, user=None) -> None:
     stats_text += f"• Активных: <b>{app_stats['active_tasks']}</b>\n"
     stats_text += f"• Процент выполнения: <b>{app_stats['completion_rate']:.1f}%</b>\n\n"
 
+    # Дневные агрегаты
+    stats_text += f"📆 <b>СЕГОДНЯ:</b>\n"
+    stats_text += f"• Активных пользователей: <b>{app_stats['today_active_users']}</b>\n"
+    stats_text += f"• Создано задач: <b>{app_stats['today_tasks_created']}</b>\n"
+    stats_text += f"• Выполнено задач: <b>{app_stats['today_tasks_completed']}</b>\n\n"
+
     # Статистика API
     stats_text += f"🌐 <b>ВНЕШНИЕ API:</b>\n"
     stats_text += f"• OneSignal уведомлений: <b>{app_stats['onesignal_notifications_total']}</b>\n\n"
@@ -163,37 +172,30 @@ async def show_general_stats(message: Message, db, user=None) -> None:
 
 
 @router.callback_query(F.data == "show_general_stats")
-async def show_general_stats_callback(callback: CallbackQuery) -> None:
+async def show_general_stats_callback(callback: CallbackQuery, read_db: AsyncSession) -> None:
     """Показать общую статистику по callback"""
-    db = next(get_db())
-    from database import User
-
-    user = db.query(User).filter(User.telegram_id == callback.from_user.id).first()
-    await show_general_stats(callback.message, db, user)
+    user = await utils.get_user_model(read_db, callback.from_user.id, UserStatsModel)
+    await show_general_stats(callback.message, read_db, user)
     await callback.answer()
 
 
 @router.callback_query(F.data == "show_my_stats")
-async def show_my_stats_callback(callback: CallbackQuery) -> None:
+async def show_my_stats_callback(callback: CallbackQuery, read_db: AsyncSession) -> None:
     """Показать мою статистику по callback"""
-    await get_user_statistics(callback.message)
+    await get_user_statistics(callback.message, read_db)
     await callback.answer()
 
 
 @router.callback_query(F.data == "refresh_stats")
-async def refresh_stats_callback(callback: CallbackQuery) -> None:
+async def refresh_stats_callback(callback: CallbackQuery, read_db: AsyncSession) -> None:
     """Обновить статистику"""
-    await get_user_statistics(callback.message)
+    await get_user_statistics(callback.message, read_db)
     await callback.answer("✅ Статистика обновлена")
 
 
 @router.callback_query(F.data == "refresh_general_stats")
-async def refresh_general_stats_callback(callback: CallbackQuery) -> None:
+async def refresh_general_stats_callback(callback: CallbackQuery, read_db: AsyncSession) -> None:
     """Обновить общую статистику"""
-    db = next(get_db())
-    from database import User
-
-    utils.update_app_stats(db)  # Принудительно обновляем статистику
-    user = db.query(User).filter(User.telegram_id == callback.from_user.id).first()
-    await show_general_stats(callback.message, db, user)
+    user = await utils.get_user_model(read_db, callback.from_user.id, UserStatsModel)
+    await show_general_stats(callback.message, read_db, user)
     await callback.answer("✅ Статистика обновлена")
\ No newline at end of file
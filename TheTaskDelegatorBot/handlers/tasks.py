@@ -2,12 +2,14 @@ from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, ReplyKeyboardMarkup, KeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 import keyboards as kb
-from database import get_db
 from datetime import datetime
 import logging
 import utils
+from models import TaskModel
+import outbox
+import onesignal_api
 
 router = Router()
 logger = logging.getLogger(__name__)
@@ -18,33 +20,13 @@ class TaskStates(StatesGroup):
     waiting_for_description = State()
 
 
-async def send_notification(user_id: int, text: str) -> bool:
-    """Отправляет уведомление пользователю"""
-    try:
-        from aiogram import Bot
-        import config
-
-        bot = Bot(token=config.config.BOT_TOKEN)
-        await bot.send_message(user_id, text, parse_mode="HTML")
-        await bot.session.close()
-
-        logger.info(f"✅ Telegram уведомление отправлено пользователю {user_id}")
-        return True
-    except Exception as e:
-        logger.error(f"❌ Ошибка отправки Telegram уведомления пользователю {user_id}: {e}")
-        return False
-
-
 @router.message(F.text == "📝 Создать задание")
-async def create_task_start(message: Message, state: FSMContext) -> None:
+async def create_task_start(message: Message, state: FSMContext, db: AsyncSession) -> None:
     """Начать создание задачи"""
-    db: Session = next(get_db())
-    from database import User
-
     # Обновляем активность
-    utils.update_user_activity(db, message.from_user.id)
+    utils.update_user_activity(message.from_user.id)
 
-    user = db.query(User).filter(User.telegram_id == message.from_user.id).first()
+    user, _ = await utils.get_user_with_partner(db, message.from_user.id)
 
     if not user or not user.partner_id:
         await message.answer(
@@ -91,7 +73,7 @@ async def process_task_title(message: Message, state: FSMContext) -> None:
 
 
 @router.message(TaskStates.waiting_for_description)
-async def process_task_description(message: Message, state: FSMContext) -> None:
+async def process_task_description(message: Message, state: FSMContext, db: AsyncSession) -> None:
     """Обработать описание задачи"""
     if message.text == "❌ Отмена":
         await state.clear()
@@ -104,16 +86,14 @@ async def process_task_description(message: Message, state: FSMContext) -> None:
     data: dict = await state.get_data()
     description: str | None = None if message.text == "⏭️ Пропустить" else message.text
 
-    db: Session = next(get_db())
-    from database import User, Task
+    from database import Task
 
     # Обновляем активность
-    utils.update_user_activity(db, message.from_user.id)
+    utils.update_user_activity(message.from_user.id)
 
-    user = db.query(User).filter(User.telegram_id == message.from_user.id).first()
-    partner = db.query(User).filter(User.id == user.partner_id).first()
+    user, partner = await utils.get_user_with_partner(db, message.from_user.id)
 
-    if not partner:
+    if not user or not partner:
         await message.answer("❌ Ошибка: собеседник не найден")
         await state.clear()
         return
@@ -129,17 +109,16 @@ async def process_task_description(message: Message, state: FSMContext) -> None:
 
     db.add(task)
 
-    try:
-        user.tasks_created_count += 1
-        partner.tasks_received_count += 1
-    except:
-        pass
+    await utils.increment_user_counters_each(db, {
+        user.id: {"tasks_created_count": 1},
+        partner.id: {"tasks_received_count": 1},
+    })
 
-    db.commit()
+    await db.flush()
     await state.clear()
 
     # Обновляем общую статистику
-    utils.update_app_stats(db)
+    await utils.record_task_created(db)
 
     user_name: str = message.from_user.full_name or f"@{message.from_user.username}" if message.from_user.username else "Собеседник"
 
@@ -155,30 +134,22 @@ async def process_task_description(message: Message, state: FSMContext) -> None:
     notification_text += f"\n⏰ {datetime.utcnow().strftime('%d.%m.%Y %H:%M')}"
 
     # Отправляем уведомление собеседнику в Telegram
-    await send_notification(partner.telegram_id, notification_text)
-
-    # 🎯 ОТПРАВЛЯЕМ УВЕДОМЛЕНИЕ ЧЕРЕЗ ONESIGNAL API
-    try:
-        import onesignal_api
-        if onesignal_api.onesignal_api.is_configured:
-            onesignal_result = onesignal_api.onesignal_api.send_task_notification(
-                task_title=data['title'],
-                from_user=user_name,
-                task_description=description,
-                task_id=task.id,
-                priority_level="normal"
-            )
-
-            if onesignal_result['success']:
-                logger.info("✅ OneSignal уведомление отправлено успешно")
-                # Увеличиваем счетчик OneSignal статистики
-                utils.increment_onesignal_stats(db, message.from_user.id, sent=True)
-            else:
-                logger.warning(f"⚠️ OneSignal уведомление не отправлено: {onesignal_result.get('error')}")
-    except ImportError:
-        logger.warning("OneSignal API не установлен")
-    except Exception as e:
-        logger.error(f"Ошибка отправки OneSignal уведомления: {e}")
+    await outbox.add_notification(db, partner.telegram_id, notification_text)
+
+    # 🎯 УВЕДОМЛЕНИЕ ЧЕРЕЗ ONESIGNAL API: запрос уходит после коммита апдейта,
+    # счетчик отправителя увеличивается только при успешной отправке
+    # Web-уведомление получает только исполнитель, привязавший устройство
+    if onesignal_api.onesignal_client.is_configured and partner.onesignal_external_id:
+        onesignal_api.send_task_notification_after_commit(
+            db,
+            sender_id=message.from_user.id,
+            external_id=partner.onesignal_external_id,
+            task_title=data['title'],
+            from_user=user_name,
+            task_description=description,
+            task_id=task.id,
+            priority_level="normal"
+        )
 
     creation_message: str = f"✅ Задача <b>'{data['title']}'</b> создана и отправлена собеседнику!"
     if description:
@@ -192,7 +163,7 @@ async def process_task_description(message: Message, state: FSMContext) -> None:
         reply_markup=kb.get_main_menu_keyboard(has_partner=True)
     )
 @router.message(TaskStates.waiting_for_description)
-async def process_task_description(message: Message, state: FSMContext) -> None:
+async def process_task_description(message: Message, state: FSMContext, db: AsyncSession) -> None:
     """Обработать описание задачи"""
     if message.text == "❌ Отмена":
         await state.clear()
@@ -205,13 +176,11 @@ async def process_task_description(message: Message, state: FSMContext) -> None:
     data: dict = await state.get_data()
     description: str | None = None if message.text == "⏭️ Пропустить" else message.text
 
-    db: Session = next(get_db())
-    from database import User, Task
+    from database import Task
 
-    user = db.query(User).filter(User.telegram_id == message.from_user.id).first()
-    partner = db.query(User).filter(User.id == user.partner_id).first()
+    user, partner = await utils.get_user_with_partner(db, message.from_user.id)
 
-    if not partner:
+    if not user or not partner:
         await message.answer("❌ Ошибка: собеседник не найден")
         await state.clear()
         return
@@ -227,15 +196,16 @@ async def process_task_description(message: Message, state: FSMContext) -> None:
 
     db.add(task)
 
-    try:
-        user.tasks_created_count += 1
-        partner.tasks_received_count += 1
-    except:
-        pass
+    await utils.increment_user_counters_each(db, {
+        user.id: {"tasks_created_count": 1},
+        partner.id: {"tasks_received_count": 1},
+    })
 
-    db.commit()
+    await db.flush()
     await state.clear()
 
+    await utils.record_task_created(db)
+
     user_name: str = message.from_user.full_name or f"@{message.from_user.username}" if message.from_user.username else "Собеседник"
 
     notification_text: str = (
@@ -250,27 +220,19 @@ async def process_task_description(message: Message, state: FSMContext) -> None:
     notification_text += f"\n⏰ {datetime.utcnow().strftime('%d.%m.%Y %H:%M')}"
 
     # Отправляем уведомление собеседнику в Telegram
-    await send_notification(partner.telegram_id, notification_text)
-
-    # 🎯 ОТПРАВЛЯЕМ УВЕДОМЛЕНИЕ ЧЕРЕЗ ONESIGNAL API
-    try:
-        import onesignal_api
-        if onesignal_api.onesignal_api.is_configured:
-            onesignal_result = onesignal_api.onesignal_api.send_task_notification(
-                task_title=data['title'],
-                from_user=user_name,
-                task_description=description,
-                task_id=task.id
-            )
-
-            if onesignal_result['success']:
-                logger.info(f"OneSignal уведомление отправлено для задачи {task.id}")
-            else:
-                logger.warning(f"OneSignal уведомление не отправлено: {onesignal_result.get('error')}")
-    except ImportError:
-        logger.warning("OneSignal API не установлен")
-    except Exception as e:
-        logger.error(f"Ошибка отправки OneSignal уведомления: {e}")
+    await outbox.add_notification(db, partner.telegram_id, notification_text)
+
+    # 🎯 УВЕДОМЛЕНИЕ ЧЕРЕЗ ONESIGNAL API: запрос уходит после коммита апдейта
+    # Web-уведомление получает только исполнитель, привязавший устройство
+    if onesignal_api.onesignal_client.is_configured and partner.onesignal_external_id:
+        onesignal_api.send_task_notification_after_commit(
+            db,
+            external_id=partner.onesignal_external_id,
+            task_title=data['title'],
+            from_user=user_name,
+            task_description=description,
+            task_id=task.id
+        )
 
     creation_message: str = f"✅ Задача <b>'{data['title']}'</b> создана и отправлена собеседнику!"
     if description:
@@ -286,12 +248,9 @@ async def process_task_description(message: Message, state: FSMContext) -> None:
 
 
 @router.message(F.text == "🗑️ Удалить задачу")
-async def delete_task_menu(message: Message) -> None:
+async def delete_task_menu(message: Message, db: AsyncSession) -> None:
     """Показать меню удаления задач"""
-    db: Session = next(get_db())
-    from database import User, Task
-
-    user = db.query(User).filter(User.telegram_id == message.from_user.id).first()
+    user, _ = await utils.get_user_with_partner(db, message.from_user.id)
 
     if not user or not user.partner_id:
         await message.answer(
@@ -300,11 +259,8 @@ async def delete_task_menu(message: Message) -> None:
         )
         return
 
-    # ПОКАЗЫВАЕМ ТОЛЬКО НЕВЫПОЛНЕННЫЕ ЗАДАЧИ
-    tasks: list[Task] = db.query(Task).filter(
-        Task.assigned_by_id == user.id,
-        Task.completed == False
-    ).all()
+    # ПОКАЗЫВАЕМ ТОЛЬКО НЕВЫПОЛНЕННЫЕ ЗАДАЧИ, ПЕРВУЮ СТРАНИЦУ
+    tasks, prev_cursor, next_cursor = await utils.get_active_task_page(db, assigned_by_id=user.id)
 
     if not tasks:
         await message.answer("📭 У вас нет активных задач для удаления")
@@ -312,38 +268,59 @@ async def delete_task_menu(message: Message) -> None:
 
     await message.answer(
         "🗑️ Выберите задачу для удаления:",
-        reply_markup=kb.get_tasks_keyboard(tasks, "delete_task")
+        reply_markup=kb.get_tasks_keyboard(tasks, "delete_task", prev_cursor=prev_cursor, next_cursor=next_cursor)
     )
 
 
-@router.callback_query(F.data.startswith("delete_task:"))
-async def delete_task_callback(callback: CallbackQuery) -> None:
-    """Удалить задачу"""
-    task_id: int = int(callback.data.split(":")[1])
+async def show_task_selection_page(callback: CallbackQuery, db: AsyncSession, action: str,
+                                   empty_text: str, by_creator: bool) -> None:
+    """Листает клавиатуру выбора задач по курсору из callback_data"""
+    user, _ = await utils.get_user_with_partner(db, callback.from_user.id)
+
+    if not user:
+        await callback.answer("❌ Пользователь не найден")
+        return
 
-    db: Session = next(get_db())
-    from database import Task, User
+    _, direction, cursor = callback.data.split(":")
+    owner = {"assigned_by_id": user.id} if by_creator else {"assigned_to_id": user.id}
+    tasks, prev_cursor, next_cursor = await utils.get_active_task_page(
+        db, cursor=cursor, backward=direction == "p", **owner
+    )
 
-    task = db.query(Task).filter(Task.id == task_id).first()
+    # Задачи страницы могли быть выполнены или удалены - начинаем сначала
+    if not tasks:
+        tasks, prev_cursor, next_cursor = await utils.get_active_task_page(db, **owner)
 
-    if task:
-        task_title: str = task.title
+    if tasks:
+        await callback.message.edit_reply_markup(
+            reply_markup=kb.get_tasks_keyboard(tasks, action, prev_cursor=prev_cursor, next_cursor=next_cursor)
+        )
+    else:
+        await callback.message.edit_text(empty_text)
 
-        partner = db.query(User).filter(User.id == task.assigned_to_id).first()
+    await callback.answer()
 
-        db.delete(task)
 
-        try:
-            creator = db.query(User).filter(User.id == task.assigned_by_id).first()
-            if creator:
-                creator.tasks_deleted_count += 1
-        except:
-            pass
+@router.callback_query(F.data.startswith("delete_task_page:"))
+async def delete_task_page(callback: CallbackQuery, db: AsyncSession) -> None:
+    """Страница меню удаления задач"""
+    await show_task_selection_page(callback, db, "delete_task",
+                                   "📭 У вас нет активных задач для удаления", by_creator=True)
 
-        db.commit()
+
+@router.callback_query(F.data.startswith("delete_task:"))
+async def delete_task_callback(callback: CallbackQuery, db: AsyncSession) -> None:
+    """Удалить задачу"""
+    task_id: int = int(callback.data.split(":")[1])
+
+    # Удаление и счетчики одной транзакцией, повторное нажатие ничего не найдет
+    task = await utils.delete_task(db, task_id)
+
+    if task:
+        task_title: str = task.title
 
         # Уведомляем собеседника об удалении задачи
-        if partner:
+        if task.partner_telegram_id:
             user_name: str = callback.from_user.full_name or f"@{callback.from_user.username}" if callback.from_user.username else "Собеседник"
 
             delete_notification: str = (
@@ -352,7 +329,7 @@ async def delete_task_callback(callback: CallbackQuery) -> None:
                 f"📌 {task_title}"
             )
 
-            await send_notification(partner.telegram_id, delete_notification)
+            await outbox.add_notification(db, task.partner_telegram_id, delete_notification)
 
         await callback.message.answer(
             f"🗑️ Задача <b>'{task_title}'</b> удалена!",
@@ -371,12 +348,9 @@ async def delete_task_callback(callback: CallbackQuery) -> None:
 
 
 @router.message(F.text == "✅ Выполнил задачу")
-async def complete_task_menu(message: Message) -> None:
+async def complete_task_menu(message: Message, db: AsyncSession) -> None:
     """Показать меню выполнения задач"""
-    db: Session = next(get_db())
-    from database import User, Task
-
-    user = db.query(User).filter(User.telegram_id == message.from_user.id).first()
+    user, _ = await utils.get_user_with_partner(db, message.from_user.id)
 
     if not user or not user.partner_id:
         await message.answer(
@@ -385,10 +359,7 @@ async def complete_task_menu(message: Message) -> None:
         )
         return
 
-    tasks: list[Task] = db.query(Task).filter(
-        Task.assigned_to_id == user.id,
-        Task.completed == False
-    ).all()
+    tasks, prev_cursor, next_cursor = await utils.get_active_task_page(db, assigned_to_id=user.id)
 
     if not tasks:
         await message.answer("📭 У вас нет задач для выполнения")
@@ -396,38 +367,30 @@ async def complete_task_menu(message: Message) -> None:
 
     await message.answer(
         "✅ Выберите выполненную задачу:",
-        reply_markup=kb.get_tasks_keyboard(tasks, "complete_task")
+        reply_markup=kb.get_tasks_keyboard(tasks, "complete_task", prev_cursor=prev_cursor, next_cursor=next_cursor)
     )
 
 
+@router.callback_query(F.data.startswith("complete_task_page:"))
+async def complete_task_page(callback: CallbackQuery, db: AsyncSession) -> None:
+    """Страница меню выполнения задач"""
+    await show_task_selection_page(callback, db, "complete_task",
+                                   "📭 У вас нет задач для выполнения", by_creator=False)
+
+
 @router.callback_query(F.data.startswith("complete_task:"))
-async def complete_task_callback(callback: CallbackQuery) -> None:
+async def complete_task_callback(callback: CallbackQuery, db: AsyncSession) -> None:
     """Отметить задачу как выполненную"""
     task_id: int = int(callback.data.split(":")[1])
 
-    db: Session = next(get_db())
-    from database import Task, User
-
-    task = db.query(Task).filter(Task.id == task_id).first()
+    # Условный UPDATE: уже выполненная задача не учитывается второй раз
+    task = await utils.complete_task(db, task_id)
 
     if task:
         task_title: str = task.title
-        task.completed = True
-        task.completed_at = datetime.utcnow()
-
-        creator = db.query(User).filter(User.id == task.assigned_by_id).first()
-
-        try:
-            executor = db.query(User).filter(User.id == task.assigned_to_id).first()
-            if executor:
-                executor.tasks_completed_count += 1
-        except:
-            pass
-
-        db.commit()
 
         # Уведомляем создателя задачи о выполнении
-        if creator:
+        if task.creator_telegram_id:
             user_name: str = callback.from_user.full_name or f"@{callback.from_user.username}" if callback.from_user.username else "Собеседник"
 
             completion_notification: str = (
@@ -437,7 +400,7 @@ async def complete_task_callback(callback: CallbackQuery) -> None:
                 f"⏰ Время: {task.completed_at.strftime('%d.%m.%Y %H:%M')}"
             )
 
-            await send_notification(creator.telegram_id, completion_notification)
+            await outbox.add_notification(db, task.creator_telegram_id, completion_notification)
 
         await callback.message.answer(
             f"✅ Задача <b>'{task_title}'</b> выполнена!\n"
@@ -451,18 +414,15 @@ async def complete_task_callback(callback: CallbackQuery) -> None:
             reply_markup=kb.get_main_menu_keyboard(has_partner=True)
         )
     else:
-        await callback.message.answer("❌ Задача не найдена!")
+        await callback.message.answer("❌ Задача не найдена или уже выполнена!")
 
     await callback.answer()
 
 
 @router.message(F.text == "📋 Мои задачи")
-async def view_tasks(message: Message) -> None:
+async def view_tasks(message: Message, db: AsyncSession) -> None:
     """Показать все задачи"""
-    db: Session = next(get_db())
-    from database import User, Task
-
-    user = db.query(User).filter(User.telegram_id == message.from_user.id).first()
+    user, partner = await utils.get_user_with_partner(db, message.from_user.id)
 
     if not user:
         await message.answer("❌ Пользователь не найден")
@@ -477,21 +437,17 @@ async def view_tasks(message: Message) -> None:
 
     # Получаем информацию о собеседнике
     partner_name: str = "нет"
-    if user.partner_id:
-        partner = db.query(User).filter(User.id == user.partner_id).first()
-        if partner:
-            partner_name = partner.full_name or f"@{partner.username}" if partner.username else "Собеседник"
+    if partner:
+        partner_name = partner.full_name or f"@{partner.username}" if partner.username else "Собеседник"
 
-    my_tasks: list[Task] = db.query(Task).filter(
-        Task.assigned_by_id == user.id,
-        Task.completed == False
-    ).all()
+    # Первые страницы обоих списков, остальное листается кнопками
+    my_tasks, _, my_next_cursor = await utils.get_active_task_page(db, assigned_by_id=user.id)
 
     # ЗАДАЧИ КОТОРЫЕ МНЕ НАЗНАЧИЛИ (задачи от собеседника для меня)
-    tasks_for_me: list[Task] = db.query(Task).filter(
-        Task.assigned_to_id == user.id,
-        Task.completed == False
-    ).all()
+    tasks_for_me, _, for_me_next_cursor = await utils.get_active_task_page(db, assigned_to_id=user.id)
+
+    my_tasks_count: int = await utils.count_active_tasks(db, assigned_by_id=user.id)
+    tasks_for_me_count: int = await utils.count_active_tasks(db, assigned_to_id=user.id)
 
     response: str = f"📊 <b>ОБЗОР ЗАДАЧ</b>\n\n"
 
@@ -499,28 +455,69 @@ async def view_tasks(message: Message) -> None:
         response += f"👤 <b>Собеседник:</b> {partner_name}\n\n"
 
     response += f"📤 <b>Мои задачи для {partner_name}:</b>\n"
-    if my_tasks:
-        for i, task in enumerate(my_tasks, 1):
-            response += f"{i}. 📌 <b>{task.title}</b>\n"
-            if task.description:
-                response += f"   📝 {task.description}\n"
-            response += f"   🕐 {task.created_at.strftime('%d.%m.%Y %H:%M')}\n\n"
-    else:
-        response += "📭 Нет задач\n\n"
+    response += format_task_list(my_tasks)
 
     response += f"📥 <b>Задачи от {partner_name} для меня:</b>\n"
-    if tasks_for_me:
-        for i, task in enumerate(tasks_for_me, 1):
-            response += f"{i}. 📌 <b>{task.title}</b>\n"
-            if task.description:
-                response += f"   📝 {task.description}\n"
-            response += f"   🕐 {task.created_at.strftime('%d.%m.%Y %H:%M')}\n\n"
-    else:
-        response += "📭 Нет задач\n\n"
+    response += format_task_list(tasks_for_me)
 
     response += f"📊 <b>Активные задачи:</b>\n"
-    response += f"• Мои задачи: {len(my_tasks)}\n"
-    response += f"• Задачи для меня: {len(tasks_for_me)}\n"
-    response += f"• Всего активных: {len(my_tasks) + len(tasks_for_me)}"
+    response += f"• Мои задачи: {my_tasks_count}\n"
+    response += f"• Задачи для меня: {tasks_for_me_count}\n"
+    response += f"• Всего активных: {my_tasks_count + tasks_for_me_count}"
+
+    await message.answer(
+        response,
+        parse_mode="HTML",
+        reply_markup=kb.get_view_tasks_keyboard(my_next_cursor, for_me_next_cursor)
+    )
+
 
-    await message.answer(response, parse_mode="HTML")
\ No newline at end of file
+def format_task_list(tasks: list[TaskModel]) -> str:
+    """Форматирует страницу задач для обзора"""
+    if not tasks:
+        return "📭 Нет задач\n\n"
+
+    response: str = ""
+    for task in tasks:
+        response += f"📌 <b>{task.title}</b>\n"
+        if task.description:
+            response += f"   📝 {task.description}\n"
+        response += f"   🕐 {task.created_at.strftime('%d.%m.%Y %H:%M')}\n\n"
+    return response
+
+
+@router.callback_query(F.data.startswith("view_tasks_page:"))
+async def view_tasks_page(callback: CallbackQuery, db: AsyncSession) -> None:
+    """Страница одного из списков обзора задач"""
+    user, partner = await utils.get_user_with_partner(db, callback.from_user.id)
+
+    if not user:
+        await callback.answer("❌ Пользователь не найден")
+        return
+
+    partner_name: str = "нет"
+    if partner:
+        partner_name = partner.full_name or f"@{partner.username}" if partner.username else "Собеседник"
+
+    _, kind, direction, cursor = callback.data.split(":")
+    if kind == "by":
+        owner = {"assigned_by_id": user.id}
+        title = f"📤 <b>Мои задачи для {partner_name}:</b>\n"
+    else:
+        owner = {"assigned_to_id": user.id}
+        title = f"📥 <b>Задачи от {partner_name} для меня:</b>\n"
+
+    tasks, prev_cursor, next_cursor = await utils.get_active_task_page(
+        db, cursor=cursor, backward=direction == "p", **owner
+    )
+
+    # Задачи страницы могли быть выполнены или удалены - начинаем сначала
+    if not tasks:
+        tasks, prev_cursor, next_cursor = await utils.get_active_task_page(db, **owner)
+
+    await callback.message.edit_text(
+        title + format_task_list(tasks),
+        parse_mode="HTML",
+        reply_markup=kb.get_pages_keyboard(f"view_tasks_page:{kind}", prev_cursor, next_cursor)
+    )
+    await callback.answer()
\ No newline at end of file
@@ -0,0 +1,106 @@
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, SessionTransaction
+from database import AsyncSessionLocal, Invite
+
+_PENDING_KEY = "invite_registry_changes"
+
+
+class InviteRegistry:
+    """
+    Копия таблицы invites в памяти: код -> (id владельца, срок действия)
+    Введенный код проверяется без обращения к базе. У владельца один
+    действующий код. Изменения применяются после коммита транзакции,
+    в которой код создан или использован
+    """
+
+    def __init__(self):
+        self.loaded = False
+        self._invites: Dict[str, Tuple[int, datetime]] = {}
+        self._codes_by_owner: Dict[int, str] = {}
+
+    async def load(self) -> int:
+        """Загружает действующие коды из базы, возвращает их количество"""
+        async with AsyncSessionLocal() as db:
+            rows = await db.execute(
+                select(Invite.code, Invite.owner_id, Invite.expires_at)
+                .where(Invite.expires_at > datetime.utcnow())
+            )
+            self._invites.clear()
+            self._codes_by_owner.clear()
+            for code, owner_id, expires_at in rows:
+                self.add(code, owner_id, expires_at)
+        self.loaded = True
+        return len(self._invites)
+
+    def get(self, code: str) -> Optional[Tuple[int, datetime]]:
+        """Владелец и срок действия кода или None, если код неизвестен или истек"""
+        entry = self._invites.get(code)
+        if entry is None or entry[1] <= datetime.utcnow():
+            return None
+        return entry
+
+    def is_valid(self, code: str) -> bool:
+        """
+        Проверяет код без запроса к базе
+        До загрузки реестра код считается возможным, решение принимает accept_invite
+        """
+        return not self.loaded or self.get(code) is not None
+
+    def __contains__(self, code: str) -> bool:
+        return code in self._invites
+
+    def add(self, code: str, owner_id: int, expires_at: datetime) -> None:
+        """Сохраняет код, заменяя прежний код владельца"""
+        self.discard_owner(owner_id)
+        self._invites[code] = (owner_id, expires_at)
+        self._codes_by_owner[owner_id] = code
+
+    def discard_owner(self, owner_id: int) -> None:
+        """Удаляет код владельца"""
+        code = self._codes_by_owner.pop(owner_id, None)
+        if code is not None:
+            self._invites.pop(code, None)
+
+    def purge(self, now: datetime) -> int:
+        """Удаляет истекшие коды, возвращает их количество"""
+        expired = [code for code, (_, expires_at) in self._invites.items() if expires_at <= now]
+        for code in expired:
+            owner_id, _ = self._invites.pop(code)
+            self._codes_by_owner.pop(owner_id, None)
+        return len(expired)
+
+
+# Глобальный реестр для использования во всем приложении
+invite_registry = InviteRegistry()
+
+
+def register_invite_after_commit(db: AsyncSession, code: str, owner_id: int, expires_at: datetime) -> None:
+    """Добавит код в реестр после коммита транзакции (прежний код владельца удаляется)"""
+    db.info.setdefault(_PENDING_KEY, []).append((owner_id, (code, expires_at)))
+
+
+def discard_invites_after_commit(db: AsyncSession, owner_id: int) -> None:
+    """Удалит коды владельца из реестра после коммита транзакции"""
+    db.info.setdefault(_PENDING_KEY, []).append((owner_id, None))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_committed(session: Session) -> None:
+    # after_commit вызывается и при освобождении точки сохранения (begin_nested)
+    if session.in_nested_transaction():
+        return
+    for owner_id, invite in session.info.pop(_PENDING_KEY, ()):
+        if invite:
+            invite_registry.add(invite[0], owner_id, invite[1])
+        else:
+            invite_registry.discard_owner(owner_id)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending(session: Session, previous_transaction: SessionTransaction) -> None:
+    # Откат точки сохранения (begin_nested) не отменяет остальную транзакцию
+    if previous_transaction.parent is None:
+        session.info.pop(_PENDING_KEY, None)
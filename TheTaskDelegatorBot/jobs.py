@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List
+from database import AsyncSessionLocal
+from activity import activity_buffer, ACTIVITY_FLUSH_INTERVAL
+from db_stats import log_db_stats
+from maintenance import run_maintenance
+import utils
+
+logger = logging.getLogger(__name__)
+
+# Интервал полной сверки AppStats с таблицами, секунды
+APP_STATS_RECONCILE_INTERVAL: int = int(os.getenv("APP_STATS_RECONCILE_INTERVAL", "3600"))
+
+# Архивация выполненных задач: интервал, возраст задачи и размер пакета
+TASK_ARCHIVE_INTERVAL: int = int(os.getenv("TASK_ARCHIVE_INTERVAL", "600"))
+TASK_ARCHIVE_AFTER_HOURS: int = int(os.getenv("TASK_ARCHIVE_AFTER_HOURS", "24"))
+TASK_ARCHIVE_BATCH: int = int(os.getenv("TASK_ARCHIVE_BATCH", "500"))
+
+# Интервал очистки истекших кодов приглашения, секунды
+INVITE_PURGE_INTERVAL: int = int(os.getenv("INVITE_PURGE_INTERVAL", "3600"))
+
+# Интервал обслуживания базы (VACUUM, ANALYZE, срок хранения архива), секунды
+MAINTENANCE_INTERVAL: int = int(os.getenv("MAINTENANCE_INTERVAL", "21600"))
+
+# Интервал вывода статистики базы данных в лог, секунды
+DB_STATS_LOG_INTERVAL: int = int(os.getenv("DB_STATS_LOG_INTERVAL", "300"))
+
+
+async def run_periodic(job: Callable[[], Awaitable[None]], interval: float, name: str) -> None:
+    """Выполняет фоновую задачу с заданным интервалом, ошибки только логируются"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await job()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Ошибка фоновой задачи {name}: {e}")
+
+
+async def log_database_stats() -> None:
+    """Пишет в лог сводку по пулам соединений и самым затратным запросам"""
+    log_db_stats()
+
+
+async def archive_completed_tasks() -> None:
+    """Переносит выполненные задачи в архив пакетами, каждый пакет в своей транзакции"""
+    completed_before = datetime.utcnow() - timedelta(hours=TASK_ARCHIVE_AFTER_HOURS)
+
+    async def archive_batch(size: int) -> int:
+        async with AsyncSessionLocal() as db:
+            moved = await utils.archive_completed_tasks(db, completed_before, size)
+            await db.commit()
+        return moved
+
+    archived = await utils.run_batches(archive_batch, TASK_ARCHIVE_BATCH)
+
+    if archived:
+        logger.info(f"📦 В архив перенесено выполненных задач: {archived}")
+
+
+async def purge_expired_invites() -> None:
+    """Удаляет истекшие коды приглашения"""
+    async with AsyncSessionLocal() as db:
+        purged = await utils.purge_expired_invites(db)
+        await db.commit()
+
+    if purged:
+        logger.info(f"🎫 Удалено истекших кодов приглашения: {purged}")
+
+
+async def maintain_database() -> None:
+    """Обслуживание базы: срок хранения архива, incremental vacuum, ANALYZE"""
+    report = await run_maintenance()
+    logger.info(
+        f"🧹 Обслуживание базы: удалено из архива {report.archived_purged}, освобождено страниц "
+        f"{report.pages_freed} ({report.bytes_reclaimed / 1024:.0f} КиБ), {report.elapsed:.2f} с"
+    )
+
+
+async def reconcile_app_stats() -> None:
+    """Пересчитывает AppStats целиком: активные пользователи и накопившиеся расхождения"""
+    async with AsyncSessionLocal() as db:
+        await utils.update_app_stats(db)
+        await db.commit()
+
+
+def start_background_jobs() -> List[asyncio.Task]:
+    """Запускает фоновые задачи бота"""
+    return [
+        asyncio.create_task(run_periodic(reconcile_app_stats, APP_STATS_RECONCILE_INTERVAL, "сверка статистики")),
+        asyncio.create_task(run_periodic(activity_buffer.flush, ACTIVITY_FLUSH_INTERVAL, "запись активности")),
+        asyncio.create_task(run_periodic(archive_completed_tasks, TASK_ARCHIVE_INTERVAL, "архивация задач")),
+        asyncio.create_task(run_periodic(purge_expired_invites, INVITE_PURGE_INTERVAL, "очистка приглашений")),
+        asyncio.create_task(run_periodic(maintain_database, MAINTENANCE_INTERVAL, "обслуживание базы")),
+        asyncio.create_task(run_periodic(log_database_stats, DB_STATS_LOG_INTERVAL, "статистика базы данных")),
+    ]
+
+
+async def stop_background_jobs(tasks: List[asyncio.Task]) -> None:
+    """Останавливает фоновые задачи при завершении бота"""
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    # Сохраняем активность, накопленную с последнего сброса
+    await activity_buffer.flush()
@@ -1,5 +1,7 @@
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import ReplyKeyboardBuilder, InlineKeyboardBuilder
+from typing import List, Optional
+from models import TaskModel
 
 
 def get_main_menu_keyboard(has_partner: bool = False) -> ReplyKeyboardMarkup:
@@ -41,8 +43,40 @@ def get_cancel_keyboard() -> ReplyKeyboardMarkup:
     )
 
 
-def get_tasks_keyboard(tasks: list, action: str, show_back: bool = True) -> InlineKeyboardMarkup:
-    """Создает клавиатуру для выбора задач"""
+def get_page_buttons(action: str, prev_cursor: Optional[str] = None,
+                     next_cursor: Optional[str] = None) -> List[InlineKeyboardButton]:
+    """Создает кнопки листания страниц: callback_data вида action:p|n:курсор"""
+    buttons: List[InlineKeyboardButton] = []
+
+    if prev_cursor:
+        buttons.append(InlineKeyboardButton(
+            text="◀️ Назад",
+            callback_data=f"{action}:p:{prev_cursor}"
+        ))
+    if next_cursor:
+        buttons.append(InlineKeyboardButton(
+            text="Далее ▶️",
+            callback_data=f"{action}:n:{next_cursor}"
+        ))
+
+    return buttons
+
+
+def get_pages_keyboard(action: str, prev_cursor: Optional[str] = None,
+                       next_cursor: Optional[str] = None) -> InlineKeyboardMarkup:
+    """Создает клавиатуру только с кнопками листания страниц"""
+    builder = InlineKeyboardBuilder()
+
+    page_buttons = get_page_buttons(action, prev_cursor, next_cursor)
+    if page_buttons:
+        builder.row(*page_buttons)
+
+    return builder.as_markup()
+
+
+def get_tasks_keyboard(tasks: List[TaskModel], action: str, show_back: bool = True,
+                       prev_cursor: Optional[str] = None, next_cursor: Optional[str] = None) -> InlineKeyboardMarkup:
+    """Создает клавиатуру для выбора задач со страницами"""
     builder = InlineKeyboardBuilder()
 
     for task in tasks:
@@ -52,12 +86,40 @@ def get_tasks_keyboard(tasks: list, action: str, show_back: bool = True) -> Inli
             callback_data=f"{action}:{task.id}"
         ))
 
+    builder.adjust(1)
+
+    page_buttons = get_page_buttons(f"{action}_page", prev_cursor, next_cursor)
+    if page_buttons:
+        builder.row(*page_buttons)
+
     if show_back:
-        builder.add(InlineKeyboardButton(
+        builder.row(InlineKeyboardButton(
             text="⬅️ Назад",
             callback_data="back_to_menu"
         ))
 
+    return builder.as_markup()
+
+
+def get_view_tasks_keyboard(my_next_cursor: Optional[str] = None,
+                            for_me_next_cursor: Optional[str] = None) -> Optional[InlineKeyboardMarkup]:
+    """Создает кнопки продолжения списков в обзоре задач"""
+    builder = InlineKeyboardBuilder()
+
+    if my_next_cursor:
+        builder.add(InlineKeyboardButton(
+            text="📤 Еще мои задачи ▶️",
+            callback_data=f"view_tasks_page:by:n:{my_next_cursor}"
+        ))
+    if for_me_next_cursor:
+        builder.add(InlineKeyboardButton(
+            text="📥 Еще задачи для меня ▶️",
+            callback_data=f"view_tasks_page:to:n:{for_me_next_cursor}"
+        ))
+
+    if not my_next_cursor and not for_me_next_cursor:
+        return None
+
     builder.adjust(1)
     return builder.as_markup()
 
@@ -85,6 +147,7 @@ def get_onesignal_menu_keyboard() -> ReplyKeyboardMarkup:
             [KeyboardButton(text="🔔 Тест OneSignal")],
             [KeyboardButton(text="📝 Web напоминание")],
             [KeyboardButton(text="📊 Статистика API")],
+            [KeyboardButton(text="🔗 Привязать устройство")],
             [KeyboardButton(text="⚙️ Настройки")],
             [KeyboardButton(text="⬅️ Назад в меню")]
         ],
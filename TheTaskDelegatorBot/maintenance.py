@@ -0,0 +1,107 @@
+"""
+Обслуживание базы данных
+
+Удаление и отвязка оставляют в файле SQLite свободные страницы, а статистика
+планировщика устаревает. Периодическая задача (jobs.maintain_database)
+удаляет архив старше срока хранения, возвращает свободные страницы
+небольшими пакетами PRAGMA incremental_vacuum и обновляет статистику ANALYZE.
+Синхронные операции с файлом выполняются в отдельном потоке, между пакетами
+обработчики получают доступ к базе.
+"""
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Tuple
+from database import engine, AsyncSessionLocal, DATABASE_URL
+import utils
+
+# Срок хранения архива выполненных задач в днях, 0 - хранить бессрочно
+ARCHIVE_RETENTION_DAYS: int = int(os.getenv("ARCHIVE_RETENTION_DAYS", "0"))
+ARCHIVE_RETENTION_BATCH: int = int(os.getenv("ARCHIVE_RETENTION_BATCH", "500"))
+
+# Страниц за один пакет incremental_vacuum и всего за один запуск
+VACUUM_BATCH_PAGES: int = int(os.getenv("VACUUM_BATCH_PAGES", "256"))
+VACUUM_MAX_PAGES: int = int(os.getenv("VACUUM_MAX_PAGES", "25600"))
+
+# Ограничение числа строк, просматриваемых ANALYZE в каждом индексе
+ANALYSIS_LIMIT: int = int(os.getenv("SQLITE_ANALYSIS_LIMIT", "1000"))
+
+
+@dataclass
+class MaintenanceReport:
+    """Результат одного запуска обслуживания"""
+    archived_purged: int = 0
+    pages_freed: int = 0
+    bytes_reclaimed: int = 0
+    elapsed: float = 0.0
+
+
+def _page_stats() -> Tuple[int, int, int]:
+    """Размер страницы, число страниц и свободных страниц файла базы"""
+    with engine.connect() as conn:
+        return tuple(conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+                     for name in ("page_size", "page_count", "freelist_count"))
+
+
+def _incremental_vacuum(pages: int) -> int:
+    """Возвращает в файловую систему до pages свободных страниц, возвращает их количество"""
+    connection = engine.raw_connection()
+    try:
+        sqlite = connection.driver_connection
+        before = sqlite.execute("PRAGMA freelist_count").fetchone()[0]
+        # execute() выполняет один шаг и освобождает одну страницу, executescript - все
+        sqlite.executescript(f"PRAGMA incremental_vacuum({pages})")
+        return before - sqlite.execute("PRAGMA freelist_count").fetchone()[0]
+    finally:
+        connection.close()
+
+
+def _analyze() -> None:
+    """
+    Обновляет статистику планировщика (sqlite_stat1) по всем таблицам
+    PRAGMA optimize в SQLite до 3.46 анализирует только таблицы, к которым
+    обращалось это соединение, на новом соединении он ничего не делает
+    """
+    with engine.connect() as conn:
+        conn.exec_driver_sql(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+        conn.exec_driver_sql("ANALYZE")
+        conn.commit()
+
+
+async def purge_old_archive(retention_days: int = ARCHIVE_RETENTION_DAYS) -> int:
+    """Удаляет задачи, пролежавшие в архиве дольше срока хранения"""
+    if retention_days <= 0:
+        return 0
+
+    archived_before = datetime.utcnow() - timedelta(days=retention_days)
+
+    async def purge_batch(size: int) -> int:
+        async with AsyncSessionLocal() as db:
+            deleted = await utils.purge_archived_tasks(db, archived_before, size)
+            await db.commit()
+        return deleted
+
+    return await utils.run_batches(purge_batch, ARCHIVE_RETENTION_BATCH)
+
+
+async def run_maintenance() -> MaintenanceReport:
+    """Выполняет все шаги обслуживания и возвращает отчет"""
+    started = time.perf_counter()
+    report = MaintenanceReport(archived_purged=await purge_old_archive())
+
+    if DATABASE_URL.startswith("sqlite"):
+        page_size, pages_before, _ = await asyncio.to_thread(_page_stats)
+
+        report.pages_freed = await utils.run_batches(
+            lambda pages: asyncio.to_thread(_incremental_vacuum, pages), VACUUM_BATCH_PAGES, VACUUM_MAX_PAGES
+        )
+
+        await asyncio.to_thread(_analyze)
+
+        _, pages_after, _ = await asyncio.to_thread(_page_stats)
+        report.bytes_reclaimed = (pages_before - pages_after) * page_size
+
+    report.elapsed = time.perf_counter() - started
+    return report
@@ -0,0 +1,76 @@
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Optional
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import Response, TelegramMethod
+from aiogram.types import TelegramObject
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+# Сессия апдейта, который сейчас обрабатывается в этой задаче
+_update_session: ContextVar[Optional[AsyncSession]] = ContextVar("update_session", default=None)
+
+
+class DbSessionMiddleware(BaseMiddleware):
+    """
+    Открывает одну сессию базы данных на апдейт
+    Обработчики получают ее аргументом db и делают только flush(),
+    коммит выполняется один раз после успешной обработки
+
+    Транзакция записи держит блокировку SQLite, поэтому обработчик сначала
+    завершает все изменения и только потом отвечает в Telegram.
+    CommitBeforeRequestMiddleware коммитит открытую транзакцию перед каждым
+    запросом к Bot API: блокировка не удерживается во время сетевых запросов,
+    а изменения, сделанные до ответа, сохраняются и при ошибке после него
+    """
+
+    def __init__(self, session_factory: async_sessionmaker) -> None:
+        self.session_factory = session_factory
+
+    async def __call__(self,
+                       handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject,
+                       data: Dict[str, Any]) -> Any:
+        # При исключении сессия закрывается без коммита и изменения откатываются
+        async with self.session_factory() as db:
+            data["db"] = db
+            token = _update_session.set(db)
+            try:
+                result = await handler(event, data)
+            finally:
+                _update_session.reset(token)
+            await db.commit()
+            return result
+
+
+class CommitBeforeRequestMiddleware(BaseRequestMiddleware):
+    """
+    Коммитит транзакцию текущего апдейта перед запросом к Bot API
+    Регистрируется в сессии бота: bot.session.middleware(...)
+    """
+
+    async def __call__(self,
+                       make_request: NextRequestMiddlewareType,
+                       bot: Bot,
+                       method: TelegramMethod) -> Response:
+        db = _update_session.get()
+        if db is not None and db.in_transaction():
+            await db.commit()
+        return await make_request(bot, method)
+
+
+class ReadOnlySessionMiddleware(BaseMiddleware):
+    """
+    Передает обработчикам аргумент read_db - сессию движка только для чтения
+    Соединение берется из пула только при первом запросе
+    """
+
+    def __init__(self, session_factory: async_sessionmaker) -> None:
+        self.session_factory = session_factory
+
+    async def __call__(self,
+                       handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject,
+                       data: Dict[str, Any]) -> Any:
+        async with self.session_factory() as read_db:
+            data["read_db"] = read_db
+            return await handler(event, data)
@@ -0,0 +1,374 @@
+"""
+Версионированные миграции схемы базы данных
+
+Текущая версия хранится в таблице schema_version. При запуске выполняются
+только шаги с номером больше сохраненного, поэтому на актуальной базе
+init_db делает один SELECT. Новые таблицы, индексы и столбцы добавляются
+новым шагом в конец MIGRATIONS, уже выпущенные шаги не меняются.
+DDL шагов записан явно и не строится по моделям database.py, иначе
+выпущенный шаг менялся бы вместе с моделью.
+Шаги должны быть идемпотентными: DDL в SQLite через pysqlite
+выполняется вне транзакции.
+"""
+import logging
+from datetime import datetime
+from typing import Callable, List, Tuple
+from sqlalchemy import DateTime, bindparam, text
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+MigrationStep = Callable[[Connection], None]
+MIGRATIONS: List[Tuple[int, str, MigrationStep]] = []
+
+
+def migration(version: int, description: str) -> Callable[[MigrationStep], MigrationStep]:
+    """Регистрирует шаг миграции с указанным номером версии"""
+    def decorator(step: MigrationStep) -> MigrationStep:
+        if MIGRATIONS and MIGRATIONS[-1][0] >= version:
+            raise ValueError(f"Миграция {version} объявлена не по порядку")
+        MIGRATIONS.append((version, description, step))
+        return step
+    return decorator
+
+
+def _table_columns(conn: Connection, table: str) -> List[str]:
+    """Возвращает имена столбцов таблицы"""
+    return [row[1] for row in conn.execute(text(f"PRAGMA table_info({table})"))]
+
+
+@migration(1, "базовая схема и счетчики статистики пользователей")
+def _initial_schema(conn: Connection) -> None:
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER NOT NULL,
+            telegram_id INTEGER NOT NULL,
+            username VARCHAR,
+            full_name VARCHAR,
+            partner_id INTEGER,
+            invite_code VARCHAR,
+            invite_expires DATETIME,
+            tasks_created_count INTEGER,
+            tasks_completed_count INTEGER,
+            tasks_received_count INTEGER,
+            tasks_deleted_count INTEGER,
+            total_messages_count INTEGER,
+            last_active_date DATETIME,
+            joined_date DATETIME,
+            onesignal_notifications_sent INTEGER,
+            onesignal_notifications_received INTEGER,
+            PRIMARY KEY (id),
+            UNIQUE (telegram_id),
+            FOREIGN KEY(partner_id) REFERENCES users (id),
+            UNIQUE (invite_code)
+        )"""))
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER NOT NULL,
+            title VARCHAR NOT NULL,
+            description VARCHAR,
+            assigned_by_id INTEGER NOT NULL,
+            assigned_to_id INTEGER NOT NULL,
+            created_at DATETIME,
+            completed BOOLEAN,
+            completed_at DATETIME,
+            PRIMARY KEY (id),
+            FOREIGN KEY(assigned_by_id) REFERENCES users (id),
+            FOREIGN KEY(assigned_to_id) REFERENCES users (id)
+        )"""))
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS app_stats (
+            id INTEGER NOT NULL,
+            total_users INTEGER,
+            active_users INTEGER,
+            total_tasks INTEGER,
+            completed_tasks INTEGER,
+            onesignal_notifications_total INTEGER,
+            updated_at DATETIME,
+            PRIMARY KEY (id)
+        )"""))
+
+    # Базы, созданные до появления статистики, не содержат этих столбцов
+    legacy_columns = [
+        ("tasks_created_count", "INTEGER DEFAULT 0"),
+        ("tasks_completed_count", "INTEGER DEFAULT 0"),
+        ("tasks_received_count", "INTEGER DEFAULT 0"),
+        ("tasks_deleted_count", "INTEGER DEFAULT 0"),
+        ("total_messages_count", "INTEGER DEFAULT 0"),
+        ("last_active_date", "DATETIME"),
+        ("joined_date", "DATETIME"),
+        ("onesignal_notifications_sent", "INTEGER DEFAULT 0"),
+        ("onesignal_notifications_received", "INTEGER DEFAULT 0"),
+    ]
+    columns = _table_columns(conn, "users")
+    for name, ddl in legacy_columns:
+        if name not in columns:
+            conn.execute(text(f"ALTER TABLE users ADD COLUMN {name} {ddl}"))
+
+    # ADD COLUMN в SQLite не принимает DEFAULT CURRENT_TIMESTAMP, заполняем даты отдельно
+    for name in ("last_active_date", "joined_date"):
+        conn.execute(text(f"UPDATE users SET {name} = CURRENT_TIMESTAMP WHERE {name} IS NULL"))
+
+    # Начальная запись AppStats
+    if not conn.execute(text("SELECT COUNT(*) FROM app_stats")).scalar():
+        conn.execute(text(
+            "INSERT INTO app_stats (total_users, active_users, total_tasks, completed_tasks, "
+            "onesignal_notifications_total) VALUES (0, 0, 0, 0, 0)"))
+
+
+@migration(2, "индексы горячих запросов по задачам и пользователям")
+def _hot_path_indexes(conn: Connection) -> None:
+    for ddl in (
+        "CREATE INDEX IF NOT EXISTS ix_users_invite_code_expires ON users (invite_code, invite_expires)",
+        "CREATE INDEX IF NOT EXISTS ix_users_last_active_date ON users (last_active_date)",
+        "CREATE INDEX IF NOT EXISTS ix_users_joined_date ON users (joined_date)",
+        "CREATE INDEX IF NOT EXISTS ix_tasks_assigned_to_completed ON tasks (assigned_to_id, completed)",
+        "CREATE INDEX IF NOT EXISTS ix_tasks_assigned_by_completed ON tasks (assigned_by_id, completed)",
+    ):
+        conn.execute(text(ddl))
+
+
+@migration(3, "дневные агрегаты статистики")
+def _daily_stats(conn: Connection) -> None:
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS daily_stats (
+            day DATE NOT NULL,
+            tasks_created INTEGER NOT NULL,
+            tasks_completed INTEGER NOT NULL,
+            users_joined INTEGER NOT NULL,
+            active_users INTEGER NOT NULL,
+            PRIMARY KEY (day)
+        )"""))
+    if conn.execute(text("SELECT COUNT(*) FROM daily_stats")).scalar():
+        return
+
+    # Заполняем агрегаты по существующим данным. Для активности известен
+    # только последний день каждого пользователя, прошлые дни не восстановить
+    conn.execute(text("""
+        INSERT INTO daily_stats (day, tasks_created, tasks_completed, users_joined, active_users)
+        SELECT day, SUM(tasks_created), SUM(tasks_completed), SUM(users_joined), SUM(active_users)
+        FROM (
+            SELECT date(created_at) AS day, 1 AS tasks_created, 0 AS tasks_completed,
+                   0 AS users_joined, 0 AS active_users
+            FROM tasks WHERE created_at IS NOT NULL
+            UNION ALL
+            SELECT date(completed_at), 0, 1, 0, 0 FROM tasks WHERE completed_at IS NOT NULL AND completed = TRUE
+            UNION ALL
+            SELECT date(joined_date), 0, 0, 1, 0 FROM users WHERE joined_date IS NOT NULL
+            UNION ALL
+            SELECT date(last_active_date), 0, 0, 0, 1 FROM users WHERE last_active_date IS NOT NULL
+        )
+        WHERE day IS NOT NULL
+        GROUP BY day"""))
+
+
+@migration(4, "архив выполненных задач")
+def _tasks_archive(conn: Connection) -> None:
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS tasks_archive (
+            id INTEGER NOT NULL,
+            title VARCHAR NOT NULL,
+            description VARCHAR,
+            assigned_by_id INTEGER NOT NULL,
+            assigned_to_id INTEGER NOT NULL,
+            created_at DATETIME,
+            completed_at DATETIME,
+            archived_at DATETIME,
+            PRIMARY KEY (id),
+            FOREIGN KEY(assigned_by_id) REFERENCES users (id),
+            FOREIGN KEY(assigned_to_id) REFERENCES users (id)
+        )"""))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_tasks_archive_assigned_by_id ON tasks_archive (assigned_by_id)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_tasks_archive_assigned_to_id ON tasks_archive (assigned_to_id)"))
+
+
+@migration(5, "индексы задач для постраничного вывода по (created_at, id)")
+def _task_page_indexes(conn: Connection) -> None:
+    # Новые индексы начинаются с прежних столбцов, старые больше не нужны
+    for name in ("ix_tasks_assigned_to_completed", "ix_tasks_assigned_by_completed"):
+        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+    # Курсор страницы содержит created_at, у старых задач он мог остаться пустым.
+    # Время передается параметром DateTime: CURRENT_TIMESTAMP записал бы его без
+    # долей секунды, и сравнение с курсором пропускало бы задачи той же секунды
+    conn.execute(
+        text("UPDATE tasks SET created_at = :now WHERE created_at IS NULL")
+        .bindparams(bindparam("now", type_=DateTime)),
+        {"now": datetime.utcnow()}
+    )
+
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_tasks_assigned_to_completed_created "
+        "ON tasks (assigned_to_id, completed, created_at, id)"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_tasks_assigned_by_completed_created "
+        "ON tasks (assigned_by_id, completed, created_at, id)"
+    ))
+
+
+@migration(6, "таблица кодов приглашения")
+def _invites(conn: Connection) -> None:
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS invites (
+            code VARCHAR NOT NULL,
+            owner_id INTEGER NOT NULL,
+            created_at DATETIME,
+            expires_at DATETIME NOT NULL,
+            PRIMARY KEY (code),
+            UNIQUE (owner_id),
+            FOREIGN KEY(owner_id) REFERENCES users (id)
+        )"""))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_invites_expires_at ON invites (expires_at)"))
+
+    # Действующие коды переносятся из users, истекшие просто удаляются
+    conn.execute(text(
+        "INSERT INTO invites (code, owner_id, created_at, expires_at) "
+        "SELECT invite_code, id, CURRENT_TIMESTAMP, invite_expires FROM users "
+        "WHERE invite_code IS NOT NULL AND invite_expires > :now"
+    ), {"now": datetime.utcnow()})
+    conn.execute(text("UPDATE users SET invite_code = NULL, invite_expires = NULL WHERE invite_code IS NOT NULL"))
+    conn.execute(text("DROP INDEX IF EXISTS ix_users_invite_code_expires"))
+
+
+@migration(7, "инкрементальный auto_vacuum")
+def _incremental_auto_vacuum(conn: Connection) -> None:
+    if conn.dialect.name != "sqlite":
+        return
+
+    # Режим auto_vacuum существующей базы меняется только полным VACUUM.
+    # Шаг выполняется до любых изменений данных, поэтому вне транзакции
+    if conn.execute(text("PRAGMA auto_vacuum")).scalar() != 2:
+        conn.execute(text("PRAGMA auto_vacuum = INCREMENTAL"))
+        conn.execute(text("VACUUM"))
+
+
+@migration(8, "очередь уведомлений outbox")
+def _outbox(conn: Connection) -> None:
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER NOT NULL,
+            chat_id INTEGER NOT NULL,
+            text VARCHAR NOT NULL,
+            status VARCHAR NOT NULL,
+            attempts INTEGER NOT NULL,
+            next_attempt_at DATETIME NOT NULL,
+            created_at DATETIME,
+            last_error VARCHAR,
+            PRIMARY KEY (id)
+        )"""))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_outbox_status_next_attempt ON outbox (status, next_attempt_at)"))
+
+
+@migration(9, "external ID пользователей OneSignal")
+def _onesignal_external_id(conn: Connection) -> None:
+    if "onesignal_external_id" not in _table_columns(conn, "users"):
+        conn.execute(text("ALTER TABLE users ADD COLUMN onesignal_external_id VARCHAR"))
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_onesignal_external_id ON users (onesignal_external_id)"))
+
+
+
+@migration(10, "AUTOINCREMENT для tasks")
+def _tasks_autoincrement(conn: Connection) -> None:
+    if conn.dialect.name != "sqlite":
+        return
+
+    # Без AUTOINCREMENT SQLite отдает новой задаче наибольший освободившийся id,
+    # а он может совпасть с id задачи в tasks_archive: архивация упирается в
+    # первичный ключ архива. SQLite не меняет первичный ключ, таблица пересоздается
+    table_sql = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'tasks'")).scalar()
+    if "AUTOINCREMENT" in table_sql.upper():
+        return
+
+    columns = "title, description, assigned_by_id, assigned_to_id, created_at, completed, completed_at"
+    conn.execute(text("DROP TABLE IF EXISTS tasks_new"))
+    conn.execute(text("""
+        CREATE TABLE tasks_new (
+            id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+            title VARCHAR NOT NULL,
+            description VARCHAR,
+            assigned_by_id INTEGER NOT NULL,
+            assigned_to_id INTEGER NOT NULL,
+            created_at DATETIME,
+            completed BOOLEAN,
+            completed_at DATETIME,
+            FOREIGN KEY(assigned_by_id) REFERENCES users (id),
+            FOREIGN KEY(assigned_to_id) REFERENCES users (id)
+        )"""))
+    conn.execute(text(
+        f"INSERT INTO tasks_new (id, {columns}) SELECT id, {columns} FROM tasks "
+        f"WHERE id NOT IN (SELECT id FROM tasks_archive)"
+    ))
+
+    # Счетчик начинается после наибольшего id и в tasks, и в архиве
+    conn.execute(text("DELETE FROM sqlite_sequence WHERE name = 'tasks_new'"))
+    conn.execute(text(
+        "INSERT INTO sqlite_sequence (name, seq) SELECT 'tasks_new', "
+        "MAX((SELECT COALESCE(MAX(id), 0) FROM tasks), (SELECT COALESCE(MAX(id), 0) FROM tasks_archive))"
+    ))
+
+    # Задачи, уже получившие id из архива, получают новые id
+    renumbered = conn.execute(text(
+        f"INSERT INTO tasks_new ({columns}) SELECT {columns} FROM tasks "
+        f"WHERE id IN (SELECT id FROM tasks_archive) ORDER BY id"
+    )).rowcount
+    if renumbered:
+        logger.warning(f"⚠️ Задачам с id из архива выданы новые id: {renumbered}")
+
+    conn.execute(text("DROP TABLE tasks"))
+    conn.execute(text("ALTER TABLE tasks_new RENAME TO tasks"))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_tasks_assigned_to_completed_created "
+        "ON tasks (assigned_to_id, completed, created_at, id)"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_tasks_assigned_by_completed_created "
+        "ON tasks (assigned_by_id, completed, created_at, id)"
+    ))
+
+
+
+@migration(11, "доли секунды в created_at задач")
+def _task_created_at_microseconds(conn: Connection) -> None:
+    if conn.dialect.name != "sqlite":
+        return
+
+    # Прежняя версия шага 5 заполняла created_at через CURRENT_TIMESTAMP
+    # ('YYYY-MM-DD HH:MM:SS'), а SQLAlchemy хранит и сравнивает даты с
+    # микросекундами: курсор страницы пропускал такие задачи
+    conn.execute(text("UPDATE tasks SET created_at = created_at || '.000000' WHERE length(created_at) = 19"))
+
+
+def current_version(conn: Connection) -> int:
+    """Возвращает версию схемы, записанную в базе"""
+    conn.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"))
+    version = conn.execute(text("SELECT version FROM schema_version")).scalar()
+    if version is None:
+        conn.execute(text("INSERT INTO schema_version (version) VALUES (0)"))
+        return 0
+    return version
+
+
+def run_migrations(engine: Engine) -> int:
+    """Применяет недостающие миграции и возвращает итоговую версию схемы"""
+    latest = MIGRATIONS[-1][0]
+
+    with engine.begin() as conn:
+        version = current_version(conn)
+
+    if version >= latest:
+        return version
+
+    for step_version, description, step in MIGRATIONS:
+        if step_version <= version:
+            continue
+
+        logger.info(f"🛠 Миграция {step_version}: {description}")
+        with engine.begin() as conn:
+            step(conn)
+            conn.execute(text("UPDATE schema_version SET version = :version"), {"version": step_version})
+        version = step_version
+
+    logger.info(f"✅ Схема базы данных обновлена до версии {version}")
+    return version
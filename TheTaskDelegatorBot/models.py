@@ -2,8 +2,11 @@ from dataclasses import dataclass
 from datetime import datetime
 from typing import Optional
 
+# Легкие неизменяемые строки для чтения: без identity map и отслеживания изменений ORM.
+# Порядок полей совпадает с порядком столбцов в запросах repository.model_columns
 
-@dataclass
+
+@dataclass(slots=True, frozen=True)
 class TaskModel:
     """Модель задачи"""
     id: int
@@ -20,11 +23,25 @@ class TaskModel:
         return "✅ Выполнено" if self.completed else "⏳ Ожидает"
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class UserModel:
     """Модель пользователя"""
     id: int
     telegram_id: int
     username: Optional[str]
-    full_name: str
-    partner_id: Optional[int]
\ No newline at end of file
+    full_name: Optional[str]
+    partner_id: Optional[int]
+    onesignal_external_id: Optional[str]
+
+
+@dataclass(slots=True, frozen=True)
+class UserStatsModel(UserModel):
+    """Модель пользователя со счетчиками статистики"""
+    tasks_created_count: Optional[int]
+    tasks_completed_count: Optional[int]
+    tasks_received_count: Optional[int]
+    tasks_deleted_count: Optional[int]
+    total_messages_count: Optional[int]
+    onesignal_notifications_sent: Optional[int]
+    last_active_date: Optional[datetime]
+    joined_date: Optional[datetime]
@@ -0,0 +1,195 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+from aiogram import Bot
+from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramRetryAfter
+import config
+
+logger = logging.getLogger(__name__)
+
+# Очередь уведомлений: число отправителей и размер очереди
+NOTIFY_WORKERS: int = int(os.getenv("NOTIFY_WORKERS", "4"))
+NOTIFY_QUEUE_SIZE: int = int(os.getenv("NOTIFY_QUEUE_SIZE", "10000"))
+
+# Лимиты Telegram: около 30 сообщений в секунду всего и 1 в секунду в один чат
+NOTIFY_GLOBAL_RATE: float = float(os.getenv("NOTIFY_GLOBAL_RATE", "30"))
+NOTIFY_CHAT_RATE: float = float(os.getenv("NOTIFY_CHAT_RATE", "1"))
+NOTIFY_CHAT_BURST: int = int(os.getenv("NOTIFY_CHAT_BURST", "3"))
+
+# Повторы после RetryAfter и время на отправку остатка очереди при остановке
+NOTIFY_MAX_RETRIES: int = int(os.getenv("NOTIFY_MAX_RETRIES", "3"))
+NOTIFY_STOP_TIMEOUT: float = float(os.getenv("NOTIFY_STOP_TIMEOUT", "10"))
+
+# Бот диспетчера: одна HTTP-сессия с пулом соединений на все уведомления
+_bot: Optional[Bot] = None
+
+
+def set_bot(bot: Bot) -> None:
+    """Регистрирует бота, запущенного в bot.py"""
+    global _bot
+    _bot = bot
+
+
+def get_bot() -> Bot:
+    """
+    Возвращает общий экземпляр бота
+    Без bot.py (скрипты, фоновые задачи) бот создается один раз при первом вызове
+    """
+    global _bot
+    if _bot is None:
+        _bot = Bot(token=config.config.BOT_TOKEN, parse_mode=ParseMode.HTML)
+    return _bot
+
+
+async def close_bot() -> None:
+    """Закрывает HTTP-сессию общего бота"""
+    global _bot
+    if _bot is not None:
+        await _bot.session.close()
+        _bot = None
+
+
+async def send_notification(user_id: int, text: str) -> bool:
+    """Отправляет уведомление пользователю сразу, без очереди и лимитов"""
+    try:
+        await get_bot().send_message(user_id, text, parse_mode="HTML")
+        logger.info(f"✅ Telegram уведомление отправлено пользователю {user_id}")
+        return True
+    except Exception as e:
+        logger.error(f"❌ Ошибка отправки Telegram уведомления пользователю {user_id}: {e}")
+        return False
+
+
+class TokenBucket:
+    """Ограничитель частоты: rate токенов в секунду, не больше capacity подряд"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self) -> None:
+        """Ждет свободный токен"""
+        while True:
+            now = time.monotonic()
+            self._refill(now)
+            wait = self.blocked_until - now
+            if wait <= 0:
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Запрещает отправку на seconds секунд (ответ RetryAfter)"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    @property
+    def idle(self) -> bool:
+        """Ведро полное и не заблокировано, его можно не хранить"""
+        now = time.monotonic()
+        self._refill(now)
+        return self.tokens >= self.capacity and self.blocked_until <= now
+
+
+class NotificationQueue:
+    """
+    Очередь уведомлений с пулом отправителей
+    Сообщения передает диспетчер outbox через submit() и получает результат.
+    Отправители соблюдают общий лимит и лимит на чат, после RetryAfter
+    ждут указанное Telegram время и повторяют отправку
+    """
+
+    def __init__(self, workers: int = NOTIFY_WORKERS, maxsize: int = NOTIFY_QUEUE_SIZE):
+        self.workers = workers
+        self._queue: "asyncio.Queue[Tuple[int, str, asyncio.Future]]" = asyncio.Queue(maxsize)
+        self._tasks: List[asyncio.Task] = []
+        self._global = TokenBucket(NOTIFY_GLOBAL_RATE, NOTIFY_GLOBAL_RATE)
+        self._chats: Dict[int, TokenBucket] = {}
+        self.sent = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self) -> None:
+        """Запускает отправителей"""
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = NOTIFY_STOP_TIMEOUT) -> None:
+        """Отправляет оставшиеся уведомления (не дольше timeout) и останавливает отправителей"""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Не отправлено уведомлений при остановке: {self._queue.qsize()}")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, user_id: int, text: str) -> Optional[str]:
+        """Отправляет уведомление с соблюдением лимитов, возвращает текст ошибки или None"""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((user_id, text, future))
+        return await future
+
+    def _chat_bucket(self, user_id: int) -> TokenBucket:
+        bucket = self._chats.get(user_id)
+        if bucket is None:
+            # Полные ведра ничего не ограничивают, их можно создать заново
+            if len(self._chats) >= NOTIFY_QUEUE_SIZE:
+                self._chats = {chat: bucket for chat, bucket in self._chats.items() if not bucket.idle}
+            bucket = self._chats[user_id] = TokenBucket(NOTIFY_CHAT_RATE, NOTIFY_CHAT_BURST)
+        return bucket
+
+    async def _deliver(self, user_id: int, text: str) -> Optional[str]:
+        """Отправляет сообщение, возвращает текст ошибки или None при успехе"""
+        for attempt in range(NOTIFY_MAX_RETRIES + 1):
+            await self._chat_bucket(user_id).acquire()
+            await self._global.acquire()
+            try:
+                await get_bot().send_message(user_id, text, parse_mode="HTML")
+                self.sent += 1
+                logger.info(f"✅ Telegram уведомление отправлено пользователю {user_id}")
+                return None
+            except TelegramRetryAfter as e:
+                # Ограничение действует на весь бот, ждут все отправители
+                logger.warning(f"⏳ Telegram просит подождать {e.retry_after} с (попытка {attempt + 1})")
+                self._global.pause(e.retry_after)
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"❌ Ошибка отправки Telegram уведомления пользователю {user_id}: {e}")
+                return str(e)
+
+        self.failed += 1
+        logger.error(f"❌ Уведомление пользователю {user_id} не отправлено после {NOTIFY_MAX_RETRIES} повторов")
+        return f"RetryAfter после {NOTIFY_MAX_RETRIES} повторов"
+
+    async def _worker(self) -> None:
+        while True:
+            user_id, text, future = await self._queue.get()
+            error: Optional[str] = "отправка прервана"
+            try:
+                error = await self._deliver(user_id, text)
+            finally:
+                self._queue.task_done()
+                if not future.done():
+                    future.set_result(error)
+
+
+# Глобальная очередь для использования во всем приложении
+notification_queue = NotificationQueue()
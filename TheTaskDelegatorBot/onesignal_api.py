@@ -1,24 +1,42 @@
 import requests
+import aiohttp
+import asyncio
 import json
 import os
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Set
 from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, SessionTransaction
 import logging
+from database import AsyncSessionLocal
+import utils
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Адрес API (переопределяется для локальных проверок)
+ONESIGNAL_API_URL: str = os.getenv("ONESIGNAL_API_URL", "https://onesignal.com/api/v1")
+
+# Асинхронный клиент: соединений в пуле, время жизни простаивающего соединения
+# и таймауты запроса целиком и установки соединения, секунды
+ONESIGNAL_MAX_CONNECTIONS: int = int(os.getenv("ONESIGNAL_MAX_CONNECTIONS", "10"))
+ONESIGNAL_KEEPALIVE: float = float(os.getenv("ONESIGNAL_KEEPALIVE", "60"))
+ONESIGNAL_TIMEOUT: float = float(os.getenv("ONESIGNAL_TIMEOUT", "15"))
+ONESIGNAL_CONNECT_TIMEOUT: float = float(os.getenv("ONESIGNAL_CONNECT_TIMEOUT", "5"))
+
 
 class OneSignalAPI:
     """
     OneSignal API интеграция для внешних уведомлений
     Без зависимостей от ID уведомлений
+    Синхронный клиент для скриптов, в обработчиках используется AsyncOneSignalAPI
     """
 
     def __init__(self):
         """Инициализация OneSignal клиента"""
-        self.base_url = "https://onesignal.com/api/v1"
+        self.base_url = ONESIGNAL_API_URL
         self.app_id = os.getenv("ONESIGNAL_APP_ID")
         self.api_key = os.getenv("ONESIGNAL_API_KEY")
 
@@ -29,27 +47,40 @@ class OneSignalAPI:
         else:
             logger.info(f"OneSignal инициализирован. App ID: {self.app_id[:8]}...")
 
-    def send_notification(self,
-                          contents: Dict[str, str],
-                          headings: Optional[Dict[str, str]] = None,
-                          included_segments: Optional[list] = None,
-                          filters: Optional[list] = None,
-                          data: Optional[Dict] = None,
-                          url: Optional[str] = None,
-                          priority: int = 10,
-                          ttl: int = 259200) -> Dict[str, Any]:
-        """
-        Отправить уведомление через OneSignal API
-        Возвращает только success/error без ID
-        """
-        if not self.is_configured:
-            return {
-                'success': False,
-                'error': 'OneSignal not configured. Add credentials to .env',
-                'service': 'onesignal'
-            }
+    # ---------- Подготовка запросов и разбор ответов (общие для обоих клиентов) ----------
 
-        # Подготовка payload
+    def _not_configured(self) -> Dict[str, Any]:
+        return {
+            'success': False,
+            'error': 'OneSignal not configured. Add credentials to .env',
+            'service': 'onesignal'
+        }
+
+    @staticmethod
+    def _recipient_not_linked() -> Dict[str, Any]:
+        return {
+            'success': False,
+            'error': 'Recipient has no OneSignal external ID',
+            'service': 'onesignal'
+        }
+
+    def _headers(self) -> Dict[str, str]:
+        return {
+            "Content-Type": "application/json; charset=utf-8",
+            "Authorization": f"Basic {self.api_key}"
+        }
+
+    def _notification_payload(self,
+                              contents: Dict[str, str],
+                              headings: Optional[Dict[str, str]] = None,
+                              included_segments: Optional[list] = None,
+                              filters: Optional[list] = None,
+                              data: Optional[Dict] = None,
+                              url: Optional[str] = None,
+                              priority: int = 10,
+                              ttl: int = 259200,
+                              include_aliases: Optional[Dict[str, list]] = None) -> Dict[str, Any]:
+        """Тело запроса на отправку уведомления"""
         payload = {
             "app_id": self.app_id,
             "contents": contents,
@@ -60,7 +91,11 @@ class OneSignalAPI:
         if headings:
             payload["headings"] = headings
 
-        if included_segments:
+        if include_aliases:
+            # Адресная отправка конкретным пользователям, например {"external_id": [...]}
+            payload["include_aliases"] = include_aliases
+            payload["target_channel"] = "push"
+        elif included_segments:
             payload["included_segments"] = included_segments
         elif filters:
             payload["filters"] = filters
@@ -73,75 +108,62 @@ class OneSignalAPI:
         if url:
             payload["url"] = url
 
-        try:
-            logger.info(f"📤 Отправка OneSignal уведомления")
+        return payload
 
-            headers = {
-                "Content-Type": "application/json; charset=utf-8",
-                "Authorization": f"Basic {self.api_key}"
+    @staticmethod
+    def _notification_result(status_code: int, error_data: Optional[Dict]) -> Dict[str, Any]:
+        """Результат отправки по коду ответа и телу ошибки (None, если тело не JSON)"""
+        if status_code in [200, 201]:
+            logger.info("✅ OneSignal уведомление отправлено успешно")
+            return {
+                'success': True,
+                'service': 'onesignal',
+                'status_code': status_code
             }
 
-            # Используем json параметр для автоматической сериализации
-            response = requests.post(
-                f"{self.base_url}/notifications",
-                headers=headers,
-                json=payload,
-                timeout=15
-            )
-
-            # Проверяем успешный статус
-            if response.status_code in [200, 201]:
-                logger.info("✅ OneSignal уведомление отправлено успешно")
-                return {
-                    'success': True,
-                    'service': 'onesignal',
-                    'status_code': response.status_code
-                }
-            else:
-                logger.warning(f"⚠️ OneSignal ответил с кодом: {response.status_code}")
-                try:
-                    error_data = response.json()
-                    logger.warning(f"Ошибки: {error_data.get('errors', ['Unknown'])}")
-                    return {
-                        'success': False,
-                        'error': f"HTTP {response.status_code}: {error_data.get('errors', ['Unknown'])[0]}",
-                        'service': 'onesignal',
-                        'status_code': response.status_code
-                    }
-                except:
-                    return {
-                        'success': False,
-                        'error': f"HTTP {response.status_code}",
-                        'service': 'onesignal',
-                        'status_code': response.status_code
-                    }
-
-        except requests.exceptions.RequestException as e:
-            logger.error(f"❌ OneSignal API ошибка: {e}")
+        logger.warning(f"⚠️ OneSignal ответил с кодом: {status_code}")
+        try:
+            logger.warning(f"Ошибки: {error_data.get('errors', ['Unknown'])}")
             return {
                 'success': False,
-                'error': f"OneSignal API error: {str(e)}",
-                'service': 'onesignal'
+                'error': f"HTTP {status_code}: {error_data.get('errors', ['Unknown'])[0]}",
+                'service': 'onesignal',
+                'status_code': status_code
             }
-        except Exception as e:
-            logger.error(f"❌ Неожиданная ошибка: {e}")
+        except:
             return {
                 'success': False,
-                'error': f"Unexpected error: {str(e)}",
-                'service': 'onesignal'
+                'error': f"HTTP {status_code}",
+                'service': 'onesignal',
+                'status_code': status_code
             }
 
-    def send_task_notification(self,
-                               task_title: str,
-                               from_user: str,
-                               task_description: Optional[str] = None,
-                               task_id: Optional[int] = None,
-                               deadline: Optional[str] = None,
-                               priority_level: str = "normal") -> Dict[str, Any]:
-        """
-        Специальный метод для уведомлений о задачах
-        Упрощенный - не зависит от ID
-        """
+    @staticmethod
+    def _request_failed(e: Exception) -> Dict[str, Any]:
+        logger.error(f"❌ OneSignal API ошибка: {e}")
+        return {
+            'success': False,
+            'error': f"OneSignal API error: {str(e)}",
+            'service': 'onesignal'
+        }
+
+    @staticmethod
+    def _unexpected_error(e: Exception) -> Dict[str, Any]:
+        logger.error(f"❌ Неожиданная ошибка: {e}")
+        return {
+            'success': False,
+            'error': f"Unexpected error: {str(e)}",
+            'service': 'onesignal'
+        }
+
+    @staticmethod
+    def _task_notification_kwargs(external_id: str,
+                                  task_title: str,
+                                  from_user: str,
+                                  task_description: Optional[str] = None,
+                                  deadline: Optional[str] = None,
+                                  priority_level: str = "normal") -> Dict[str, Any]:
+        """Параметры send_notification для уведомления о задаче исполнителю external_id"""
         # Определяем приоритет OneSignal
         priority_map = {
             "low": 5,
@@ -184,20 +206,18 @@ class OneSignalAPI:
         # URL для открытия бота
         url = "https://t.me/TheTaskDelegatorBot"
 
-        return self.send_notification(
+        return dict(
             contents=contents,
             headings=headings,
-            included_segments=["Subscribed Users"],
+            include_aliases={"external_id": [external_id]},
             data=data,
             url=url,
             priority=priority
         )
 
-    def send_reminder_notification(self,
-                                   task_title: str,
-                                   hours_left: int,
-                                   task_id: Optional[int] = None) -> Dict[str, Any]:
-        """Отправить напоминание о дедлайне"""
+    @staticmethod
+    def _reminder_notification_kwargs(external_id: str, task_title: str, hours_left: int) -> Dict[str, Any]:
+        """Параметры send_notification для напоминания о дедлайне исполнителю external_id"""
         if hours_left <= 1:
             message = f"⏳ ОСТАЛСЯ 1 ЧАС! Задача: {task_title}"
             priority = 10
@@ -219,13 +239,118 @@ class OneSignalAPI:
             "hours_left": hours_left
         }
 
-        return self.send_notification(
+        return dict(
             contents=contents,
             headings=headings,
+            include_aliases={"external_id": [external_id]},
             data=data,
             priority=priority
         )
 
+    @staticmethod
+    def _app_stats(app_info: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'success': True,
+            'app_name': app_info.get('name'),
+            'players': app_info.get('players'),
+            'messageable_players': app_info.get('messageable_players'),
+            'created_at': app_info.get('created_at')
+        }
+
+    @staticmethod
+    def _connection_result(test_result: Dict[str, Any], stats: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        if test_result['success']:
+            return {
+                'success': True,
+                'configured': True,
+                'notification_sent': True,
+                'app_stats': stats if stats['success'] else None
+            }
+        return {
+            'success': False,
+            'configured': True,
+            'error': test_result.get('error'),
+            'notification_sent': False
+        }
+
+    _TEST_NOTIFICATION = dict(
+        contents={"ru": "🔧 Тестовое уведомление от TaskBuddy Bot"},
+        headings={"ru": "✅ OneSignal подключен"},
+        included_segments=["All"]
+    )
+
+    # ---------- Запросы ----------
+
+    def send_notification(self,
+                          contents: Dict[str, str],
+                          headings: Optional[Dict[str, str]] = None,
+                          included_segments: Optional[list] = None,
+                          filters: Optional[list] = None,
+                          data: Optional[Dict] = None,
+                          url: Optional[str] = None,
+                          priority: int = 10,
+                          ttl: int = 259200,
+                          include_aliases: Optional[Dict[str, list]] = None) -> Dict[str, Any]:
+        """
+        Отправить уведомление через OneSignal API
+        Возвращает только success/error без ID
+        """
+        if not self.is_configured:
+            return self._not_configured()
+
+        payload = self._notification_payload(contents, headings, included_segments, filters, data, url, priority, ttl,
+                                             include_aliases)
+
+        try:
+            logger.info(f"📤 Отправка OneSignal уведомления")
+
+            # Используем json параметр для автоматической сериализации
+            response = requests.post(
+                f"{self.base_url}/notifications",
+                headers=self._headers(),
+                json=payload,
+                timeout=ONESIGNAL_TIMEOUT
+            )
+
+            try:
+                error_data = None if response.status_code in [200, 201] else response.json()
+            except ValueError:
+                error_data = None
+            return self._notification_result(response.status_code, error_data)
+
+        except requests.exceptions.RequestException as e:
+            return self._request_failed(e)
+        except Exception as e:
+            return self._unexpected_error(e)
+
+    def send_task_notification(self,
+                               task_title: str,
+                               from_user: str,
+                               task_description: Optional[str] = None,
+                               task_id: Optional[int] = None,
+                               deadline: Optional[str] = None,
+                               priority_level: str = "normal",
+                               external_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Специальный метод для уведомлений о задачах
+        Уведомление получает только исполнитель с external_id, без него ничего не отправляется
+        """
+        if not external_id:
+            return self._recipient_not_linked()
+        return self.send_notification(**self._task_notification_kwargs(
+            external_id, task_title, from_user, task_description, deadline, priority_level
+        ))
+
+    def send_reminder_notification(self,
+                                   task_title: str,
+                                   hours_left: int,
+                                   task_id: Optional[int] = None,
+                                   external_id: Optional[str] = None) -> Dict[str, Any]:
+        """Отправить напоминание о дедлайне исполнителю с external_id"""
+        if not external_id:
+            return self._recipient_not_linked()
+        return self.send_notification(**self._reminder_notification_kwargs(external_id, task_title, hours_left))
+
     def get_app_stats(self) -> Dict[str, Any]:
         """Получить статистику приложения (работает без проблем)"""
         if not self.is_configured:
@@ -235,18 +360,10 @@ class OneSignalAPI:
             url = f"{self.base_url}/apps/{self.app_id}"
             headers = {"Authorization": f"Basic {self.api_key}"}
 
-            response = requests.get(url, headers=headers, timeout=10)
+            response = requests.get(url, headers=headers, timeout=ONESIGNAL_TIMEOUT)
             response.raise_for_status()
 
-            app_info = response.json()
-
-            return {
-                'success': True,
-                'app_name': app_info.get('name'),
-                'players': app_info.get('players'),
-                'messageable_players': app_info.get('messageable_players'),
-                'created_at': app_info.get('created_at')
-            }
+            return self._app_stats(response.json())
 
         except Exception as e:
             logger.error(f"Error getting app stats: {e}")
@@ -261,31 +378,191 @@ class OneSignalAPI:
                 'configured': False
             }
 
-        # Пробуем отправить тестовое уведомление
-        test_result = self.send_notification(
-            contents={"ru": "🔧 Тестовое уведомление от TaskBuddy Bot"},
-            headings={"ru": "✅ OneSignal подключен"},
-            included_segments=["All"]
-        )
+        # Пробуем отправить тестовое уведомление, затем получаем статистику приложения
+        test_result = self.send_notification(**self._TEST_NOTIFICATION)
+        stats = self.get_app_stats() if test_result['success'] else None
+        return self._connection_result(test_result, stats)
 
-        if test_result['success']:
-            # Получаем статистику приложения
-            stats = self.get_app_stats()
 
-            return {
-                'success': True,
-                'configured': True,
-                'notification_sent': True,
-                'app_stats': stats if stats['success'] else None
-            }
-        else:
+class AsyncOneSignalAPI(OneSignalAPI):
+    """
+    Асинхронный клиент OneSignal для обработчиков
+    Запросы не блокируют цикл событий. Одна сессия aiohttp держит пул
+    keep-alive соединений (не больше ONESIGNAL_MAX_CONNECTIONS, остальные
+    запросы ждут свободное соединение). Сессия создается при первом запросе
+    и закрывается в bot.py при остановке
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=ONESIGNAL_MAX_CONNECTIONS,
+                    keepalive_timeout=ONESIGNAL_KEEPALIVE
+                ),
+                timeout=aiohttp.ClientTimeout(total=ONESIGNAL_TIMEOUT, connect=ONESIGNAL_CONNECT_TIMEOUT)
+            )
+        return self._session
+
+    async def close(self) -> None:
+        """Закрывает пул соединений"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def send_notification(self,
+                                contents: Dict[str, str],
+                                headings: Optional[Dict[str, str]] = None,
+                                included_segments: Optional[list] = None,
+                                filters: Optional[list] = None,
+                                data: Optional[Dict] = None,
+                                url: Optional[str] = None,
+                                priority: int = 10,
+                                ttl: int = 259200,
+                                include_aliases: Optional[Dict[str, list]] = None) -> Dict[str, Any]:
+        """
+        Отправить уведомление через OneSignal API
+        Возвращает только success/error без ID
+        """
+        if not self.is_configured:
+            return self._not_configured()
+
+        payload = self._notification_payload(contents, headings, included_segments, filters, data, url, priority, ttl,
+                                             include_aliases)
+
+        try:
+            logger.info(f"📤 Отправка OneSignal уведомления")
+
+            async with self._get_session().post(
+                f"{self.base_url}/notifications",
+                headers=self._headers(),
+                json=payload
+            ) as response:
+                try:
+                    error_data = None if response.status in [200, 201] else await response.json(content_type=None)
+                except ValueError:
+                    error_data = None
+                return self._notification_result(response.status, error_data)
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return self._request_failed(e)
+        except Exception as e:
+            return self._unexpected_error(e)
+
+    async def send_task_notification(self,
+                                     task_title: str,
+                                     from_user: str,
+                                     task_description: Optional[str] = None,
+                                     task_id: Optional[int] = None,
+                                     deadline: Optional[str] = None,
+                                     priority_level: str = "normal",
+                                     external_id: Optional[str] = None) -> Dict[str, Any]:
+        """Уведомление о задаче исполнителю с external_id"""
+        if not external_id:
+            return self._recipient_not_linked()
+        return await self.send_notification(**self._task_notification_kwargs(
+            external_id, task_title, from_user, task_description, deadline, priority_level
+        ))
+
+    async def send_reminder_notification(self,
+                                         task_title: str,
+                                         hours_left: int,
+                                         task_id: Optional[int] = None,
+                                         external_id: Optional[str] = None) -> Dict[str, Any]:
+        """Отправить напоминание о дедлайне исполнителю с external_id"""
+        if not external_id:
+            return self._recipient_not_linked()
+        return await self.send_notification(**self._reminder_notification_kwargs(external_id, task_title, hours_left))
+
+    async def get_app_stats(self) -> Dict[str, Any]:
+        """Получить статистику приложения"""
+        if not self.is_configured:
+            return {'success': False, 'error': 'Not configured'}
+
+        try:
+            async with self._get_session().get(
+                f"{self.base_url}/apps/{self.app_id}",
+                headers={"Authorization": f"Basic {self.api_key}"},
+                raise_for_status=True
+            ) as response:
+                return self._app_stats(await response.json(content_type=None))
+
+        except Exception as e:
+            logger.error(f"Error getting app stats: {e}")
+            return {'success': False, 'error': str(e) or type(e).__name__}
+
+    async def test_connection(self) -> Dict[str, Any]:
+        """Тестирование подключения к OneSignal"""
+        if not self.is_configured:
             return {
                 'success': False,
-                'configured': True,
-                'error': test_result.get('error'),
-                'notification_sent': False
+                'error': 'Not configured',
+                'configured': False
             }
 
+        test_result = await self.send_notification(**self._TEST_NOTIFICATION)
+        stats = await self.get_app_stats() if test_result['success'] else None
+        return self._connection_result(test_result, stats)
+
 
-# Глобальный экземпляр для использования во всем приложении
-onesignal_api = OneSignalAPI()
\ No newline at end of file
+# Глобальный клиент для использования во всем приложении
+onesignal_client = AsyncOneSignalAPI()
+
+_PENDING_KEY = "onesignal_pending"
+_pending_sends: Set[asyncio.Task] = set()
+
+
+def send_task_notification_after_commit(db: AsyncSession, sender_id: Optional[int] = None, **kwargs) -> None:
+    """
+    Отправляет web-уведомление о задаче после коммита транзакции апдейта
+    Запрос к OneSignal не держит транзакцию открытой, при откате уведомление не отправляется.
+    sender_id - telegram_id отправителя, чей счетчик OneSignal увеличивается после успешной отправки
+    """
+    db.info.setdefault(_PENDING_KEY, []).append((sender_id, kwargs))
+
+
+async def _send_task_notification(sender_id: Optional[int], kwargs: Dict[str, Any]) -> None:
+    try:
+        result = await onesignal_client.send_task_notification(**kwargs)
+    except Exception as e:
+        logger.error(f"Ошибка отправки OneSignal уведомления: {e}")
+        return
+
+    if not result['success']:
+        logger.warning(f"⚠️ OneSignal уведомление не отправлено: {result.get('error')}")
+        return
+
+    logger.info(f"✅ OneSignal уведомление отправлено для задачи {kwargs.get('task_id')}")
+    if sender_id is not None:
+        # Транзакция апдейта уже завершена, счетчик пишется отдельной короткой сессией
+        async with AsyncSessionLocal() as db:
+            await utils.increment_onesignal_stats(db, sender_id, sent=True)
+            await db.commit()
+
+
+async def wait_pending_sends() -> None:
+    """Дожидается уведомлений, запущенных после коммита (перед закрытием клиента)"""
+    if _pending_sends:
+        await asyncio.gather(*_pending_sends, return_exceptions=True)
+
+
+@event.listens_for(Session, "after_commit")
+def _send_after_commit(session: Session) -> None:
+    # after_commit вызывается и при освобождении точки сохранения (begin_nested)
+    if session.in_nested_transaction():
+        return
+    for sender_id, kwargs in session.info.pop(_PENDING_KEY, ()):
+        task = asyncio.get_running_loop().create_task(_send_task_notification(sender_id, kwargs))
+        _pending_sends.add(task)
+        task.add_done_callback(_pending_sends.discard)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending(session: Session, previous_transaction: SessionTransaction) -> None:
+    # Откат точки сохранения (begin_nested) не отменяет остальную транзакцию
+    if previous_transaction.parent is None:
+        session.info.pop(_PENDING_KEY, None)
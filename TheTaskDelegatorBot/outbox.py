@@ -0,0 +1,156 @@
+"""
+Транзакционная очередь уведомлений (outbox)
+
+Обработчик записывает уведомление в таблицу outbox в той же транзакции, что
+и изменение задачи, поэтому сообщение не теряется при ошибке отправки или
+перезапуске бота. После коммита диспетчер забирает готовые сообщения пакетами
+и отправляет их через notification_queue. Неудачные попытки повторяются с
+экспоненциальной задержкой, после OUTBOX_MAX_ATTEMPTS сообщение получает
+статус dead и остается в таблице для разбора. Доставленные сообщения удаляются.
+Доставка "хотя бы один раз": при остановке между отправкой и удалением
+сообщение будет отправлено повторно.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import delete, event, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, SessionTransaction
+from database import AsyncSessionLocal, OutboxMessage
+from notifications import notification_queue, send_notification
+
+logger = logging.getLogger(__name__)
+
+# Размер пакета и интервал проверки таблицы без новых сообщений, секунды
+OUTBOX_BATCH: int = int(os.getenv("OUTBOX_BATCH", "100"))
+OUTBOX_POLL_INTERVAL: float = float(os.getenv("OUTBOX_POLL_INTERVAL", "5"))
+
+# Повторы: число попыток до статуса dead, начальная и максимальная задержка, секунды
+OUTBOX_MAX_ATTEMPTS: int = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6"))
+OUTBOX_RETRY_BASE: float = float(os.getenv("OUTBOX_RETRY_BASE", "5"))
+OUTBOX_RETRY_MAX: float = float(os.getenv("OUTBOX_RETRY_MAX", "3600"))
+
+_WAKE_KEY = "outbox_wake"
+
+
+async def add_notification(db: AsyncSession, chat_id: int, text: str) -> None:
+    """Записывает уведомление в outbox в транзакции текущего апдейта"""
+    now = datetime.utcnow()
+    await db.execute(insert(OutboxMessage).values(
+        chat_id=chat_id, text=text, status='pending', attempts=0, next_attempt_at=now, created_at=now
+    ))
+    db.info[_WAKE_KEY] = True
+
+
+def retry_delay(attempts: int) -> float:
+    """Задержка перед следующей попыткой после attempts неудачных"""
+    return min(OUTBOX_RETRY_MAX, OUTBOX_RETRY_BASE * 2 ** (attempts - 1))
+
+
+async def _send(chat_id: int, text: str) -> Optional[str]:
+    """Отправляет сообщение, возвращает текст ошибки или None"""
+    if notification_queue.running:
+        return await notification_queue.submit(chat_id, text)
+    return None if await send_notification(chat_id, text) else "ошибка отправки"
+
+
+class OutboxDispatcher:
+    """Фоновая отправка сообщений из outbox"""
+
+    def __init__(self):
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def wake(self) -> None:
+        """Сообщает о новых сообщениях, не дожидаясь интервала проверки"""
+        self._wake.set()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Останавливает диспетчер, неотправленные сообщения остаются в таблице"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            self._wake.clear()
+            try:
+                processed = await self.dispatch_batch()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Ошибка отправки сообщений outbox: {e}")
+                processed = 0
+
+            # Полный пакет - в таблице могут быть еще готовые сообщения
+            if processed >= OUTBOX_BATCH:
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), OUTBOX_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def dispatch_batch(self) -> int:
+        """Отправляет один пакет готовых сообщений, возвращает их количество"""
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(OutboxMessage.id, OutboxMessage.chat_id, OutboxMessage.text, OutboxMessage.attempts)
+                .where(OutboxMessage.status == 'pending', OutboxMessage.next_attempt_at <= now)
+                .order_by(OutboxMessage.id)
+                .limit(OUTBOX_BATCH)
+            )).all()
+        if not rows:
+            return 0
+
+        errors = await asyncio.gather(*(_send(row.chat_id, row.text) for row in rows))
+
+        async with AsyncSessionLocal() as db:
+            delivered = [row.id for row, error in zip(rows, errors) if error is None]
+            if delivered:
+                await db.execute(delete(OutboxMessage).where(OutboxMessage.id.in_(delivered)))
+
+            for row, error in zip(rows, errors):
+                if error is None:
+                    continue
+                attempts = row.attempts + 1
+                dead = attempts >= OUTBOX_MAX_ATTEMPTS
+                await db.execute(update(OutboxMessage).where(OutboxMessage.id == row.id).values(
+                    status='dead' if dead else 'pending',
+                    attempts=attempts,
+                    last_error=error[:500],
+                    next_attempt_at=datetime.utcnow() + timedelta(seconds=retry_delay(attempts)),
+                ))
+                if dead:
+                    logger.error(f"☠️ Уведомление {row.id} пользователю {row.chat_id} не доставлено "
+                                 f"за {attempts} попыток: {error}")
+            await db.commit()
+
+        return len(rows)
+
+
+# Глобальный диспетчер для использования во всем приложении
+outbox_dispatcher = OutboxDispatcher()
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_after_commit(session: Session) -> None:
+    # after_commit вызывается и при освобождении точки сохранения (begin_nested)
+    if session.in_nested_transaction():
+        return
+    if session.info.pop(_WAKE_KEY, False):
+        outbox_dispatcher.wake()
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_wake(session: Session, previous_transaction: SessionTransaction) -> None:
+    # Откат точки сохранения (begin_nested) не отменяет остальную транзакцию
+    if previous_transaction.parent is None:
+        session.info.pop(_WAKE_KEY, None)
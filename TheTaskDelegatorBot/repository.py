@@ -0,0 +1,92 @@
+"""
+Заранее построенные запросы для самых частых чтений
+
+Обработчики на каждом апдейте читают пользователя по telegram_id, собеседника,
+задачу и списки невыполненных задач. Запросы строятся один раз с именованными
+параметрами (bindparam) и переиспользуются: на вызов не тратится построение
+select() и вычисление ключа кеша компиляции. Значения передаются при выполнении:
+    await db.execute(repository.user_by_telegram_id(UserModel), {"telegram_id": 42})
+"""
+from dataclasses import fields
+from functools import lru_cache
+from typing import Any, Tuple, Type
+from sqlalchemy import DateTime, Integer, Select, bindparam, func, select, tuple_
+from sqlalchemy.orm import aliased
+from database import User, Task
+from models import TaskModel, UserModel
+
+
+def model_columns(entity: Any, model: Type) -> list:
+    """Столбцы сущности в порядке полей модели строки"""
+    return [getattr(entity, field.name) for field in fields(model)]
+
+
+@lru_cache(maxsize=None)
+def user_by_telegram_id(model: Type = UserModel) -> Select:
+    """Пользователь по telegram_id, параметр telegram_id"""
+    return select(*model_columns(User, model)).where(User.telegram_id == bindparam("telegram_id"))
+
+
+@lru_cache(maxsize=None)
+def user_by_id(model: Type = UserModel) -> Select:
+    """Пользователь по первичному ключу, параметр user_id"""
+    return select(*model_columns(User, model)).where(User.id == bindparam("user_id"))
+
+
+@lru_cache(maxsize=None)
+def user_with_partner() -> Select:
+    """Пользователь и собеседник одной строкой (outer join), параметр telegram_id"""
+    partner = aliased(User)
+    return (
+        select(*model_columns(User, UserModel), *model_columns(partner, UserModel))
+        .outerjoin(partner, partner.id == User.partner_id)
+        .where(User.telegram_id == bindparam("telegram_id"))
+    )
+
+
+@lru_cache(maxsize=None)
+def task_by_id() -> Select:
+    """Задача по первичному ключу, параметр task_id"""
+    return select(*model_columns(Task, TaskModel)).where(Task.id == bindparam("task_id"))
+
+
+def _active_tasks_where(query: Select, owners: Tuple[str, ...]) -> Select:
+    """Условие невыполненных задач владельцев: assigned_by_id и/или assigned_to_id"""
+    query = query.where(Task.completed == False)
+    for owner in owners:
+        query = query.where(getattr(Task, owner) == bindparam(owner))
+    return query
+
+
+@lru_cache(maxsize=None)
+def active_tasks(owners: Tuple[str, ...]) -> Select:
+    """Все невыполненные задачи, параметры - имена из owners"""
+    return _active_tasks_where(select(*model_columns(Task, TaskModel)), owners)
+
+
+@lru_cache(maxsize=None)
+def count_active_tasks(owners: Tuple[str, ...]) -> Select:
+    """Количество невыполненных задач, параметры - имена из owners"""
+    return _active_tasks_where(select(func.count()).select_from(Task), owners)
+
+
+@lru_cache(maxsize=None)
+def active_task_page(owners: Tuple[str, ...], after_cursor: bool, backward: bool) -> Select:
+    """
+    Страница невыполненных задач в порядке (created_at, id)
+    Параметры: имена из owners, limit и при after_cursor - created_at и task_id курсора
+    """
+    query = _active_tasks_where(select(*model_columns(Task, TaskModel)), owners)
+
+    if after_cursor:
+        key = tuple_(Task.created_at, Task.id)
+        # Типы параметров заданы явно: в tuple_ они не выводятся из столбцов
+        position = tuple_(bindparam("created_at", type_=DateTime), bindparam("task_id", type_=Integer))
+        query = query.where(key < position if backward else key > position)
+
+    if backward:
+        query = query.order_by(Task.created_at.desc(), Task.id.desc())
+    else:
+        query = query.order_by(Task.created_at, Task.id)
+
+    return query.limit(bindparam("limit"))
@@ -0,0 +1,88 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, SessionTransaction
+from models import UserModel
+
+# Размер и время жизни кеша пользователей
+USER_CACHE_SIZE: int = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL: int = int(os.getenv("USER_CACHE_TTL", "300"))
+
+UserIdentity = Tuple[UserModel, Optional[UserModel]]
+
+_PENDING_KEY = "user_cache_invalidate"
+
+
+class UserIdentityCache:
+    """
+    LRU-кеш пользователя и его собеседника по telegram_id с ограниченным временем жизни
+    Записи сбрасываются явно при создании пользователя, привязке и отвязке собеседника
+    """
+
+    def __init__(self, maxsize: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[int, Tuple[float, UserIdentity]]" = OrderedDict()
+
+    def get(self, telegram_id: int) -> Optional[UserIdentity]:
+        """Возвращает пользователя и собеседника или None, если записи нет"""
+        entry = self._entries.get(telegram_id)
+        if entry is None or entry[0] < time.monotonic():
+            self._entries.pop(telegram_id, None)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(telegram_id)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, telegram_id: int, identity: UserIdentity) -> None:
+        """Сохраняет запись, вытесняя самые давно использованные"""
+        self._entries[telegram_id] = (time.monotonic() + self.ttl, identity)
+        self._entries.move_to_end(telegram_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, *telegram_ids: int) -> None:
+        """Удаляет записи пользователей"""
+        for telegram_id in telegram_ids:
+            self._entries.pop(telegram_id, None)
+
+    def clear(self) -> None:
+        """Очищает кеш"""
+        self._entries.clear()
+
+
+# Глобальный кеш для использования во всем приложении
+user_cache = UserIdentityCache()
+
+
+def invalidate_users(db: AsyncSession, *telegram_ids: int) -> None:
+    """
+    Сбрасывает записи сразу и еще раз после коммита транзакции:
+    параллельный апдейт мог прочитать и закешировать данные до коммита
+    """
+    user_cache.invalidate(*telegram_ids)
+    db.info.setdefault(_PENDING_KEY, set()).update(telegram_ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session: Session) -> None:
+    # after_commit вызывается и при освобождении точки сохранения (begin_nested)
+    if session.in_nested_transaction():
+        return
+    telegram_ids = session.info.pop(_PENDING_KEY, None)
+    if telegram_ids:
+        user_cache.invalidate(*telegram_ids)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending(session: Session, previous_transaction: SessionTransaction) -> None:
+    # Откат точки сохранения (begin_nested) не отменяет остальную транзакцию
+    if previous_transaction.parent is None:
+        session.info.pop(_PENDING_KEY, None)
@@ -1,11 +1,54 @@
+import asyncio
+import os
 import secrets
 import string
-from datetime import datetime, timedelta
-from typing import Optional, Tuple, Dict, Any
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from dataclasses import fields
+from datetime import date, datetime, timedelta
+from typing import Optional, Tuple, Dict, Any, Awaitable, Callable, Iterable, List, Type, TypeVar, Union
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import case, delete, func, insert, literal, or_, select, update, DateTime
+from sqlalchemy.engine import Row
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 import config
-from database import User, Task, AppStats, engine
+import repository
+from database import User, Task, TaskArchive, Invite, AppStats, DailyStats
+from activity import activity_buffer
+from invites import invite_registry, register_invite_after_commit, discard_invites_after_commit
+from models import TaskModel, UserModel
+from user_cache import user_cache, invalidate_users, UserIdentity
+
+RowModel = TypeVar("RowModel")
+
+# Счетчики пользователя, которые меняются через increment_user_counters
+USER_COUNTERS = frozenset({
+    "tasks_created_count", "tasks_completed_count", "tasks_received_count", "tasks_deleted_count",
+    "total_messages_count", "onesignal_notifications_sent", "onesignal_notifications_received",
+})
+
+# Размер страницы в списках задач
+TASKS_PAGE_SIZE: int = int(os.getenv("TASKS_PAGE_SIZE", "10"))
+
+_CURSOR_EPOCH = datetime(1970, 1, 1)
+
+
+async def run_batches(step: Callable[[int], Awaitable[int]], batch_size: int,
+                      limit: Optional[int] = None) -> int:
+    """
+    Вызывает step(размер пакета), пока пакет не окажется неполным или не набрано limit
+    Между пакетами управление отдается циклу событий, чтобы обработчики
+    получили доступ к базе. Возвращает общее количество обработанного
+    """
+    total = 0
+    while limit is None or total < limit:
+        requested = batch_size if limit is None else min(batch_size, limit - total)
+        done = await step(requested)
+        total += done
+        if done < requested:
+            break
+        await asyncio.sleep(0)
+    return total
 
 
 def generate_invite_code(length: int = 6) -> str:
@@ -14,30 +57,166 @@ def generate_invite_code(length: int = 6) -> str:
     return ''.join(secrets.choice(alphabet) for _ in range(length))
 
 
-def create_invite(db: Session, user_id: int) -> Tuple[Optional[str], Optional[datetime]]:
-    """Создает инвайт-код для пользователя"""
-    user = db.query(User).filter(User.telegram_id == user_id).first()
+def generate_onesignal_external_id() -> str:
+    """Генерирует external ID для привязки устройств пользователя в OneSignal"""
+    return f"tb-{secrets.token_hex(12)}"
+
+
+async def get_user_model(db: AsyncSession, telegram_id: int,
+                         model: Type[RowModel] = UserModel) -> Optional[RowModel]:
+    """Читает пользователя по telegram_id без загрузки ORM-объекта"""
+    row = (await db.execute(repository.user_by_telegram_id(model), {"telegram_id": telegram_id})).first()
+    return model(*row) if row else None
+
+
+async def get_user_model_by_id(db: AsyncSession, user_id: int,
+                               model: Type[RowModel] = UserModel) -> Optional[RowModel]:
+    """Читает пользователя по первичному ключу без загрузки ORM-объекта"""
+    row = (await db.execute(repository.user_by_id(model), {"user_id": user_id})).first()
+    return model(*row) if row else None
+
+
+async def get_user_with_partner(db: AsyncSession, telegram_id: int) -> UserIdentity:
+    """
+    Возвращает пользователя и его собеседника (или None)
+    Результат кешируется, поэтому повторный вызов не обращается к базе
+    """
+    cached = user_cache.get(telegram_id)
+    if cached:
+        return cached
+
+    row = (await db.execute(repository.user_with_partner(), {"telegram_id": telegram_id})).first()
+    if not row:
+        return None, None
+
+    size = len(fields(UserModel))
+    identity = (UserModel(*row[:size]), UserModel(*row[size:]) if row[size] is not None else None)
+    user_cache.put(telegram_id, identity)
+    return identity
+
+
+async def set_onesignal_external_id(db: AsyncSession, user: UserModel, partner: Optional[UserModel],
+                                    external_id: Optional[str]) -> bool:
+    """
+    Привязывает пользователя к external ID OneSignal (None - отвязывает)
+    Возвращает False, если этот ID уже привязан к другому пользователю
+    """
+    # Занятость ID проверяет уникальный индекс: отдельный SELECT перед UPDATE
+    # не защищает от одновременной привязки. Ошибка откатывает только точку сохранения
+    try:
+        async with db.begin_nested():
+            await db.execute(update(User).where(User.id == user.id).values(onesignal_external_id=external_id))
+    except IntegrityError:
+        return False
+
+    # ID хранится в кеше у пользователя и у его собеседника
+    invalidate_users(db, user.telegram_id, *([partner.telegram_id] if partner else []))
+    return True
+
+
+async def get_task_model(db: AsyncSession, task_id: int) -> Optional[TaskModel]:
+    """Читает задачу по первичному ключу без загрузки ORM-объекта"""
+    row = (await db.execute(repository.task_by_id(), {"task_id": task_id})).first()
+    return TaskModel(*row) if row else None
+
+
+def _task_owners(assigned_by_id: Optional[int], assigned_to_id: Optional[int]) -> Dict[str, int]:
+    """Параметры владельцев задач для запросов repository"""
+    owners = {"assigned_by_id": assigned_by_id, "assigned_to_id": assigned_to_id}
+    return {name: value for name, value in owners.items() if value is not None}
+
+
+def encode_task_cursor(task: TaskModel) -> str:
+    """Курсор страницы (created_at, id) в компактном виде для callback_data"""
+    microseconds = (task.created_at - _CURSOR_EPOCH) // timedelta(microseconds=1)
+    return f"{microseconds:x}.{task.id:x}"
+
+
+def decode_task_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Разбирает курсор, созданный encode_task_cursor"""
+    microseconds, task_id = cursor.split(".")
+    return _CURSOR_EPOCH + timedelta(microseconds=int(microseconds, 16)), int(task_id, 16)
+
+
+async def get_active_task_page(db: AsyncSession, assigned_by_id: Optional[int] = None,
+                               assigned_to_id: Optional[int] = None, cursor: Optional[str] = None,
+                               backward: bool = False, limit: int = TASKS_PAGE_SIZE
+                               ) -> Tuple[List[TaskModel], Optional[str], Optional[str]]:
+    """
+    Страница невыполненных задач в порядке (created_at, id)
+    Страница выбирается по ключу после курсора (или перед ним при backward),
+    без OFFSET. Возвращает задачи и курсоры предыдущей и следующей страниц
+    """
+    params: Dict[str, Any] = _task_owners(assigned_by_id, assigned_to_id)
+    if cursor:
+        params["created_at"], params["task_id"] = decode_task_cursor(cursor)
+
+    # Лишняя строка показывает, есть ли задачи дальше в направлении листания
+    params["limit"] = limit + 1
+    query = repository.active_task_page(tuple(_task_owners(assigned_by_id, assigned_to_id)),
+                                        bool(cursor), backward)
+    rows = (await db.execute(query, params)).all()
+    has_more = len(rows) > limit
+    tasks = [TaskModel(*row) for row in rows[:limit]]
+    if backward:
+        tasks.reverse()
+
+    if not tasks:
+        return [], None, None
+
+    # В обратную сторону задачи есть, если страница открыта по курсору
+    has_prev = has_more if backward else cursor is not None
+    has_next = cursor is not None if backward else has_more
+    return (tasks,
+            encode_task_cursor(tasks[0]) if has_prev else None,
+            encode_task_cursor(tasks[-1]) if has_next else None)
+
+
+async def count_active_tasks(db: AsyncSession, assigned_by_id: Optional[int] = None,
+                             assigned_to_id: Optional[int] = None) -> int:
+    """Количество невыполненных задач пользователя"""
+    owners = _task_owners(assigned_by_id, assigned_to_id)
+    return await db.scalar(repository.count_active_tasks(tuple(owners)), owners)
+
+
+async def get_active_task_models(db: AsyncSession, assigned_by_id: Optional[int] = None,
+                                 assigned_to_id: Optional[int] = None) -> List[TaskModel]:
+    """Невыполненные задачи пользователя: созданные им или назначенные ему"""
+    owners = _task_owners(assigned_by_id, assigned_to_id)
+    return [TaskModel(*row) for row in await db.execute(repository.active_tasks(tuple(owners)), owners)]
+
+
+async def create_invite(db: AsyncSession, user_id: int) -> Tuple[Optional[str], Optional[datetime]]:
+    """Создает инвайт-код для пользователя, прежний код пользователя перестает действовать"""
+    user, _ = await get_user_with_partner(db, user_id)
     if not user:
         return None, None
 
     invite_code = generate_invite_code()
+    while invite_code in invite_registry:
+        invite_code = generate_invite_code()
     expires_at = datetime.utcnow() + timedelta(hours=config.config.INVITE_LINK_EXPIRE_HOURS)
 
-    user.invite_code = invite_code
-    user.invite_expires = expires_at
-
-    db.commit()
+    await db.execute(delete(Invite).where(Invite.owner_id == user.id))
+    await db.execute(insert(Invite).values(
+        code=invite_code, owner_id=user.id, created_at=datetime.utcnow(), expires_at=expires_at
+    ))
+    register_invite_after_commit(db, invite_code, user.id, expires_at)
     return invite_code, expires_at
 
 
-def accept_invite(db: Session, invite_code: str, new_user_id: int) -> Tuple[bool, Optional[int], str]:
-    """Принимает инвайт-код"""
+async def accept_invite(db: AsyncSession, invite_code: str, new_user_id: int) -> Tuple[bool, Optional[int], str]:
+    """Принимает инвайт-код: поиск по первичному ключу invites, без просмотра users"""
     invite_code = invite_code.upper().strip()
 
-    inviting_user = db.query(User).filter(
-        User.invite_code == invite_code,
-        User.invite_expires > datetime.utcnow()
-    ).first()
+    if not invite_registry.is_valid(invite_code):
+        return False, None, "❌ Неверный или просроченный код приглашения"
+
+    owner_id = await db.scalar(select(Invite.owner_id).where(
+        Invite.code == invite_code,
+        Invite.expires_at > datetime.utcnow()
+    ))
+    inviting_user = await db.get(User, owner_id) if owner_id else None
 
     if not inviting_user:
         return False, None, "❌ Неверный или просроченный код приглашения"
@@ -48,7 +227,7 @@ def accept_invite(db: Session, invite_code: str, new_user_id: int) -> Tuple[bool
     if inviting_user.telegram_id == new_user_id:
         return False, None, "❌ Нельзя присоединиться к самому себе"
 
-    new_user = db.query(User).filter(User.telegram_id == new_user_id).first()
+    new_user = await db.scalar(select(User).where(User.telegram_id == new_user_id))
     if not new_user:
         return False, None, "❌ Пользователь не найден"
 
@@ -58,57 +237,283 @@ def accept_invite(db: Session, invite_code: str, new_user_id: int) -> Tuple[bool
     inviting_user.partner_id = new_user.id
     new_user.partner_id = inviting_user.id
 
-    inviting_user.invite_code = None
-    inviting_user.invite_expires = None
+    # Коды обоих больше не нужны
+    await db.execute(delete(Invite).where(Invite.owner_id.in_([inviting_user.id, new_user.id])))
+    discard_invites_after_commit(db, inviting_user.id)
+    discard_invites_after_commit(db, new_user.id)
 
-    db.commit()
+    await db.flush()
+    invalidate_users(db, inviting_user.telegram_id, new_user.telegram_id)
 
     partner_name = inviting_user.full_name or "пользователю"
     return True, inviting_user.id, f"✅ Вы успешно подключились к {partner_name}!"
 
 
-def update_user_activity(db: Session, telegram_id: int) -> None:
-    """Обновляет статистику активности пользователя"""
-    try:
-        user = db.query(User).filter(User.telegram_id == telegram_id).first()
-        if user:
-            # Обновляем дату активности
-            user.last_active_date = datetime.utcnow()
-
-            # Увеличиваем счетчик сообщений
-            current = getattr(user, 'total_messages_count', 0) or 0
-            user.total_messages_count = current + 1
-
-            db.commit()
-    except Exception as e:
-        print(f"⚠️ Ошибка обновления активности: {e}")
-
-
-def update_app_stats(db: Session) -> None:
-    """Обновляет общую статистику приложения"""
+async def purge_expired_invites(db: AsyncSession, now: Optional[datetime] = None) -> int:
+    """Удаляет истекшие коды приглашения из invites и реестра, возвращает их количество"""
+    now = now or datetime.utcnow()
+    result = await db.execute(delete(Invite).where(Invite.expires_at <= now))
+    invite_registry.purge(now)
+    return result.rowcount
+
+
+async def complete_task(db: AsyncSession, task_id: int) -> Optional[Row]:
+    """
+    Отмечает задачу выполненной одним условным UPDATE ... RETURNING
+    Повторное нажатие или одновременное действие собеседника не найдет
+    невыполненной задачи, и счетчики не изменятся. Возвращает строку
+    (title, completed_at, creator_telegram_id) или None
+    """
+    creator_telegram_id = select(User.telegram_id).where(User.id == Task.assigned_by_id).scalar_subquery()
+    row = (await db.execute(
+        update(Task)
+        .where(Task.id == task_id, Task.completed == False)
+        .values(completed=True, completed_at=datetime.utcnow())
+        .returning(Task.title, Task.completed_at, Task.assigned_to_id,
+                   creator_telegram_id.label("creator_telegram_id"))
+    )).first()
+    if row is None:
+        return None
+
+    await increment_user_counters(db, row.assigned_to_id, tasks_completed_count=1)
+    await record_task_completed(db)
+    return row
+
+
+async def delete_task(db: AsyncSession, task_id: int) -> Optional[Row]:
+    """
+    Удаляет задачу одним DELETE ... RETURNING, счетчики меняются только
+    если строка действительно удалена. Возвращает строку
+    (title, completed, partner_telegram_id) или None
+    """
+    partner_telegram_id = select(User.telegram_id).where(User.id == Task.assigned_to_id).scalar_subquery()
+    row = (await db.execute(
+        delete(Task)
+        .where(Task.id == task_id)
+        .returning(Task.title, Task.completed, Task.assigned_by_id,
+                   partner_telegram_id.label("partner_telegram_id"))
+    )).first()
+    if row is None:
+        return None
+
+    await increment_user_counters(db, row.assigned_by_id, tasks_deleted_count=1)
+    await record_tasks_deleted(db, 1, int(bool(row.completed)))
+    return row
+
+
+async def unbind_partners(db: AsyncSession, user: User, partner: Optional[User]) -> Tuple[int, int]:
+    """
+    Отвязывает собеседников: удаляет их задачи и сбрасывает счетчики
+    Выполняется несколькими запросами над множествами строк, без загрузки задач.
+    Возвращает количество удаленных задач и сколько из них было выполнено
+    """
+    user_ids = [user.id] + ([partner.id] if partner else [])
+    involved = or_(Task.assigned_by_id == user.id, Task.assigned_to_id == user.id)
+    archived = or_(TaskArchive.assigned_by_id == user.id, TaskArchive.assigned_to_id == user.id)
+
+    total, completed = (await db.execute(
+        select(func.count(), func.count().filter(Task.completed == True)).where(involved)
+    )).one()
+    # Все задачи в архиве выполненные
+    archived_total = await db.scalar(select(func.count()).select_from(TaskArchive).where(archived))
+    total += archived_total
+    completed += archived_total
+
+    await db.execute(delete(Task).where(involved))
+    await db.execute(delete(TaskArchive).where(archived))
+    await db.execute(update(User).where(User.id.in_(user_ids)).values(
+        tasks_created_count=0,
+        tasks_completed_count=0,
+        tasks_received_count=0,
+        tasks_deleted_count=0,
+        partner_id=None
+    ))
+
+    await record_tasks_deleted(db, total, completed)
+    invalidate_users(db, user.telegram_id, *([partner.telegram_id] if partner else []))
+    return total, completed
+
+
+async def archive_completed_tasks(db: AsyncSession, completed_before: datetime, limit: int) -> int:
+    """
+    Переносит до limit выполненных задач в tasks_archive и возвращает их количество
+    Счетчики AppStats и дневные агрегаты не меняются: задачи остаются в статистике
+    """
+    task_ids = (await db.scalars(
+        select(Task.id)
+        .where(Task.completed == True,
+               or_(Task.completed_at < completed_before, Task.completed_at.is_(None)))
+        .order_by(Task.id)
+        .limit(limit)
+    )).all()
+    if not task_ids:
+        return 0
+
+    columns = ["id", "title", "description", "assigned_by_id", "assigned_to_id", "created_at", "completed_at"]
+    await db.execute(insert(TaskArchive).from_select(
+        columns + ["archived_at"],
+        select(*(getattr(Task, name) for name in columns), literal(datetime.utcnow(), DateTime))
+        .where(Task.id.in_(task_ids))
+    ))
+    await db.execute(delete(Task).where(Task.id.in_(task_ids)))
+    return len(task_ids)
+
+
+def _counter_values(deltas: Dict[str, Any]) -> Dict[str, Any]:
+    """Выражения SET col = COALESCE(col, 0) + delta для счетчиков пользователя"""
+    unknown = set(deltas) - USER_COUNTERS
+    if unknown:
+        raise ValueError(f"Неизвестные счетчики пользователя: {', '.join(sorted(unknown))}")
+    return {name: func.coalesce(getattr(User, name), 0) + delta for name, delta in deltas.items()}
+
+
+async def increment_user_counters(db: AsyncSession, user_ids: Union[int, Iterable[int]],
+                                  key: Any = User.id, **deltas: int) -> int:
+    """
+    Атомарно увеличивает счетчики одного или нескольких пользователей одним UPDATE
+    key - столбец, по которому заданы user_ids (User.id или User.telegram_id).
+    Возвращает количество обновленных пользователей
+    """
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas:
+        return 0
+
+    ids = [user_ids] if isinstance(user_ids, int) else list(user_ids)
+    result = await db.execute(
+        update(User).where(key.in_(ids)).values(**_counter_values(deltas))
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+async def increment_user_counters_each(db: AsyncSession, deltas_by_user: Dict[int, Dict[str, int]],
+                                       key: Any = User.id) -> int:
+    """
+    Увеличивает разные счетчики разным пользователям одним UPDATE с CASE,
+    например {user.id: {"tasks_created_count": 1}, partner.id: {"tasks_received_count": 1}}
+    """
+    names = {name for deltas in deltas_by_user.values() for name, delta in deltas.items() if delta}
+    if not names:
+        return 0
+
+    values = _counter_values({
+        name: case(
+            *((key == user_id, deltas[name]) for user_id, deltas in deltas_by_user.items() if deltas.get(name)),
+            else_=0
+        )
+        for name in sorted(names)
+    })
+    result = await db.execute(
+        update(User).where(key.in_(list(deltas_by_user))).values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+async def purge_archived_tasks(db: AsyncSession, archived_before: datetime, limit: int) -> int:
+    """
+    Удаляет до limit задач, перенесенных в архив раньше archived_before
+    Задачи перестают учитываться в AppStats, как и при пересчете update_app_stats
+    """
+    result = await db.execute(
+        delete(TaskArchive).where(TaskArchive.id.in_(
+            select(TaskArchive.id).where(TaskArchive.archived_at < archived_before).limit(limit)
+        ))
+    )
+    await record_tasks_deleted(db, result.rowcount, result.rowcount)
+    return result.rowcount
+
+
+def update_user_activity(telegram_id: int) -> None:
+    """
+    Обновляет статистику активности пользователя
+    Запись в базу отложенная, см. activity.ActivityBuffer
+    """
+    activity_buffer.record(telegram_id)
+
+
+async def bump_app_stats(db: AsyncSession, **deltas: int) -> None:
+    """Атомарно изменяет счетчики AppStats в транзакции текущего апдейта"""
+    values = {name: getattr(AppStats, name) + delta for name, delta in deltas.items() if delta}
+    if not values:
+        return
+
+    values['updated_at'] = datetime.utcnow()
+    await db.execute(update(AppStats).values(**values))
+
+
+async def bump_daily_stats(db: AsyncSession, day: Optional[date] = None, **deltas: int) -> None:
+    """Атомарно изменяет дневные агрегаты, создавая строку дня при необходимости"""
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    insert = postgresql_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    statement = insert(DailyStats).values(day=day or datetime.utcnow().date(), **deltas)
+    statement = statement.on_conflict_do_update(
+        index_elements=[DailyStats.day],
+        set_={name: getattr(DailyStats, name) + statement.excluded[name] for name in deltas}
+    )
+    await db.execute(statement)
+
+
+async def record_user_joined(db: AsyncSession) -> None:
+    """Учитывает нового пользователя в общей статистике"""
+    await bump_app_stats(db, total_users=1, active_users=1)
+    # Дата активности нового пользователя уже сегодняшняя, буфер активности его не учтет
+    await bump_daily_stats(db, users_joined=1, active_users=1)
+
+
+async def record_task_created(db: AsyncSession) -> None:
+    """Учитывает созданную задачу в общей статистике"""
+    await bump_app_stats(db, total_tasks=1)
+    await bump_daily_stats(db, tasks_created=1)
+
+
+async def record_task_completed(db: AsyncSession) -> None:
+    """Учитывает выполненную задачу в общей статистике"""
+    await bump_app_stats(db, completed_tasks=1)
+    await bump_daily_stats(db, tasks_completed=1)
+
+
+async def record_tasks_deleted(db: AsyncSession, total: int, completed: int = 0) -> None:
+    """
+    Убирает удаленные задачи из общей статистики
+    Дневные агрегаты хранят историю и при удалении не меняются
+    """
+    await bump_app_stats(db, total_tasks=-total, completed_tasks=-completed)
+
+
+async def update_app_stats(db: AsyncSession) -> None:
+    """
+    Полностью пересчитывает общую статистику приложения
+    Обработчики меняют AppStats приращениями, пересчет выполняется
+    периодической задачей сверки (jobs.reconcile_app_stats)
+    """
     try:
         # Подсчет пользователей
-        total_users = db.query(User).count()
+        total_users = await db.scalar(select(func.count()).select_from(User))
 
         # Активные пользователи (были активны в последние 7 дней)
         week_ago = datetime.utcnow() - timedelta(days=7)
-        active_users = db.query(User).filter(
+        active_users = await db.scalar(select(func.count()).select_from(User).where(
             User.last_active_date >= week_ago
-        ).count()
+        ))
 
-        # Подсчет задач
-        total_tasks = db.query(Task).count()
-        completed_tasks = db.query(Task).filter(Task.completed == True).count()
+        # Подсчет задач, включая выполненные задачи из архива
+        archived_tasks = await db.scalar(select(func.count()).select_from(TaskArchive))
+        total_tasks = await db.scalar(select(func.count()).select_from(Task)) + archived_tasks
+        completed_tasks = await db.scalar(
+            select(func.count()).select_from(Task).where(Task.completed == True)
+        ) + archived_tasks
 
-        # Подсчет OneSignal уведомлений - УПРОЩЕННЫЙ вариант
-        onesignal_total = 0
-        users = db.query(User).all()
-        for user in users:
-            sent = getattr(user, 'onesignal_notifications_sent', 0) or 0
-            onesignal_total += sent
+        # Подсчет OneSignal уведомлений одной агрегацией в базе
+        onesignal_total = await db.scalar(
+            select(func.coalesce(func.sum(User.onesignal_notifications_sent), 0))
+        )
 
         # Обновляем или создаем запись статистики
-        stats = db.query(AppStats).first()
+        stats = await db.scalar(select(AppStats).limit(1))
         if not stats:
             stats = AppStats()
             db.add(stats)
@@ -120,17 +525,17 @@ def update_app_stats(db: Session) -> None:
         stats.onesignal_notifications_total = onesignal_total
         stats.updated_at = datetime.utcnow()
 
-        db.commit()
+        await db.flush()
         print(f"✅ Статистика обновлена: {total_users} пользователей, {total_tasks} задач")
 
     except Exception as e:
         print(f"⚠️ Ошибка обновления статистики приложения: {e}")
 
 
-def get_app_stats_summary(db: Session) -> Dict[str, Any]:
+async def get_app_stats_summary(db: AsyncSession) -> Dict[str, Any]:
     """Получает сводную статистику приложения"""
     try:
-        stats = db.query(AppStats).first()
+        stats = await db.scalar(select(AppStats).limit(1))
 
         if not stats:
             return {
@@ -143,12 +548,20 @@ def get_app_stats_summary(db: Session) -> Dict[str, Any]:
                 'active_tasks': 0,
                 'completion_rate': 0,
                 'onesignal_notifications_total': 0,
+                'today_tasks_created': 0,
+                'today_tasks_completed': 0,
+                'today_active_users': 0,
                 'updated_at': datetime.utcnow()
             }
 
         # Дополнительная статистика
-        users_with_partner = db.query(User).filter(User.partner_id.isnot(None)).count()
-        active_tasks = db.query(Task).filter(Task.completed == False).count()
+        users_with_partner = await db.scalar(
+            select(func.count()).select_from(User).where(User.partner_id.isnot(None))
+        )
+        active_tasks = await db.scalar(
+            select(func.count()).select_from(Task).where(Task.completed == False)
+        )
+        today = await db.get(DailyStats, datetime.utcnow().date())
 
         # Процент выполнения задач
         completion_rate = 0
@@ -170,6 +583,9 @@ def get_app_stats_summary(db: Session) -> Dict[str, Any]:
             'active_tasks': active_tasks,
             'completion_rate': completion_rate,
             'onesignal_notifications_total': stats.onesignal_notifications_total,
+            'today_tasks_created': today.tasks_created if today else 0,
+            'today_tasks_completed': today.tasks_completed if today else 0,
+            'today_active_users': today.active_users if today else 0,
             'updated_at': stats.updated_at
         }
     except Exception as e:
@@ -184,30 +600,27 @@ def get_app_stats_summary(db: Session) -> Dict[str, Any]:
             'active_tasks': 0,
             'completion_rate': 0,
             'onesignal_notifications_total': 0,
+            'today_tasks_created': 0,
+            'today_tasks_completed': 0,
+            'today_active_users': 0,
             'updated_at': datetime.utcnow()
         }
 
 
-def increment_onesignal_stats(db: Session, user_id: int, sent: bool = True) -> None:
-    """Увеличивает счетчик OneSignal уведомлений"""
+async def increment_onesignal_stats(db: AsyncSession, user_id: int, sent: bool = True) -> None:
+    """Увеличивает счетчик OneSignal уведомлений пользователя по telegram_id"""
     try:
-        user = db.query(User).filter(User.telegram_id == user_id).first()
-        if user:
-            if sent:
-                current = getattr(user, 'onesignal_notifications_sent', 0) or 0
-                user.onesignal_notifications_sent = current + 1
-            else:
-                current = getattr(user, 'onesignal_notifications_received', 0) or 0
-                user.onesignal_notifications_received = current + 1
-            db.commit()
-            update_app_stats(db)
+        counter = 'onesignal_notifications_sent' if sent else 'onesignal_notifications_received'
+        updated = await increment_user_counters(db, user_id, key=User.telegram_id, **{counter: 1})
+        if updated and sent:
+            await bump_app_stats(db, onesignal_notifications_total=1)
     except Exception as e:
         print(f"⚠️ Ошибка обновления OneSignal статистики: {e}")
 
 
-def get_user_stats_for_graph(db, user_id: int) -> dict:
+async def get_user_stats_for_graph(db: AsyncSession, user_id: int) -> dict:
     """Получает статистику пользователя для графиков"""
-    user = db.query(User).filter(User.telegram_id == user_id).first()
+    user = await db.scalar(select(User).where(User.telegram_id == user_id))
 
     if not user:
         return {}